@@ -16,7 +16,10 @@ class Config(ConfigBase):
         stalker_dummy_user_login="anima",
         stalker_dummy_user_pass="anima",
         local_cache_folder="~/.cache/anima/",
+        thumbnail_cache_max_size=512 * 1024 * 1024,  # in bytes
+        media_info_cache_max_count=10000,
         recent_file_name="recent_files",
+        publisher_history_file_name="publisher_history.json",
         avid_media_file_path_storage="avid_media_file_path",
         enable_ldap_authentication=False,
         enable_ldap_authorization=False,
@@ -141,8 +141,10 @@ class Avid2Resolve(object):
                 e.src_start_tc -= first_hour - 1
                 e.src_end_tc -= first_hour - 1
 
-    def to_xml(self):
-        """return an eml version of this edl"""
+    def to_sequence(self):
+        """return an anima.edit.Sequence version of this edl with the clips
+        optimized
+        """
         from anima.edit import Sequence, Rate
 
         s = Sequence(rate=Rate(timebase="24"))
@@ -152,5 +154,15 @@ class Avid2Resolve(object):
         for track in s.media.video.tracks:
             track.optimize_clips()
 
-        xml_data = s.to_xml()
-        return xml_data
+        return s
+
+    def to_xml(self):
+        """return an eml version of this edl"""
+        return self.to_sequence().to_xml()
+
+    def write_xml(self, stream):
+        """write the eml version of this edl to the given file like object
+
+        :param stream: A file like object with a ``write`` method.
+        """
+        self.to_sequence().write_xml(stream)
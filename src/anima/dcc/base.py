@@ -1,12 +1,123 @@
 # -*- coding: utf-8 -*-
 
 import os
+import threading
+from collections import OrderedDict
 
 from anima import logger, log_file_handler
 from anima.recent import RecentFileManager
 from anima.utils.progress import ProgressManagerFactory
 
 
+class VersionPathCache(object):
+    """A process wide, least recently used, path to Version id cache.
+
+    Only the ids of the found Versions are stored, so the cache doesn't hold
+    any Version instances between sessions. The entries of the Versions that
+    are updated or deleted are removed when the DBSession is flushed, and a
+    cached Version is always checked against its current ``full_path`` before
+    it is used.
+    """
+
+    max_size = 10000
+
+    _ids_by_path = OrderedDict()
+    _paths_by_id = {}
+    _lock = threading.Lock()
+    _events_registered = False
+
+    @classmethod
+    def get(cls, path):
+        """Return the cached Version id of the given path.
+
+        :param str path: The os independent full path of the Version.
+        :return: int or None
+        """
+        with cls._lock:
+            version_id = cls._ids_by_path.get(path)
+            if version_id is not None:
+                cls._ids_by_path.move_to_end(path)
+            return version_id
+
+    @classmethod
+    def set(cls, path, version_id):
+        """Cache the Version id of the given path.
+
+        :param str path: The os independent full path of the Version.
+        :param int version_id: The Version id.
+        """
+        cls.register_events()
+        with cls._lock:
+            cls._ids_by_path[path] = version_id
+            cls._ids_by_path.move_to_end(path)
+            cls._paths_by_id.setdefault(version_id, set()).add(path)
+            while len(cls._ids_by_path) > cls.max_size:
+                old_path, old_version_id = cls._ids_by_path.popitem(last=False)
+                cls._discard_path(old_path, old_version_id)
+
+    @classmethod
+    def invalidate(cls, version_ids=None):
+        """Remove the entries of the given Version ids from the cache.
+
+        :param version_ids: A list of Version ids, clears the whole cache if
+          it is None.
+        """
+        with cls._lock:
+            if version_ids is None:
+                cls._ids_by_path.clear()
+                cls._paths_by_id.clear()
+                return
+
+            for version_id in version_ids:
+                for path in cls._paths_by_id.pop(version_id, ()):
+                    cls._ids_by_path.pop(path, None)
+
+    @classmethod
+    def _discard_path(cls, path, version_id):
+        """Remove the path from the paths of the given version id.
+
+        :param str path: The path.
+        :param int version_id: The Version id.
+        """
+        paths = cls._paths_by_id.get(version_id)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del cls._paths_by_id[version_id]
+
+    @classmethod
+    def register_events(cls):
+        """Register the DBSession events that invalidate the cache."""
+        if cls._events_registered:
+            return
+
+        from sqlalchemy import event
+        from stalker.db.session import DBSession
+
+        event.listen(DBSession, "after_flush", cls._after_flush)
+        cls._events_registered = True
+
+    @classmethod
+    def _after_flush(cls, session, flush_context):
+        """Invalidate the updated and deleted Versions.
+
+        New Versions don't need to invalidate anything as the cache only
+        holds the paths that are found.
+
+        :param session: The flushed session.
+        :param flush_context: The flush context.
+        """
+        from stalker import Version
+
+        version_ids = [
+            instance.id
+            for instance in list(session.dirty) + list(session.deleted)
+            if isinstance(instance, Version)
+        ]
+        if version_ids:
+            cls.invalidate(version_ids)
+
+
 class DCCBase(object):
     """Connects the DCC to Anima Pipeline.
 
@@ -70,6 +181,9 @@ class DCCBase(object):
 
     project_structure = []
 
+    # number of ids to use in one IN clause in bulk database queries
+    query_batch_size = 500
+
     def __init__(self, name="", version=None):
         self._name = name
         self._version = version
@@ -224,20 +338,94 @@ class DCCBase(object):
             return
 
         logger.debug("full_path: {}".format(full_path))
-        # convert '\\' to '/'
-        full_path = os.path.normpath(os.path.expandvars(full_path)).replace("\\", "/")
+        version = cls.get_versions_from_full_paths([full_path])[0]
+        logger.debug("version: %s" % version)
+        return version
 
-        # trim repo path
-        from stalker import Repository, Version
+    @classmethod
+    def get_versions_from_full_paths(cls, full_paths):
+        """Finds the Version instances from the given full_path values.
 
-        os_independent_path = Repository.to_os_independent_path(full_path)
+        This is the bulk version of
+        :meth:`~anima.dcc.base.DCCBase.get_version_from_full_path`. The paths
+        that are not in the :class:`.VersionPathCache` are resolved with one
+        query per ``query_batch_size`` paths.
 
-        # try to get a version with that info
-        logger.debug("getting a version with path: %s" % full_path)
+        :param list full_paths: A list of full_path values.
 
-        version = Version.query.filter(Version.full_path == os_independent_path).first()
-        logger.debug("version: %s" % version)
-        return version
+        :return: A list of :class:`~stalker.models.version.Version` instances
+          in the same order with the given paths, with None for the paths that
+          doesn't match any Version.
+        """
+        from sqlalchemy.orm.util import identity_key
+        from stalker import Repository, Version
+        from stalker.db.session import DBSession
+
+        os_independent_paths = []
+        for full_path in full_paths:
+            if full_path is None or full_path == "":
+                os_independent_paths.append(None)
+                continue
+            # convert '\\' to '/'
+            full_path = os.path.normpath(os.path.expandvars(full_path)).replace(
+                "\\", "/"
+            )
+            # trim repo path
+            os_independent_paths.append(Repository.to_os_independent_path(full_path))
+
+        versions_by_path = {}
+        paths_to_query = []
+        paths_by_cached_id = {}
+        for path in set(os_independent_paths):
+            if path is None:
+                continue
+            version_id = VersionPathCache.get(path)
+            if version_id is None:
+                paths_to_query.append(path)
+                continue
+            version = DBSession.identity_map.get(identity_key(Version, version_id))
+            if version is None:
+                paths_by_cached_id.setdefault(version_id, []).append(path)
+            elif version.full_path == path:
+                versions_by_path[path] = version
+            else:
+                paths_to_query.append(path)
+
+        batch_size = cls.query_batch_size
+
+        # query the cached versions by their ids and only look up the paths
+        # of the versions that are deleted or moved to another path
+        cached_ids = list(paths_by_cached_id)
+        for i in range(0, len(cached_ids), batch_size):
+            id_batch = cached_ids[i : i + batch_size]
+            logger.debug("getting %s versions with id" % len(id_batch))
+            for version in Version.query.filter(Version.id.in_(id_batch)).all():
+                for path in paths_by_cached_id.pop(version.id):
+                    if version.full_path == path:
+                        versions_by_path[path] = version
+                    else:
+                        paths_to_query.append(path)
+        for paths in paths_by_cached_id.values():
+            paths_to_query.extend(paths)
+
+        for i in range(0, len(paths_to_query), batch_size):
+            path_batch = paths_to_query[i : i + batch_size]
+
+            # try to get the versions with that info
+            logger.debug("getting %s versions with path" % len(path_batch))
+            versions = (
+                Version.query.filter(Version.full_path.in_(path_batch))
+                .order_by(Version.id)
+                .all()
+            )
+            for version in versions:
+                path = version.full_path
+                if path in versions_by_path:
+                    continue
+                versions_by_path[path] = version
+                VersionPathCache.set(path, version.id)
+
+        return [versions_by_path.get(path) for path in os_independent_paths]
 
     def get_current_version(self):
         """Returns the current Version instance from the DCC.
@@ -275,8 +463,7 @@ class DCCBase(object):
             recent_files = None
 
         if recent_files is not None:
-            for recent_file in recent_files:
-                version = self.get_version_from_full_path(recent_file)
+            for version in self.get_versions_from_full_paths(recent_files):
                 if version is not None:
                     break
 
@@ -411,7 +598,14 @@ class DCCBase(object):
         if not version:
             return reference_resolution
 
-        for v in version.walk_inputs():
+        # load the whole input graph and the latest published versions of all
+        # the versions in it with a few bulk queries
+        all_versions = self._prefetch_version_inputs(version)
+        latest_published_versions = self._get_latest_published_versions(
+            all_versions
+        )
+
+        for v in self._walk_inputs(version):
             dfs_version_references.append(v)
 
         if caller:
@@ -428,60 +622,22 @@ class DCCBase(object):
             "%s.check_referenced_versions()" % self.__class__.__name__,
         )
 
+        # the resolved action of each version, a version referenced multiple
+        # times is only resolved once
+        actions = {}
+        # ids of the versions in "update" or "create"
+        changed_version_ids = set()
+
         # iterate back in the list
         for v in reversed(dfs_version_references):
-            # check inputs first
-            to_be_updated_list = []
-            for ref_v in v.inputs:
-                if not ref_v.is_latest_published_version():
-                    to_be_updated_list.append(ref_v)
-
-            if to_be_updated_list:
-                action = "create"
-                # check if there is a new published version of this version
-                # that is using all the updated versions of the references
-                latest_published_version = v.latest_published_version
-                if latest_published_version and not v.is_latest_published_version():
-                    # so there is a new published version
-                    # check if its children needs any update
-                    # and the updated child versions are already
-                    # referenced to the this published version
-                    if all(
-                        [
-                            ref_v.latest_published_version
-                            in latest_published_version.inputs
-                            for ref_v in to_be_updated_list
-                        ]
-                    ):
-                        # so all new versions are referenced to this published
-                        # version, just update to this latest published version
-                        action = "update"
-                    else:
-                        # not all references are in the inputs
-                        # so we need to create a new version as usual
-                        # and update the references to the latest versions
-                        action = "create"
-            else:
-                # nothing needs to be updated,
-                # so check if this version has a new version,
-                # also there could be no reference under this referenced
-                # version
-                if v.is_latest_published_version():
-                    # do nothing
-                    action = "leave"
-                else:
-                    # update to latest published version
-                    action = "update"
-
-                # before setting the action check all the inputs in
-                # resolution_dictionary, if any of them are update, or create
-                # then set this one to 'create'
-                if any(
-                    rev_v in reference_resolution["update"]
-                    or rev_v in reference_resolution["create"]
-                    for rev_v in v.inputs
-                ):
-                    action = "create"
+            action = actions.get(v.id)
+            if action is None:
+                action = self._resolve_reference_action(
+                    v, latest_published_versions, changed_version_ids
+                )
+                actions[v.id] = action
+                if action != "leave":
+                    changed_version_ids.add(v.id)
 
             # so append this v to the related action list
             reference_resolution[action].append(v)
@@ -494,6 +650,176 @@ class DCCBase(object):
 
         return reference_resolution
 
+    @classmethod
+    def _resolve_reference_action(
+        cls, v, latest_published_versions, changed_version_ids
+    ):
+        """Return the action of the given referenced version.
+
+        :param v: The :class:`~stalker.models.version.Version` instance.
+        :param dict latest_published_versions: A dictionary of (task_id,
+          take_name) and latest published Version pairs.
+        :param set changed_version_ids: The ids of the already resolved
+          Versions that are going to be updated or created.
+        :return: One of "leave", "update" or "create".
+        """
+        # check inputs first
+        to_be_updated_list = [
+            ref_v
+            for ref_v in v.inputs
+            if not cls._is_latest_published_version(ref_v, latest_published_versions)
+        ]
+
+        if to_be_updated_list:
+            action = "create"
+            # check if there is a new published version of this version
+            # that is using all the updated versions of the references
+            latest_published_version = latest_published_versions.get(
+                (v.task_id, v.take_name)
+            )
+            if latest_published_version and not cls._is_latest_published_version(
+                v, latest_published_versions
+            ):
+                # so there is a new published version
+                # check if its children needs any update
+                # and the updated child versions are already
+                # referenced to the this published version
+                latest_inputs = set(latest_published_version.inputs)
+                if all(
+                    latest_published_versions.get((ref_v.task_id, ref_v.take_name))
+                    in latest_inputs
+                    for ref_v in to_be_updated_list
+                ):
+                    # so all new versions are referenced to this published
+                    # version, just update to this latest published version
+                    action = "update"
+        else:
+            # nothing needs to be updated,
+            # so check if this version has a new version,
+            # also there could be no reference under this referenced
+            # version
+            if cls._is_latest_published_version(v, latest_published_versions):
+                # do nothing
+                action = "leave"
+            else:
+                # update to latest published version
+                action = "update"
+
+            # before setting the action check all the inputs in
+            # resolution_dictionary, if any of them are update, or create
+            # then set this one to 'create'
+            if any(rev_v.id in changed_version_ids for rev_v in v.inputs):
+                action = "create"
+
+        return action
+
+    @classmethod
+    def _is_latest_published_version(cls, v, latest_published_versions):
+        """Return True if the given version is the latest published version.
+
+        :param v: The :class:`~stalker.models.version.Version` instance.
+        :param dict latest_published_versions: A dictionary of (task_id,
+          take_name) and latest published Version pairs.
+        :return: bool
+        """
+        return (
+            v.is_published
+            and latest_published_versions.get((v.task_id, v.take_name)) is v
+        )
+
+    @classmethod
+    def _walk_inputs(cls, version):
+        """Walk the inputs of the given version in depth first order.
+
+        Yields the same sequence with ``Version.walk_inputs()`` without the
+        cost of inserting to the front of a list.
+
+        :param version: The :class:`~stalker.models.version.Version` instance.
+        """
+        versions_to_visit = [version]
+        while versions_to_visit:
+            current_version = versions_to_visit.pop()
+            versions_to_visit.extend(reversed(current_version.inputs))
+            yield current_version
+
+    @classmethod
+    def _prefetch_version_inputs(cls, version):
+        """Load the inputs of the given version and all of its inputs deeply,
+        with one query per depth level.
+
+        :param version: The :class:`~stalker.models.version.Version` instance.
+        :return: A list of all the unique Versions in the input graph including
+          the given version.
+        """
+        from sqlalchemy.orm import selectinload
+        from stalker import Version
+
+        versions = {version.id: version}
+        ids_to_load = [version.id]
+        while ids_to_load:
+            next_ids_to_load = []
+            for i in range(0, len(ids_to_load), cls.query_batch_size):
+                batch = ids_to_load[i : i + cls.query_batch_size]
+                loaded_versions = (
+                    Version.query.options(selectinload(Version.inputs))
+                    .filter(Version.id.in_(batch))
+                    .all()
+                )
+                for loaded_version in loaded_versions:
+                    for input_version in loaded_version.inputs:
+                        if input_version.id not in versions:
+                            versions[input_version.id] = input_version
+                            next_ids_to_load.append(input_version.id)
+            ids_to_load = next_ids_to_load
+
+        return list(versions.values())
+
+    @classmethod
+    def _get_latest_published_versions(cls, versions):
+        """Return the latest published versions of the given versions in bulk.
+
+        :param list versions: A list of
+          :class:`~stalker.models.version.Version` instances.
+        :return: A dictionary of (task_id, take_name) and latest published
+          Version pairs. Keys without a published version are not included.
+        """
+        from sqlalchemy import and_, func
+        from stalker import Version
+        from stalker.db.session import DBSession
+
+        task_ids = sorted(set(v.task_id for v in versions))
+        latest_published_versions = {}
+        for i in range(0, len(task_ids), cls.query_batch_size):
+            batch = task_ids[i : i + cls.query_batch_size]
+            latest_version_numbers = (
+                DBSession.query(
+                    Version.task_id,
+                    Version.take_name,
+                    func.max(Version.version_number).label("version_number"),
+                )
+                .filter(Version.is_published == True)
+                .filter(Version.task_id.in_(batch))
+                .group_by(Version.task_id, Version.take_name)
+                .subquery()
+            )
+            latest_versions = (
+                Version.query.join(
+                    latest_version_numbers,
+                    and_(
+                        Version.task_id == latest_version_numbers.c.task_id,
+                        Version.take_name == latest_version_numbers.c.take_name,
+                        Version.version_number
+                        == latest_version_numbers.c.version_number,
+                    ),
+                )
+                .filter(Version.is_published == True)
+                .all()
+            )
+            for v in latest_versions:
+                latest_published_versions[(v.task_id, v.take_name)] = v
+
+        return latest_published_versions
+
     def get_referenced_versions(self, parent_ref=None):
         """Returns the :class:`~stalker.models.version.Version` instances which
         are referenced in to the current scene
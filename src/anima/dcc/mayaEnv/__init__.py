@@ -258,6 +258,9 @@ workspace -fr "translatorData" "Outputs/data";
 
     extensions = [".ma", ".mb"]
 
+    # minimum time in milliseconds between two main progress bar updates
+    progress_update_interval = 100
+
     def __init__(self, version=None):
         # super(Maya, self).__init__(self.name, version)
         DCCBase.__init__(self, self.name, version)
@@ -285,6 +288,8 @@ workspace -fr "translatorData" "Outputs/data";
             pdm.dialog_class = ProgressDialogBase
         else:
             pdm.dialog_class = MayaMainProgressBarWrapper
+            # do not repaint the main progress bar on every step
+            pdm.update_interval = self.progress_update_interval
         pdm.end_progress()  # reset pdm.dialog
 
     @classmethod
@@ -1311,6 +1316,12 @@ workspace -fr "translatorData" "Outputs/data";
                 "in total" % (parent_ref, ref_count),
             )
 
+        # resolve all the versions at once
+        ref_paths = sorted(set(ref.path for ref in refs))
+        versions_by_path = dict(
+            zip(ref_paths, self.get_versions_from_full_paths(ref_paths))
+        )
+
         prev_path = ""
         versions = []
         logger.debug("loop through %i references" % ref_count)
@@ -1319,7 +1330,7 @@ workspace -fr "translatorData" "Outputs/data";
             path = ref.path
             if path != prev_path:
                 # try to get a version with the given path
-                version = self.get_version_from_full_path(path)
+                version = versions_by_path[path]
                 if version:
                     # check if this is a representation
                     if Representation.repr_separator in version.take_name:
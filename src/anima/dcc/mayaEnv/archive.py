@@ -3,11 +3,11 @@
 import glob
 import os
 import re
-import shutil
 
 from anima import logger
-from anima.utils.archive import ArchiverBase
+from anima.utils.archive import ArchiverBase, ReferenceRewriter
 
+from sqlalchemy import or_
 from stalker import Project, Task, Version
 
 
@@ -19,6 +19,9 @@ class Archiver(ArchiverBase):
     references to the original ones when the original file is returned.
     """
 
+    # number of file names to search for in one database query
+    query_batch_size = 500
+
     default_workspace_content = """// Anima Archiver Default Project Definition
 
 workspace -fr "translatorData" "data";
@@ -120,27 +123,7 @@ sourceimages/3dPaintTextures"""
 
         :return:
         """
-        path_regex = r"\$REPO[\w\d\/_\.@\<\>]+"
-        # so we have all the data
-        # extract references
-        ref_paths = list(set(re.findall(path_regex, data)))
-
-        # also check for any paths that is starting with any of the $REPO
-        # variable value
-        for k in os.environ.keys():
-            if k.startswith("REPO"):
-                # consider this as a repository path and find all of the paths
-                # starting with this value
-                repo_path = os.environ[k]
-                path_regex = r"{}[\w\d\/_\.@\<\>]+".format(repo_path)
-                temp_ref_paths = list(set(re.findall(path_regex, data)))
-                ref_paths += temp_ref_paths
-
-        return list(
-            filter(
-                lambda x: os.path.splitext(x)[-1] not in self.exclude_mask, ref_paths
-            )
-        )
+        return ReferenceRewriter(exclude_mask=self.exclude_mask).find(data)
 
     def _move_file_and_fix_references(
         self, path, project_path, scenes_folder="", refs_folder=""
@@ -196,26 +179,20 @@ sourceimages/3dPaintTextures"""
         ref_paths = []
         # only get new ref paths for '.ma' files
         if path.endswith(".ma"):
-            # read the data of the original file
-            with open(path) as f:
-                data = f.read()
 
-            ref_paths = self._extract_references(data)
-            # fix all reference paths
-            for ref_path in ref_paths:
+            def get_new_ref_path(ref_path):
                 ref_ext = os.path.splitext(ref_path)[-1]
-                data = data.replace(
-                    ref_path,
-                    "{}/{}".format(
-                        scenes_folder_lut.get(ref_ext, refs_folder),
-                        os.path.basename(ref_path),
-                    )
+                return "{}/{}".format(
+                    scenes_folder_lut.get(ref_ext, refs_folder),
+                    os.path.basename(ref_path),
                 )
 
-            # now write all the data back to a new temp scene
+            # write the data with all the reference paths fixed to a new temp
+            # scene
             logger.debug("new_file_path: {}".format(new_file_path))
-            with open(new_file_path, "w+") as f:
-                f.write(data)
+            ref_paths = ReferenceRewriter(exclude_mask=self.exclude_mask).rewrite(
+                path, new_file_path, get_new_ref_path
+            )
         else:
             # fix for UDIM texture paths
             # if the path contains <udim> find the other textures
@@ -282,10 +259,7 @@ sourceimages/3dPaintTextures"""
             # just copy the file
             for original_file_path, new_file_path in new_file_paths:
                 logger.debug("new_file_path: {}".format(new_file_path))
-                try:
-                    shutil.copy(original_file_path, new_file_path)
-                except IOError:
-                    pass
+                self._copy_file(original_file_path, new_file_path)
 
         return ref_paths
 
@@ -346,52 +320,121 @@ sourceimages/3dPaintTextures"""
         # now encode the data to utf-8
         data = data.decode("utf-8")
 
-        unknown_references = []
         ref_paths = cls._extract_local_references(data)
-        for ref_path in ref_paths:
-            ref_file_name = os.path.basename(ref_path)
-            logger.debug(f"ref_file_name: {ref_file_name}")
-
-            # try to find a corresponding Stalker Version instance with it
-            versions = []
-            if project is not None:
-                # use the given project
-                versions = (
-                    Version.query.join(Task, Version.task_id == Task.id)
-                    .filter(Task.project == project)
-                    .filter(Version.full_path.endswith(ref_file_name))
-                    .all()
-                )
-
-            if not versions:
-                print("no version found in the same project, "
-                      "looking in to other projects")
-                # try to look in to all projects, order by Project.date_created
-                versions = (
-                    Version.query.join(Task, Version.task_id == Task.id)
-                    .join(Project, Task.project_id == Project.id)
-                    .filter(Version.full_path.endswith(ref_file_name))
-                    .order_by(Project.date_created)
-                    .all()
-                )
-
-            version = None
-            for v in versions:
-                # check the whole filename
-                if v.filename == ref_file_name:
-                    version = v
-                    break
+        versions_by_file_name = cls._find_versions_by_file_name(
+            [os.path.basename(ref_path) for ref_path in ref_paths], project=project
+        )
 
+        unknown_references = []
+        new_paths = {}
+        for ref_path in ref_paths:
+            if ref_path in new_paths or ref_path in unknown_references:
+                continue
+            version = versions_by_file_name.get(os.path.basename(ref_path))
             if version:
-                # replace it
-                data = data.replace(ref_path, version.full_path)
+                new_paths[ref_path] = version.full_path
             else:
                 # update unknown references
                 unknown_references.append(ref_path)
 
+        if new_paths:
+            # replace all of them in one pass, longest paths first so a path
+            # is never replaced by a shorter one that is a part of it
+            ref_path_regex = re.compile(
+                "|".join(
+                    re.escape(ref_path)
+                    for ref_path in sorted(new_paths, key=len, reverse=True)
+                )
+            )
+            data = ref_path_regex.sub(lambda m: new_paths[m.group(0)], data)
+
         if len(ref_paths):
             # save the file over itself
             with open(path, "w+") as f:
                 f.write(data)
 
         return unknown_references
+
+    @classmethod
+    def _find_versions_by_file_name(cls, file_names, project=None):
+        """Find the Versions of the given file names in bulk.
+
+        The Versions are first searched among the given project Versions, the
+        file names without any candidates in that project are then searched in
+        all the projects ordered by Project.date_created. The number of queries
+        does not depend on the number of file names.
+
+        :param list file_names: A list of file names (without the path).
+        :param Project project: If given the file names will be searched among
+          the given project Versions first.
+
+        :return: A dictionary of file name and Version pairs, file names
+          without a Version are not included.
+        """
+        file_names = set(file_names)
+        versions_by_file_name = {}
+        if not file_names:
+            return versions_by_file_name
+
+        remaining_file_names = file_names
+        if project is not None:
+            # use the given project
+            query = Version.query.join(Task, Version.task_id == Task.id).filter(
+                Task.project == project
+            )
+            candidates = cls._collect_versions(
+                query, file_names, versions_by_file_name
+            )
+            remaining_file_names = file_names - candidates
+
+        if remaining_file_names:
+            logger.debug(
+                "no version found in the same project for {} files, "
+                "looking in to other projects".format(len(remaining_file_names))
+            )
+            # try to look in to all projects, order by Project.date_created
+            query = (
+                Version.query.join(Task, Version.task_id == Task.id)
+                .join(Project, Task.project_id == Project.id)
+                .order_by(Project.date_created, Version.id)
+            )
+            cls._collect_versions(query, remaining_file_names, versions_by_file_name)
+
+        return versions_by_file_name
+
+    @classmethod
+    def _collect_versions(cls, query, file_names, versions_by_file_name):
+        """Fill versions_by_file_name with the first Version returned by the
+        query, whose filename exactly matches one of the given file names.
+
+        :param query: The base Version query.
+        :param set file_names: The file names to look for.
+        :param dict versions_by_file_name: The file name and Version dictionary
+          to be updated.
+
+        :return: The set of file names that has at least one Version that its
+          full_path ends with the file name.
+        """
+        candidates = set()
+        sorted_file_names = sorted(file_names)
+        # keep the OR clauses in reasonable sizes for the database
+        for i in range(0, len(sorted_file_names), cls.query_batch_size):
+            batch = sorted_file_names[i : i + cls.query_batch_size]
+            versions = query.filter(
+                or_(
+                    *[
+                        Version.full_path.endswith(file_name, autoescape=True)
+                        for file_name in batch
+                    ]
+                )
+            ).all()
+            for v in versions:
+                filename = v.filename
+                # any tail of the filename that is searched for is a candidate
+                for j in range(len(filename)):
+                    if filename[j:] in file_names:
+                        candidates.add(filename[j:])
+                # check the whole filename
+                if filename in file_names and filename not in versions_by_file_name:
+                    versions_by_file_name[filename] = v
+        return candidates
@@ -11,9 +11,11 @@ import anima
 from anima.publish import (
     clear_publishers,
     publisher,
+    snapshot_provider,
     staging,
     POST_PUBLISHER_TYPE,
     ProgressControllerBase,
+    SceneSnapshot,
 )
 from anima.exc import PublishError
 from anima.representation import Representation
@@ -24,6 +26,86 @@ clear_publishers()
 
 MAX_NODE_DISPLAY = 80
 
+
+@snapshot_provider("meshes")
+def get_all_meshes(snapshot):
+    """returns all the mesh nodes in the scene"""
+    return pm.ls(type="mesh")
+
+
+@snapshot_provider("references")
+def get_all_references(snapshot):
+    """returns the first level references in the scene"""
+    return pm.listReferences()
+
+
+@snapshot_provider("mesh_component_counts")
+def get_all_mesh_component_counts(snapshot):
+    """returns the names, vertex and uv counts of the meshes in the scene"""
+    return sorted(
+        (node.name(), node.numVertices(), node.numUVs())
+        for node in snapshot.get("meshes")
+    )
+
+
+@snapshot_provider("mesh_uv_bounds")
+def get_all_mesh_uv_bounds(snapshot):
+    """returns the names and the uv bounding boxes of the meshes in the scene"""
+    mesh_uv_bounds = []
+    for node, num_vertices, num_uvs in snapshot.get("mesh_component_counts"):
+        uv_bounds = None
+        if num_uvs:
+            uv_bounds = mc.polyEvaluate(node, boundingBox2d=True)
+        mesh_uv_bounds.append((node, num_uvs, uv_bounds))
+    return mesh_uv_bounds
+
+
+@snapshot_provider("referenced_versions")
+def get_referenced_versions(snapshot):
+    """returns the Stalker Versions of the first level references in the same
+    order with the references
+    """
+    from anima.dcc.mayaEnv import Maya
+
+    return Maya.get_versions_from_full_paths(
+        [ref.path for ref in snapshot.get("references")]
+    )
+
+
+def get_mesh_component_counts(snapshot):
+    """returns the vertex and uv counts of the meshes as a fingerprint"""
+    return snapshot.get("mesh_component_counts")
+
+
+def get_mesh_uv_bounds(snapshot):
+    """returns the uv bounding boxes of the meshes as a fingerprint"""
+    return snapshot.get("mesh_uv_bounds")
+
+
+def get_reference_paths(snapshot):
+    """returns the paths of the references as a fingerprint"""
+    return sorted(ref.path for ref in snapshot.get("references"))
+
+
+def get_reference_paths_and_publish_states(snapshot):
+    """returns the paths of the references and the publish states of their
+    versions as a fingerprint
+    """
+    return sorted(
+        (ref.path, version.is_published if version else None)
+        for ref, version in zip(
+            snapshot.get("references"), snapshot.get("referenced_versions")
+        )
+    )
+
+
+def get_reference_paths_and_scene_name(snapshot):
+    """returns the paths of the references and the scene name as a
+    fingerprint
+    """
+    return [pm.sceneName()] + get_reference_paths(snapshot)
+
+
 # TODO: this should be depending on to the project some projects still can
 #       use mental ray
 VALID_MATERIALS = {
@@ -489,8 +571,10 @@ def convert_old_object_smoothing_to_renderer_time_smoothing(progress_controller=
     progress_controller.complete()
 
 
-@publisher
-def check_local_references(progress_controller=None):
+@publisher(
+    requires=["references"], read_only=True, fingerprint=get_reference_paths
+)
+def check_local_references(progress_controller=None, snapshot=None):
     """Legitimate references
 
     check if all the references are legit
@@ -498,7 +582,10 @@ def check_local_references(progress_controller=None):
     if progress_controller is None:
         progress_controller = ProgressControllerBase()
 
-    all_references = pm.listReferences()
+    if snapshot is None:
+        snapshot = SceneSnapshot()
+
+    all_references = snapshot.get("references")
     progress_controller.maximum = len(all_references)
     for ref in all_references:
         progress_controller.increment()
@@ -508,8 +595,12 @@ def check_local_references(progress_controller=None):
     progress_controller.complete()
 
 
-@publisher
-def check_if_previous_version_references(progress_controller=None):
+@publisher(
+    requires=["references"],
+    read_only=True,
+    fingerprint=get_reference_paths_and_scene_name,
+)
+def check_if_previous_version_references(progress_controller=None, snapshot=None):
     """No previous version is referenced
 
     check if a previous version of the same task is referenced to the scene
@@ -517,6 +608,9 @@ def check_if_previous_version_references(progress_controller=None):
     if progress_controller is None:
         progress_controller = ProgressControllerBase()
 
+    if snapshot is None:
+        snapshot = SceneSnapshot()
+
     from anima.dcc.mayaEnv import Maya
 
     m = Maya()
@@ -527,7 +621,7 @@ def check_if_previous_version_references(progress_controller=None):
         return
 
     same_version_references = []
-    all_references = pm.listReferences()
+    all_references = snapshot.get("references")
     progress_controller.maximum = len(all_references)
     for ref in all_references:  # check only 1st level references
         ref_version = m.get_version_from_full_path(ref.path)
@@ -586,8 +680,12 @@ def delete_empty_namespaces(progress_controller=None):
     progress_controller.complete()
 
 
-@publisher
-def check_only_published_versions_are_used(progress_controller=None):
+@publisher(
+    requires=["references", "referenced_versions"],
+    read_only=True,
+    fingerprint=get_reference_paths_and_publish_states,
+)
+def check_only_published_versions_are_used(progress_controller=None, snapshot=None):
     """References are all Published
 
     checks if only published versions are used in this scene
@@ -595,11 +693,13 @@ def check_only_published_versions_are_used(progress_controller=None):
     if progress_controller is None:
         progress_controller = ProgressControllerBase()
 
+    if snapshot is None:
+        snapshot = SceneSnapshot()
+
     non_published_versions = []
-    all_references = pm.listReferences()
-    progress_controller.maximum = len(all_references)
-    for ref in all_references:
-        v = ref.version
+    all_versions = snapshot.get("referenced_versions")
+    progress_controller.maximum = len(all_versions)
+    for v in all_versions:
         if v and not v.is_published:
             non_published_versions.append(v)
         progress_controller.increment()
@@ -998,8 +1098,8 @@ def check_empty_groups(progress_controller=None):
         )
 
 
-@publisher("model")
-def check_empty_shapes(progress_controller=None):
+@publisher("model", requires=["meshes"], read_only=True)
+def check_empty_shapes(progress_controller=None, snapshot=None):
     """No empty mesh nodes
 
     checks if there are empty mesh nodes
@@ -1007,8 +1107,11 @@ def check_empty_shapes(progress_controller=None):
     if progress_controller is None:
         progress_controller = ProgressControllerBase()
 
+    if snapshot is None:
+        snapshot = SceneSnapshot()
+
     empty_shape_nodes = []
-    all_meshes = pm.ls(type="mesh")
+    all_meshes = snapshot.get("meshes")
     progress_controller.maximum = len(all_meshes)
     for node in all_meshes:
         if node.numVertices() == 0:
@@ -1024,19 +1127,22 @@ def check_empty_shapes(progress_controller=None):
         )
 
 
-@publisher("model")
-def check_default_uv_set(progress_controller=None):
+@publisher("model", requires=["meshes"], read_only=True)
+def check_default_uv_set(progress_controller=None, snapshot=None):
     """checks if all meshes have the default UV set named as map1"""
     if progress_controller is None:
         progress_controller = ProgressControllerBase()
 
+    if snapshot is None:
+        snapshot = SceneSnapshot()
+
     # skip if this is a representation
     v = staging.get("version")
     if v and Representation.repr_separator in v.take_name:
         progress_controller.complete()
         return
 
-    all_meshes = pm.ls(type="mesh")
+    all_meshes = snapshot.get("meshes")
     progress_controller.maximum = len(all_meshes)
     nodes_with_non_default_uvset = []
     for node in all_meshes:
@@ -1070,8 +1176,13 @@ def check_default_uv_set___fix():
     pm.select(cl=1)
 
 
-@publisher("model")
-def check_uv_existence(progress_controller=None):
+@publisher(
+    "model",
+    requires=["meshes"],
+    read_only=True,
+    fingerprint=get_mesh_component_counts,
+)
+def check_uv_existence(progress_controller=None, snapshot=None):
     """All objects have UVs
 
     check if there are uvs in all objects
@@ -1079,13 +1190,16 @@ def check_uv_existence(progress_controller=None):
     if progress_controller is None:
         progress_controller = ProgressControllerBase()
 
+    if snapshot is None:
+        snapshot = SceneSnapshot()
+
     # skip if this is a representation
     v = staging.get("version")
     if v and Representation.repr_separator in v.take_name:
         progress_controller.complete()
         return
 
-    all_meshes = pm.ls(type="mesh")
+    all_meshes = snapshot.get("meshes")
     progress_controller.maximum = len(all_meshes)
     nodes_with_no_uvs = []
     for node in all_meshes:
@@ -1106,8 +1220,14 @@ def check_uv_existence(progress_controller=None):
         )
 
 
-@publisher("model")
-def check_out_of_space_uvs(progress_controller=None):
+@publisher(
+    "model",
+    depends=["check_uv_existence"],
+    requires=["meshes"],
+    read_only=True,
+    fingerprint=get_mesh_uv_bounds,
+)
+def check_out_of_space_uvs(progress_controller=None, snapshot=None):
     """UV values are smaller than 10.0
 
     checks if there are uvs with u values that are bigger than 10.0
@@ -1115,13 +1235,16 @@ def check_out_of_space_uvs(progress_controller=None):
     if progress_controller is None:
         progress_controller = ProgressControllerBase()
 
+    if snapshot is None:
+        snapshot = SceneSnapshot()
+
     # skip if this is a representation
     v = staging.get("version")
     if v and Representation.repr_separator in v.take_name:
         progress_controller.complete()
         return
 
-    all_meshes = pm.ls(type="mesh")
+    all_meshes = snapshot.get("meshes")
     mesh_count = len(all_meshes)
     progress_controller.maximum = mesh_count
     nodes_with_out_of_space_uvs = []
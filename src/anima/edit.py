@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import io
 import os
 
 
@@ -15,6 +16,19 @@ class EditBase(object):
 
     def to_xml(self, indentation=2, pre_indent=0):
         """returns an xml version of this PrevisBase object"""
+        stream = io.StringIO()
+        self.write_xml(stream, indentation=indentation, pre_indent=pre_indent)
+        return stream.getvalue()
+
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this PrevisBase object to the given
+        stream, without building the whole xml in memory
+
+        :param stream: A file like object with a ``write`` method.
+        :param int indentation: The number of spaces to indent the child
+          elements.
+        :param int pre_indent: The number of spaces to indent this element.
+        """
         raise NotImplementedError
 
     def from_edl(self, edl_list):
@@ -152,36 +166,41 @@ class Sequence(EditBase, NameMixin, DurationMixin):
 
         self.media = media
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Sequence object"""
-        template = """<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE xmeml>
-<xmeml version="5">
-%(pre_indent)s<sequence>
-%(pre_indent)s%(indentation)s<duration>%(duration)s</duration>
-%(pre_indent)s%(indentation)s<name>%(name)s</name>
-%(rate)s
-%(pre_indent)s%(indentation)s<timecode>
-%(pre_indent)s%(indentation)s%(indentation)s<string>%(timecode)s</string>
-%(pre_indent)s%(indentation)s</timecode>
-%(media)s
-%(pre_indent)s</sequence>
-</xmeml>"""
-
-        return template % {
-            "duration": self.duration,
-            "name": self.name,
-            "ntsc": str(self.ntsc).upper(),
-            "rate": self.rate.to_xml(
-                indentation=indentation, pre_indent=indentation + pre_indent
-            ),
-            "timecode": self.timecode,
-            "media": self.media.to_xml(
-                indentation=indentation, pre_indent=indentation + pre_indent
-            ),
-            "indentation": " " * indentation,
-            "pre_indent": " " * pre_indent,
-        }
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this Sequence object to the given stream"""
+        pre_indent_str = " " * pre_indent
+        indentation_str = " " * indentation
+        stream.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            "<!DOCTYPE xmeml>\n"
+            '<xmeml version="5">\n'
+            "%(pre_indent)s<sequence>\n"
+            "%(pre_indent)s%(indentation)s<duration>%(duration)s</duration>\n"
+            "%(pre_indent)s%(indentation)s<name>%(name)s</name>\n"
+            % {
+                "duration": self.duration,
+                "name": self.name,
+                "pre_indent": pre_indent_str,
+                "indentation": indentation_str,
+            }
+        )
+        self.rate.write_xml(
+            stream, indentation=indentation, pre_indent=indentation + pre_indent
+        )
+        stream.write(
+            "\n%(pre_indent)s%(indentation)s<timecode>\n"
+            "%(pre_indent)s%(indentation)s%(indentation)s<string>%(timecode)s</string>\n"
+            "%(pre_indent)s%(indentation)s</timecode>\n"
+            % {
+                "timecode": self.timecode,
+                "pre_indent": pre_indent_str,
+                "indentation": indentation_str,
+            }
+        )
+        self.media.write_xml(
+            stream, indentation=indentation, pre_indent=indentation + pre_indent
+        )
+        stream.write("\n%s</sequence>\n</xmeml>" % pre_indent_str)
 
     def from_edl(self, edl_list):
         """Fills attributes with the given edl.List instance
@@ -424,21 +443,14 @@ class Media(EditBase):
         video.from_xml(xml_video_tag)
         self.video = video
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Media object"""
-        template = """%(pre_indent)s<media>
-%(video)s
-%(pre_indent)s</media>"""
-
-        video_data = self.video.to_xml(
-            indentation=indentation, pre_indent=indentation + pre_indent
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this Media object to the given stream"""
+        pre_indent_str = " " * pre_indent
+        stream.write("%s<media>\n" % pre_indent_str)
+        self.video.write_xml(
+            stream, indentation=indentation, pre_indent=indentation + pre_indent
         )
-
-        return template % {
-            "video": video_data,
-            "pre_indent": " " * pre_indent,
-            "indentation": " " * indentation,
-        }
+        stream.write("\n%s</media>" % pre_indent_str)
 
 
 class Video(EditBase):
@@ -465,34 +477,31 @@ class Video(EditBase):
 
             self.tracks.append(track)
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Video object"""
-        template = """%(pre_indent)s<video>
-%(pre_indent)s%(indentation)s<format>
-%(pre_indent)s%(indentation)s%(indentation)s<samplecharacteristics>
-%(pre_indent)s%(indentation)s%(indentation)s%(indentation)s<width>%(width)s</width>
-%(pre_indent)s%(indentation)s%(indentation)s%(indentation)s<height>%(height)s</height>
-%(pre_indent)s%(indentation)s%(indentation)s</samplecharacteristics>
-%(pre_indent)s%(indentation)s</format>
-%(tracks)s
-%(pre_indent)s</video>"""
-
-        track_data = []
-        for track in self.tracks:
-            track_data.append(
-                track.to_xml(
-                    indentation=indentation, pre_indent=indentation + pre_indent
-                )
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this Video object to the given stream"""
+        pre_indent_str = " " * pre_indent
+        stream.write(
+            "%(pre_indent)s<video>\n"
+            "%(pre_indent)s%(indentation)s<format>\n"
+            "%(pre_indent)s%(indentation)s%(indentation)s<samplecharacteristics>\n"
+            "%(pre_indent)s%(indentation)s%(indentation)s%(indentation)s<width>%(width)s</width>\n"
+            "%(pre_indent)s%(indentation)s%(indentation)s%(indentation)s<height>%(height)s</height>\n"
+            "%(pre_indent)s%(indentation)s%(indentation)s</samplecharacteristics>\n"
+            "%(pre_indent)s%(indentation)s</format>\n"
+            % {
+                "width": self.width,
+                "height": self.height,
+                "pre_indent": pre_indent_str,
+                "indentation": " " * indentation,
+            }
+        )
+        for i, track in enumerate(self.tracks):
+            if i:
+                stream.write("\n")
+            track.write_xml(
+                stream, indentation=indentation, pre_indent=indentation + pre_indent
             )
-        track_data_as_str = "\n".join(track_data)
-
-        return template % {
-            "width": self.width,
-            "height": self.height,
-            "tracks": track_data_as_str,
-            "pre_indent": " " * pre_indent,
-            "indentation": " " * indentation,
-        }
+        stream.write("\n%s</video>" % pre_indent_str)
 
 
 class Track(EditBase):
@@ -505,31 +514,33 @@ class Track(EditBase):
 
     def optimize_clips(self):
         """optimizes files across all clips to use the same file node if two or
-        more clips are using the same files
+        more clips are using the same files, also makes the clip ids unique by
+        adding an increasing number to the duplicate ids
         """
-        # check all clip files and set to the same file node if the path is
-        # the same
-        for i in range(len(self.clips)):
-            clip = self.clips[i]
-            # go over the rest of the clips
-            for j in range(i + 1, len(self.clips)):
-                compare_clip = self.clips[j]
-                if clip.file.pathurl == compare_clip.file.pathurl:
-                    compare_clip.file = clip.file
-
-                # also check the ids
-                if clip.id == compare_clip.id:
-                    # get the id randomized part
-                    random_part = clip.id.split(" ")[-1]
-                    if random_part != clip.id:
-                        random_id = int(random_part) + 1
-                        compare_clip.id = "{} {}".format(
-                            clip.id.split(" ")[0],
-                            random_id
-                        )
-                    else:
-                        random_id = 2
-                        compare_clip.id = "{} {}".format(clip.id, random_id)
+        files_by_pathurl = {}
+        used_ids = set()
+        # the next number to try for each id base name
+        id_numbers = {}
+        for clip in self.clips:
+            # use the first file node with the same pathurl
+            clip.file = files_by_pathurl.setdefault(clip.file.pathurl, clip.file)
+
+            id_ = clip.id
+            if id_ in used_ids:
+                base_name, _, number = id_.rpartition(" ")
+                if base_name and number.isdigit():
+                    number = int(number) + 1
+                else:
+                    base_name = id_
+                    number = 2
+                number = max(number, id_numbers.get(base_name, number))
+                id_ = "{} {}".format(base_name, number)
+                while id_ in used_ids:
+                    number += 1
+                    id_ = "{} {}".format(base_name, number)
+                id_numbers[base_name] = number + 1
+                clip.id = id_
+            used_ids.add(id_)
 
     def from_xml(self, xml_node):
         """Fills attributes with the given XML node
@@ -545,30 +556,27 @@ class Track(EditBase):
             clip.from_xml(clip_tag)
             self.clips.append(clip)
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Track object"""
-        template = """%(pre_indent)s<track>
-%(pre_indent)s%(indentation)s<locked>%(locked)s</locked>
-%(pre_indent)s%(indentation)s<enabled>%(enabled)s</enabled>
-%(clips)s
-%(pre_indent)s</track>"""
-
-        clip_data = []
-        for clip in self.clips:
-            clip_data.append(
-                clip.to_xml(
-                    indentation=indentation, pre_indent=indentation + pre_indent
-                )
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this Track object to the given stream"""
+        pre_indent_str = " " * pre_indent
+        stream.write(
+            "%(pre_indent)s<track>\n"
+            "%(pre_indent)s%(indentation)s<locked>%(locked)s</locked>\n"
+            "%(pre_indent)s%(indentation)s<enabled>%(enabled)s</enabled>\n"
+            % {
+                "locked": str(self.locked).upper(),
+                "enabled": str(self.enabled).upper(),
+                "pre_indent": pre_indent_str,
+                "indentation": " " * indentation,
+            }
+        )
+        for i, clip in enumerate(self.clips):
+            if i:
+                stream.write("\n")
+            clip.write_xml(
+                stream, indentation=indentation, pre_indent=indentation + pre_indent
             )
-        clip_data_as_str = "\n".join(clip_data)
-
-        return template % {
-            "locked": str(self.locked).upper(),
-            "enabled": str(self.enabled).upper(),
-            "clips": clip_data_as_str,
-            "pre_indent": " " * pre_indent,
-            "indentation": " " * indentation,
-        }
+        stream.write("\n%s</track>" % pre_indent_str)
 
 
 class Clip(EditBase, NameMixin, DurationMixin):
@@ -662,41 +670,42 @@ class Clip(EditBase, NameMixin, DurationMixin):
 
             self.file = f
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Clip object"""
-        template = """%(pre_indent)s<clipitem id="%(id)s">
-%(pre_indent)s%(indentation)s<end>%(end)i</end>
-%(pre_indent)s%(indentation)s<name>%(name)s</name>
-%(pre_indent)s%(indentation)s<enabled>%(enabled)s</enabled>
-%(pre_indent)s%(indentation)s<start>%(start)i</start>
-%(pre_indent)s%(indentation)s<in>%(in)i</in>
-%(pre_indent)s%(indentation)s<duration>%(duration)i</duration>%(rate)s
-%(pre_indent)s%(indentation)s<out>%(out)i</out>
-%(file)s
-%(pre_indent)s</clipitem>"""
-
-        rate_xml = ""
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this Clip object to the given stream"""
+        pre_indent_str = " " * pre_indent
+        indentation_str = " " * indentation
+        stream.write(
+            '%(pre_indent)s<clipitem id="%(id)s">\n'
+            "%(pre_indent)s%(indentation)s<end>%(end)i</end>\n"
+            "%(pre_indent)s%(indentation)s<name>%(name)s</name>\n"
+            "%(pre_indent)s%(indentation)s<enabled>%(enabled)s</enabled>\n"
+            "%(pre_indent)s%(indentation)s<start>%(start)i</start>\n"
+            "%(pre_indent)s%(indentation)s<in>%(in)i</in>\n"
+            "%(pre_indent)s%(indentation)s<duration>%(duration)i</duration>"
+            % {
+                "id": self.id,
+                "start": self.start,
+                "end": self.end,
+                "name": self.name,
+                "enabled": self.enabled,
+                "duration": self.duration,
+                "in": self.in_,
+                "pre_indent": pre_indent_str,
+                "indentation": indentation_str,
+            }
+        )
         if self.rate:
-            rate_xml = "\n{}".format(self.rate.to_xml(
-                indentation=indentation, pre_indent=pre_indent + indentation
-            ))
-
-        return template % {
-            "id": self.id,
-            "start": self.start,
-            "end": self.end,
-            "name": self.name,
-            "enabled": self.enabled,
-            "duration": self.duration,
-            "in": self.in_,
-            "out": self.out,
-            "file": self.file.to_xml(
-                indentation=indentation, pre_indent=pre_indent + indentation
-            ),
-            "pre_indent": " " * pre_indent,
-            "indentation": " " * indentation,
-            "rate": rate_xml,
-        }
+            stream.write("\n")
+            self.rate.write_xml(
+                stream, indentation=indentation, pre_indent=pre_indent + indentation
+            )
+        stream.write(
+            "\n%s%s<out>%i</out>\n" % (pre_indent_str, indentation_str, self.out)
+        )
+        self.file.write_xml(
+            stream, indentation=indentation, pre_indent=pre_indent + indentation
+        )
+        stream.write("\n%s</clipitem>" % pre_indent_str)
 
 
 class File(EditBase, NameMixin, DurationMixin):
@@ -785,8 +794,12 @@ class File(EditBase, NameMixin, DurationMixin):
         if pathurl_node is not None:
             self.pathurl = pathurl_node.text
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this File object"""
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this File object to the given stream
+
+        The file node is written in full only once, the following calls write
+        a reference to the same file id.
+        """
         if self.exported_once:
             template = """%(pre_indent)s<file id="%(id)s"/>"""
         else:
@@ -797,14 +810,17 @@ class File(EditBase, NameMixin, DurationMixin):
 %(pre_indent)s</file>"""
             self.exported_once = True
 
-        return template % {
-            "id": self.id,
-            "duration": self.duration,
-            "name": self.name,
-            "pathurl": self.pathurl,
-            "pre_indent": " " * pre_indent,
-            "indentation": " " * indentation,
-        }
+        stream.write(
+            template
+            % {
+                "id": self.id,
+                "duration": self.duration,
+                "name": self.name,
+                "pathurl": self.pathurl,
+                "pre_indent": " " * pre_indent,
+                "indentation": " " * indentation,
+            }
+        )
 
 
 class Rate(EditBase):
@@ -887,15 +903,18 @@ class Rate(EditBase):
             self.timebase = rate_tag.find("timebase").text
             self.ntsc = rate_tag.find("ntsc").text.title() == "True"
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Media object"""
+    def write_xml(self, stream, indentation=2, pre_indent=0):
+        """writes the xml version of this Rate object to the given stream"""
         template = """%(pre_indent)s<rate>
 %(pre_indent)s%(indentation)s<timebase>%(timebase)s</timebase>
 %(pre_indent)s%(indentation)s<ntsc>%(ntsc)s</ntsc>
 %(pre_indent)s</rate>"""
-        return template % {
-            "timebase": self.timebase,
-            "ntsc": "TRUE" if self.ntsc else "FALSE",
-            "pre_indent": " " * pre_indent,
-            "indentation": " " * indentation,
-        }
+        stream.write(
+            template
+            % {
+                "timebase": self.timebase,
+                "ntsc": "TRUE" if self.ntsc else "FALSE",
+                "pre_indent": " " * pre_indent,
+                "indentation": " " * indentation,
+            }
+        )
@@ -1,18 +1,52 @@
 # -*- coding: utf-8 -*-
 """This module contains scripts those run when a new Version is published. It
 is a way of checking the quality of the published versions.
+
+The publishers are run by the :class:`.PublisherEngine`. A publisher can declare
+the publishers that it depends on, the scene data that it needs from the shared
+:class:`.SceneSnapshot` and if it is read-only, that is, it doesn't modify the
+scene. A publisher can also declare a fingerprint of its inputs, so its passing
+result is reused from a :class:`.PublisherResultCache` until the fingerprint
+changes. The engine core doesn't depend on any DCC.
 """
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from anima import logger
+
 PRE_PUBLISHER_TYPE = 0
 POST_PUBLISHER_TYPE = 1
 
 
 publishers = {PRE_PUBLISHER_TYPE: {}, POST_PUBLISHER_TYPE: {}}
 
+# the dependencies, required snapshot data, read-only flag and fingerprint of
+# publishers
+publisher_info = {}
+
+# the callables that generate the scene snapshot data by name
+snapshot_providers = {}
+
 # This is a storage for intermediate data like newly created versions etc.
 staging = {}
 
 
-def register_publisher(callable_, type_name="", publisher_type=PRE_PUBLISHER_TYPE):
+def register_publisher(
+    callable_,
+    type_name="",
+    publisher_type=PRE_PUBLISHER_TYPE,
+    depends=None,
+    requires=None,
+    read_only=False,
+    fingerprint=None,
+):
     """Registers a function as a publisher for defined task types.
 
     :param function callable_: The callable that is the publisher.
@@ -21,12 +55,32 @@ def register_publisher(callable_, type_name="", publisher_type=PRE_PUBLISHER_TYP
       of is an empty string the given callable_ will be registered as a generic
       publisher and will always run first.
     :param int publisher_type: 0 for pre publishers 1 for post publishers.
+    :param list depends: A list of publishers or publisher names that should
+      run and pass before this publisher. The dependencies that are not in the
+      same run only affect the order.
+    :param list requires: A list of snapshot data names that this publisher
+      needs. The publisher is called with the ``snapshot`` keyword argument if
+      this is given.
+    :param bool read_only: Set it to True if this publisher doesn't modify the
+      scene. The snapshot data is kept after read-only publishers, and they can
+      run concurrently.
+    :param fingerprint: A callable that returns a JSON serializable summary of
+      the inputs of this publisher, like node type counts or file path sets. It
+      is called with the :class:`.SceneSnapshot` instance. The passing result of
+      the publisher is reused while the fingerprint doesn't change.
     :return:
     """
 
     if not callable(callable_):
         raise TypeError("{} is not callable".format(callable_.__class__.__name__))
 
+    publisher_info[callable_] = {
+        "depends": list(depends or []),
+        "requires": list(requires or []),
+        "read_only": read_only,
+        "fingerprint": fingerprint,
+    }
+
     def register_one(t_name, p_type):
         t_name = t_name.lower()
         if t_name not in publishers[p_type]:
@@ -43,15 +97,36 @@ def register_publisher(callable_, type_name="", publisher_type=PRE_PUBLISHER_TYP
         register_one(type_name, publisher_type)
 
 
-def publisher(type_name="", publisher_type=PRE_PUBLISHER_TYPE):
+def publisher(
+    type_name="",
+    publisher_type=PRE_PUBLISHER_TYPE,
+    depends=None,
+    requires=None,
+    read_only=False,
+    fingerprint=None,
+):
     """A decorator to easily register a method or function as a publisher
 
     :param str, list type_name: The name of this publisher type.
     :param int publisher_type: 0 for pre 1 for post publishers
+    :param list depends: The publishers or publisher names that this publisher
+      depends on.
+    :param list requires: The snapshot data names that this publisher needs.
+    :param bool read_only: True if this publisher doesn't modify the scene.
+    :param fingerprint: A callable that returns the fingerprint of the inputs
+      of this publisher.
     """
 
     def wrapper(f):
-        register_publisher(f, type_name, publisher_type)
+        register_publisher(
+            f,
+            type_name,
+            publisher_type,
+            depends=depends,
+            requires=requires,
+            read_only=read_only,
+            fingerprint=fingerprint,
+        )
         return f
 
     if callable(type_name):
@@ -63,26 +138,634 @@ def publisher(type_name="", publisher_type=PRE_PUBLISHER_TYPE):
     return wrapper
 
 
+def get_publishers(type_name="", publisher_type=PRE_PUBLISHER_TYPE):
+    """Returns the publishers registered under the given type name, the generic
+    publishers come first.
+
+    :param str type_name: A string holding the type name
+    :param int publisher_type: The type of publishers. Use
+      ``publish.PRE_PUBLISHER_TYPE`` or ``publish.POST_PUBLISHER_TYPE``
+    :return list: A list of publishers.
+    """
+    result = []
+    if type_name != "":
+        result += publishers[publisher_type].get("", [])
+    for f in publishers[publisher_type].get(type_name.lower(), []):
+        if f not in result:
+            result.append(f)
+    return result
+
+
 def run_publishers(type_name="", publisher_type=PRE_PUBLISHER_TYPE):
     """Runs all the publishers registered under the given type name
 
+    The publishers run in registration order, the generic publishers first,
+    unless a publisher depends on a later one. The first error is raised.
+
     :param str type_name: A string holding the type name
     :param int publisher_type: The type of publisher to run. Use
       ``publish.PRE_PUBLISHER_TYPE`` or ``publish.POST_PUBLISHER_TYPE``
     :return:
     """
-    if type_name != "":
-        for f in publishers[publisher_type].get("", []):  # run generic
-            f()  # publishers first
-
-    for f in publishers[publisher_type].get(type_name.lower(), []):
-        f()
+    engine = PublisherEngine(get_publishers(type_name, publisher_type))
+    engine.run(stop_on_error=True)
 
 
 def clear_publishers():
     """utility function to clear publishers"""
     publishers[PRE_PUBLISHER_TYPE].clear()
     publishers[POST_PUBLISHER_TYPE].clear()
+    publisher_info.clear()
+
+
+def get_publisher_info(callable_):
+    """Returns the dependencies, required snapshot data, read-only flag and
+    fingerprint of the given publisher.
+
+    :param callable_: The publisher.
+    :return dict: A dictionary with "depends", "requires", "read_only" and
+      "fingerprint" keys.
+    """
+    return publisher_info.get(
+        callable_,
+        {"depends": [], "requires": [], "read_only": False, "fingerprint": None},
+    )
+
+
+def register_snapshot_provider(name, callable_):
+    """Registers a callable that generates a scene snapshot data.
+
+    :param str name: The name of the data, that the publishers use in their
+      ``requires`` list.
+    :param callable_: The callable that generates the data. It is called with
+      the :class:`.SceneSnapshot` instance, so it can use other data.
+    :return:
+    """
+    if not callable(callable_):
+        raise TypeError("{} is not callable".format(callable_.__class__.__name__))
+    snapshot_providers[name] = callable_
+
+
+def snapshot_provider(name):
+    """A decorator to register a function as a snapshot provider
+
+    :param str name: The name of the data.
+    """
+
+    def wrapper(f):
+        register_snapshot_provider(name, f)
+        return f
+
+    return wrapper
+
+
+class SceneSnapshot(object):
+    """A memoized store of scene data shared by the publishers.
+
+    Each data is generated once by its provider on first access and is kept
+    until it is invalidated. The :class:`.PublisherEngine` invalidates it after
+    every publisher that modifies the scene.
+
+    :param dict providers: A dictionary of data name and provider pairs. The
+      registered ``snapshot_providers`` are used by default.
+    """
+
+    def __init__(self, providers=None):
+        if providers is None:
+            providers = snapshot_providers
+        self.providers = providers
+        self._data = {}
+        self._lock = threading.RLock()
+
+    def get(self, name):
+        """Returns the data with the given name, generating it if needed.
+
+        :param str name: The name of the data.
+        :return: The data.
+        """
+        with self._lock:
+            if name not in self._data:
+                if name not in self.providers:
+                    raise KeyError("There is no snapshot provider for: %s" % name)
+                self._data[name] = self.providers[name](self)
+            return self._data[name]
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def is_cached(self, name):
+        """Returns True if the data with the given name is already generated.
+
+        :param str name: The name of the data.
+        :return bool:
+        """
+        with self._lock:
+            return name in self._data
+
+    def invalidate(self, names=None):
+        """Removes the generated data.
+
+        :param list names: The names of the data to remove, all the data is
+          removed if skipped.
+        :return:
+        """
+        with self._lock:
+            if names is None:
+                self._data.clear()
+                return
+            for name in names:
+                self._data.pop(name, None)
+
+
+class PublisherResult(object):
+    """The result of a publisher run.
+
+    :param publisher: The publisher.
+    :param str state: One of ``PASSED``, ``FAILED`` or ``SKIPPED``.
+    :param Exception exception: The exception raised by the publisher.
+    :param str traceback: The formatted traceback of the exception.
+    :param float duration: The run duration in seconds.
+    :param str fingerprint: The hash of the publisher fingerprint at the time
+      it run.
+    :param bool cached: True if this result is reused from a previous run.
+    """
+
+    PASSED = "passed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+    def __init__(
+        self,
+        publisher=None,
+        state=PASSED,
+        exception=None,
+        traceback="",
+        duration=0.0,
+        fingerprint=None,
+        cached=False,
+    ):
+        self.publisher = publisher
+        self.state = state
+        self.exception = exception
+        self.traceback = traceback
+        self.duration = duration
+        self.fingerprint = fingerprint
+        self.cached = cached
+
+    @property
+    def passed(self):
+        """Returns True if the publisher passed."""
+        return self.state == self.PASSED
+
+    def __repr__(self):
+        return "<PublisherResult %s: %s (%0.3f sec)%s>" % (
+            getattr(self.publisher, "__name__", self.publisher),
+            self.state,
+            self.duration,
+            " cached" if self.cached else "",
+        )
+
+
+class PublisherResultCache(object):
+    """Keeps the passing publisher results by their fingerprints, so a
+    publisher doesn't need to run again until its inputs change.
+
+    The failed results are not kept, so the failing publishers always run
+    again.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def hash_fingerprint(cls, fingerprint):
+        """Returns the hash of the given fingerprint.
+
+        :param fingerprint: A JSON serializable fingerprint value.
+        :return str: The md5 hash of the fingerprint.
+        """
+        dumped_data = json.dumps(fingerprint, sort_keys=True, default=str)
+        return hashlib.md5(dumped_data.encode("utf-8")).hexdigest()
+
+    def get(self, publisher, fingerprint_hash):
+        """Returns a copy of the cached result of the given publisher, marked as
+        cached, if the fingerprint hash matches.
+
+        :param publisher: The publisher.
+        :param str fingerprint_hash: The current fingerprint hash.
+        :return PublisherResult: The cached result or None.
+        """
+        with self._lock:
+            result = self._results.get(PublisherHistory.get_key(publisher))
+        if result is None or result.fingerprint != fingerprint_hash:
+            return None
+        return PublisherResult(
+            publisher=publisher,
+            state=result.state,
+            duration=result.duration,
+            fingerprint=result.fingerprint,
+            cached=True,
+        )
+
+    def store(self, result):
+        """Stores the given result if it passed, removes the previous result of
+        the publisher otherwise.
+
+        :param PublisherResult result: The publisher result.
+        :return:
+        """
+        key = PublisherHistory.get_key(result.publisher)
+        with self._lock:
+            if result.passed and result.fingerprint is not None:
+                self._results[key] = result
+            else:
+                self._results.pop(key, None)
+
+    def clear(self):
+        """Removes all the cached results."""
+        with self._lock:
+            self._results.clear()
+
+
+class PublisherHistory(object):
+    """Stores the durations and the last states of the publishers in a local
+    JSON file, so the slow publishers can be tracked between sessions.
+
+    :param str path: The history file path. The default is the
+      ``publisher_history_file_name`` in the ``local_cache_folder``.
+    """
+
+    max_durations = 10
+
+    def __init__(self, path=None):
+        if path is None:
+            from anima import defaults
+
+            path = os.path.join(
+                defaults.local_cache_folder, defaults.publisher_history_file_name
+            )
+        self.path = os.path.normpath(os.path.expandvars(os.path.expanduser(path)))
+        self.data = {}
+        self._lock = threading.Lock()
+        self.restore()
+
+    @classmethod
+    def get_key(cls, publisher):
+        """Returns the key of the given publisher in the history.
+
+        :param publisher: The publisher.
+        :return str: The module and the name of the publisher.
+        """
+        return "%s.%s" % (
+            getattr(publisher, "__module__", ""),
+            getattr(publisher, "__name__", publisher.__class__.__name__),
+        )
+
+    def restore(self):
+        """Restores the history from the file."""
+        try:
+            with open(self.path, "r") as f:
+                self.data = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.data = {}
+
+    def save(self):
+        """Saves the history to the file."""
+        file_path = os.path.dirname(self.path)
+        try:
+            os.makedirs(file_path)
+        except OSError:
+            pass
+
+        with self._lock:
+            dumped_data = json.dumps(self.data, sort_keys=True, indent=4)
+
+        # write to a temp file first, so the file is never partially written
+        fd, temp_path = tempfile.mkstemp(dir=file_path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(dumped_data)
+        os.replace(temp_path, self.path)
+
+    def record(self, result):
+        """Records the given publisher result.
+
+        :param PublisherResult result: The result of a publisher run.
+        :return:
+        """
+        if result.state == PublisherResult.SKIPPED:
+            return
+
+        with self._lock:
+            entry = self.data.setdefault(self.get_key(result.publisher), {})
+            durations = entry.get("durations", []) + [round(result.duration, 4)]
+            entry["durations"] = durations[-self.max_durations :]
+            entry["state"] = result.state
+            entry["date"] = time.time()
+
+    def get_entry(self, publisher):
+        """Returns the history entry of the given publisher.
+
+        :param publisher: The publisher.
+        :return dict: The entry or None if the publisher didn't run before.
+        """
+        with self._lock:
+            return self.data.get(self.get_key(publisher))
+
+    def get_average_duration(self, publisher):
+        """Returns the average duration of the recorded runs of the given
+        publisher.
+
+        :param publisher: The publisher.
+        :return float: The average duration in seconds or None.
+        """
+        entry = self.get_entry(publisher)
+        if not entry or not entry.get("durations"):
+            return None
+        return sum(entry["durations"]) / len(entry["durations"])
+
+    def get_slowest(self, count=10):
+        """Returns the slowest publishers by their average durations.
+
+        :param int count: The number of publishers to return.
+        :return list: A list of (publisher key, average duration) tuples.
+        """
+        with self._lock:
+            averages = [
+                (key, sum(entry["durations"]) / len(entry["durations"]))
+                for key, entry in self.data.items()
+                if entry.get("durations")
+            ]
+        return sorted(averages, key=lambda x: x[1], reverse=True)[:count]
+
+
+class PublisherEngine(object):
+    """Runs publishers in the order of their dependencies.
+
+    The publishers that modify the scene run one by one in the calling thread
+    and the snapshot is invalidated after each of them. When ``max_workers`` is
+    bigger than 1 the read-only publishers run concurrently in a thread pool,
+    which is only safe for publishers that don't touch a non thread-safe DCC
+    API, for example the ones that only use the snapshot data. The snapshot
+    data is generated in the calling thread before a publisher is started.
+
+    :param list publishers: The publishers to run.
+    :param SceneSnapshot snapshot: The snapshot shared by the publishers. A new
+      one is created if skipped.
+    :param PublisherHistory history: The history to record the results to. The
+      results are not recorded if skipped.
+    :param int max_workers: The maximum number of the read-only publishers that
+      run concurrently. The default is 1.
+    :param progress_controller_factory: A callable that returns the progress
+      controller of the given publisher. Only the publishers that run in the
+      calling thread get their progress controllers.
+    :param callback: A callable that is called with each
+      :class:`.PublisherResult` in the calling thread.
+    :param PublisherResultCache result_cache: The cache to reuse the passing
+      results of the publishers with an unchanged fingerprint. The results are
+      not cached if skipped.
+    """
+
+    def __init__(
+        self,
+        publishers,
+        snapshot=None,
+        history=None,
+        max_workers=1,
+        progress_controller_factory=None,
+        callback=None,
+        result_cache=None,
+    ):
+        self.publishers = list(publishers)
+        if snapshot is None:
+            snapshot = SceneSnapshot()
+        self.snapshot = snapshot
+        self.history = history
+        self.max_workers = max_workers
+        self.progress_controller_factory = progress_controller_factory
+        self.callback = callback
+        self.result_cache = result_cache
+        self.results = OrderedDict()
+
+    def get_dependencies(self, publisher):
+        """Returns the dependencies of the given publisher that are in this run.
+
+        :param publisher: The publisher.
+        :return list: A list of publishers.
+        """
+        by_name = {}
+        for p in self.publishers:
+            by_name.setdefault(getattr(p, "__name__", None), p)
+
+        dependencies = []
+        for dependency in get_publisher_info(publisher)["depends"]:
+            if not callable(dependency):
+                dependency = by_name.get(dependency)
+            if dependency in self.publishers and dependency not in dependencies:
+                dependencies.append(dependency)
+        return dependencies
+
+    def sort_publishers(self):
+        """Returns the publishers sorted by their dependencies, keeping the given
+        order otherwise.
+
+        :raises ValueError: If there is a circular dependency.
+        :return list: A list of publishers.
+        """
+        sorted_publishers = []
+        visiting = []
+
+        def visit(p):
+            if p in sorted_publishers:
+                return
+            if p in visiting:
+                raise ValueError(
+                    "Circular publisher dependency: %s"
+                    % " -> ".join(
+                        getattr(x, "__name__", str(x)) for x in visiting + [p]
+                    )
+                )
+            visiting.append(p)
+            for dependency in self.get_dependencies(p):
+                visit(dependency)
+            visiting.pop()
+            sorted_publishers.append(p)
+
+        for p in self.publishers:
+            visit(p)
+        return sorted_publishers
+
+    def run_publisher(self, publisher, progress_controller=None):
+        """Runs the given publisher and returns its result. The required
+        snapshot data should be generated before calling this in a thread.
+
+        :param publisher: The publisher.
+        :param progress_controller: The progress controller to pass to the
+          publisher.
+        :return PublisherResult:
+        """
+        kwargs = {}
+        if progress_controller is not None:
+            kwargs["progress_controller"] = progress_controller
+        if get_publisher_info(publisher)["requires"]:
+            kwargs["snapshot"] = self.snapshot
+
+        start = time.time()
+        try:
+            publisher(**kwargs)
+        except Exception as e:
+            return PublisherResult(
+                publisher=publisher,
+                state=PublisherResult.FAILED,
+                exception=e,
+                traceback=traceback.format_exc(),
+                duration=time.time() - start,
+            )
+        return PublisherResult(publisher=publisher, duration=time.time() - start)
+
+    def get_fingerprint_hash(self, publisher):
+        """Returns the hash of the current fingerprint of the given publisher.
+
+        :param publisher: The publisher.
+        :return str: The fingerprint hash or None if the publisher doesn't
+          declare a fingerprint.
+        """
+        fingerprint = get_publisher_info(publisher)["fingerprint"]
+        if fingerprint is None:
+            return None
+        return PublisherResultCache.hash_fingerprint(fingerprint(self.snapshot))
+
+    def run(self, stop_on_error=False, use_cache=True):
+        """Runs the publishers.
+
+        :param bool stop_on_error: Raise the exception of the first failing
+          publisher instead of running the rest of the publishers.
+        :param bool use_cache: Reuse the cached results of the publishers whose
+          fingerprint didn't change. If False all the publishers run, and their
+          results still update the cache.
+        :return OrderedDict: The publisher and :class:`.PublisherResult` pairs
+          in the run order.
+        """
+        sorted_publishers = self.sort_publishers()
+        self.results = OrderedDict()
+        futures = OrderedDict()
+        executor = None
+        if self.max_workers > 1:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        fingerprint_hashes = {}
+
+        def collect(p):
+            """collects the result of a concurrently running publisher"""
+            result = futures.pop(p).result()
+            result.fingerprint = fingerprint_hashes.get(p)
+            self.add_result(result, stop_on_error)
+
+        try:
+            for p in sorted_publishers:
+                info = get_publisher_info(p)
+                dependencies = self.get_dependencies(p)
+                for dependency in dependencies:
+                    if dependency in futures:
+                        collect(dependency)
+
+                failed_dependencies = [
+                    d.__name__ for d in dependencies if not self.results[d].passed
+                ]
+                if failed_dependencies:
+                    self.add_result(
+                        PublisherResult(
+                            publisher=p,
+                            state=PublisherResult.SKIPPED,
+                            traceback="Skipped, dependencies did not pass: %s"
+                            % ", ".join(failed_dependencies),
+                        ),
+                        stop_on_error,
+                    )
+                    continue
+
+                if not info["read_only"]:
+                    # wait for the running publishers before modifying the scene
+                    for running in list(futures):
+                        collect(running)
+
+                try:
+                    for name in info["requires"]:
+                        self.snapshot.get(name)
+                except Exception as e:
+                    self.add_result(
+                        PublisherResult(
+                            publisher=p,
+                            state=PublisherResult.FAILED,
+                            exception=e,
+                            traceback=traceback.format_exc(),
+                        ),
+                        stop_on_error,
+                    )
+                    continue
+
+                fingerprint_hash = None
+                if self.result_cache is not None:
+                    try:
+                        fingerprint_hash = self.get_fingerprint_hash(p)
+                    except Exception as e:
+                        # just run the publisher
+                        logger.debug(
+                            "can not generate the fingerprint of %s: %s"
+                            % (p.__name__, e)
+                        )
+                    fingerprint_hashes[p] = fingerprint_hash
+
+                if use_cache and fingerprint_hash is not None:
+                    cached_result = self.result_cache.get(p, fingerprint_hash)
+                    if cached_result is not None:
+                        self.add_result(cached_result, stop_on_error)
+                        continue
+
+                if executor is not None and info["read_only"]:
+                    futures[p] = executor.submit(self.run_publisher, p)
+                    continue
+
+                progress_controller = None
+                if self.progress_controller_factory is not None:
+                    progress_controller = self.progress_controller_factory(p)
+                result = self.run_publisher(p, progress_controller)
+                result.fingerprint = fingerprint_hash
+                if not info["read_only"]:
+                    self.snapshot.invalidate()
+                self.add_result(result, stop_on_error)
+
+            for running in list(futures):
+                collect(running)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            if self.history is not None:
+                self.history.save()
+
+        # keep the run order
+        return OrderedDict(
+            (p, self.results[p]) for p in sorted_publishers if p in self.results
+        )
+
+    def add_result(self, result, stop_on_error=False):
+        """Stores and records the given result and calls the callback.
+
+        :param PublisherResult result: The publisher result.
+        :param bool stop_on_error: Raise the exception of a failed result.
+        :return:
+        """
+        self.results[result.publisher] = result
+        # the cached results didn't run
+        if not result.cached:
+            if self.result_cache is not None and result.state != result.SKIPPED:
+                self.result_cache.store(result)
+            if self.history is not None:
+                self.history.record(result)
+        if self.callback is not None:
+            self.callback(result)
+        if stop_on_error and result.state == PublisherResult.FAILED:
+            raise result.exception
 
 
 class ProgressControllerBase(object):
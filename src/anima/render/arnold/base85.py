@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import atexit
+import os
 import struct
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 LUTS = {
     "standard": {
@@ -540,9 +547,86 @@ LUTS = {
 }
 
 
+# number of 32-bit words processed at once by the NumPy engine, keeps the
+# temporary arrays at a couple of tens of megabytes for any input size
+NUMPY_BLOCK_SIZE = 1048576
+
+# the number of worker processes of the parallel encoders, None is the number
+# of CPUs
+PARALLEL_PROCESS_COUNT = None
+
+# the minimum number of bytes processed by one parallel worker, smaller data
+# is encoded serially
+PARALLEL_MIN_SIZE = 262144
+
+__pool = None
+
+# struct byte order characters to NumPy byte order characters
+NUMPY_BYTE_ORDERS = {b"!": ">", b">": ">", b"<": "<", b"=": "=", b"@": "="}
+
+
 def __b85_encode(data, lut, byte_order, special_values=None):
     """Encode the given bytes data in to Base85 using the given LUT.
 
+    Uses the NumPy engine if NumPy is available and falls back to the pure
+    Python implementation otherwise. Both produce byte identical results.
+
+    Args:
+        data (bytes): A string which contains a string to be encoded in Base85.
+        lut (list): The lut to be used in encoding.
+        byte_order (bytes): The byte order character for ``struct.unpack``.
+        special_values (dict): If given, predefined special values are going to
+            be replaced with corresponding special characters.
+
+    Returns:
+        bytes: The encoded bytes.
+    """
+    if numpy is not None:
+        return __b85_encode_numpy(data, lut, byte_order, special_values)
+    return __b85_encode_python(data, lut, byte_order, special_values)
+
+
+def __b85_encode_numpy(data, lut, byte_order, special_values=None):
+    """Encode the given bytes data in to Base85 using NumPy array operations.
+
+    Args:
+        data (bytes): A string which contains a string to be encoded in Base85.
+        lut (list): The lut to be used in encoding.
+        byte_order (bytes): The byte order character for ``struct.unpack``.
+        special_values (dict): If given, predefined special values are going to
+            be replaced with corresponding special characters.
+
+    Returns:
+        bytes: The encoded bytes.
+    """
+    # pad data
+    padding = (4 - len(data) % 4) % 4
+    if padding:
+        data = b"".join([data, b"\0" * padding])
+    lut_array = numpy.frombuffer(b"".join(lut), dtype=numpy.uint8)
+    words = numpy.frombuffer(
+        data, dtype="%su4" % NUMPY_BYTE_ORDERS[byte_order]
+    )
+    parts = []
+    parts_append = parts.append
+    for i in range(0, len(words), NUMPY_BLOCK_SIZE):
+        # astype copies the block in to native byte order
+        x = words[i : i + NUMPY_BLOCK_SIZE].astype(numpy.uint32)
+        digits = numpy.empty((len(x), 5), dtype=numpy.uint8)
+        for j in range(4, -1, -1):
+            digits[:, j] = x % 85
+            x //= 85
+        parts_append(lut_array[digits].tobytes())
+    return_val = b"".join(parts)
+    if special_values:
+        for key in special_values.keys():
+            return_val = return_val.replace(key, special_values[key])
+    return return_val
+
+
+def __b85_encode_python(data, lut, byte_order, special_values=None):
+    """Encode the given bytes data in to Base85 using the given LUT.
+
     Args:
         data (bytes): A string which contains a string to be encoded in Base85.
         lut (dict): The lut to be used in encoding.
@@ -577,39 +661,277 @@ def __b85_encode(data, lut, byte_order, special_values=None):
     return return_val
 
 
-def __encode_multithreaded(f, data):
-    """Run the given function with the given data in multi-threaded fashion.
+def __iter_replace(pieces, key, value):
+    """Replace ``key`` with ``value`` in a stream of bytes.
+
+    The joined result is identical to calling ``bytes.replace`` on the joined
+    input, including the matches that span two pieces. Only the last
+    ``len(key) - 1`` bytes are held back between the pieces.
 
     Args:
-        f: The function
-        data: The data.
+        pieces (Iterable[bytes]): The bytes stream.
+        key (bytes): The value to search for.
+        value (bytes): The replacement.
+
+    Yields:
+        bytes: The replaced pieces.
+    """
+    pending = b""
+    key_length = len(key)
+    for piece in pieces:
+        parts = b"".join([pending, piece]).split(key)
+        # everything up to the last match is final, and only the last
+        # ``key_length - 1`` bytes after it can start a new match
+        tail = parts.pop()
+        safe_index = max(len(tail) - key_length + 1, 0)
+        parts.append(tail[:safe_index])
+        pending = tail[safe_index:]
+        yield value.join(parts)
+    if pending:
+        yield pending.replace(key, value)
+
+
+def __iter_b85_encode(chunks, lut, byte_order, special_values=None):
+    """Encode the given stream of bytes in to Base85 using the given LUT.
+
+    The joined result is identical to encoding the joined input at once, so
+    the input can be split at any byte, it is realigned to 32-bit words.
+
+    Args:
+        chunks (Iterable[bytes]): The bytes stream to be encoded in Base85.
+        lut (list): The lut to be used in encoding.
+        byte_order (bytes): The byte order character for ``struct.unpack``.
+        special_values (dict): If given, predefined special values are going to
+            be replaced with corresponding special characters.
+
+    Yields:
+        bytes: The encoded pieces.
+    """
+
+    def encode_aligned():
+        remainder = b""
+        for chunk in chunks:
+            if remainder:
+                chunk = b"".join([remainder, chunk])
+            aligned_length = len(chunk) - len(chunk) % 4
+            remainder = bytes(chunk[aligned_length:])
+            if aligned_length:
+                yield __b85_encode(chunk[:aligned_length], lut, byte_order)
+        if remainder:
+            yield __b85_encode(remainder, lut, byte_order)
+
+    pieces = encode_aligned()
+    if special_values:
+        for key in special_values.keys():
+            pieces = __iter_replace(pieces, key, special_values[key])
+    for piece in pieces:
+        if piece:
+            yield piece
+
+
+def __get_pool():
+    """Return the persistent worker pool, creates it on first use.
+
+    The workers are started with the interpreter that ``multiprocessing`` is
+    configured with, so host applications embedding Python (Maya, Houdini etc.)
+    should call ``multiprocessing.set_executable()`` before the first call.
 
     Returns:
-        Any: The function result.
+        multiprocessing.pool.Pool: The worker pool.
     """
-    import multiprocessing
-    import platform
+    global __pool
+    if __pool is None:
+        import multiprocessing
 
-    number_of_threads = int(multiprocessing.cpu_count() / 2)
+        if os.name == "posix":
+            # share the resource tracker of this process with the workers,
+            # otherwise every worker starts its own tracker which reports the
+            # shared memory blocks they attach to as leaked
+            from multiprocessing import resource_tracker
 
-    if platform.system() == "Windows":
-        multiprocessing.set_executable("C:/Python27/pythonw.exe")
-    elif platform.system() == "Linux":
-        multiprocessing.set_executable("/usr/bin/python")
+            resource_tracker.ensure_running()
+        __pool = multiprocessing.Pool(PARALLEL_PROCESS_COUNT)
+        atexit.register(shutdown_pool)
+    return __pool
 
-    p = multiprocessing.Pool(number_of_threads)
 
-    number_of_chunks = len(data) // 4
-    chunk_per_thread = int(number_of_chunks / number_of_threads)
-    split_per_char = chunk_per_thread * 4
+def shutdown_pool():
+    """Terminate the persistent worker pool used by the parallel encoders."""
+    global __pool
+    if __pool is not None:
+        __pool.terminate()
+        __pool.join()
+        __pool = None
 
-    thread_data = []
-    for i in range(0, len(data), split_per_char):
-        thread_data.append(data[i : i + split_per_char])
 
-    data = b"".join(p.map(f, thread_data))
-    p.close()
-    return data
+def __parallel_worker(args):
+    """Encode or decode a slice of the shared input buffer.
+
+    The result is written to the shared output buffer at the offset that
+    corresponds to the input offset, so no data is sent back to the caller.
+
+    Args:
+        args (tuple): A tuple of the function (__b85_encode or __b85_decode),
+            the LUT name, the shared input and output buffer names, the start
+            and end indices of the input slice and the output start index.
+    """
+    from multiprocessing import shared_memory
+
+    f, lut_name, input_name, output_name, start, end, output_start = args
+    lut_key = "int_to_char" if f is __b85_encode else "char_to_int"
+    lut = LUTS[lut_name][lut_key]
+    byte_order = LUTS[lut_name]["byte_order"]
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        with input_shm.buf[start:end] as data:
+            if f is __b85_encode:
+                result = f(data, lut, byte_order)
+            else:
+                # the decoder looks the characters up from a dict
+                result = f(bytes(data), lut, byte_order)
+        output_shm.buf[output_start : output_start + len(result)] = result
+    finally:
+        input_shm.close()
+        output_shm.close()
+
+
+def __run_parallel(f, data, lut_name, input_group, output_group):
+    """Run the given function over the data in parallel worker processes.
+
+    The data is passed to the workers through shared memory, split in to
+    slices aligned to ``input_group`` bytes. Each slice is written to the
+    output at the ``output_group`` aligned offset.
+
+    Args:
+        f: The function, __b85_encode or __b85_decode.
+        data (bytes): The input data.
+        lut_name (str): The name of the LUT in ``LUTS``.
+        input_group (int): The number of input bytes per group (4 or 5).
+        output_group (int): The number of output bytes per group (5 or 4).
+
+    Returns:
+        bytes: The joined result.
+    """
+    from multiprocessing import shared_memory
+
+    pool = __get_pool()
+    data_length = len(data)
+    group_count = -(-data_length // input_group)
+    output_length = group_count * output_group
+    # a few slices per process to balance the load
+    slice_count = (PARALLEL_PROCESS_COUNT or os.cpu_count() or 1) * 4
+    groups_per_slice = max(
+        PARALLEL_MIN_SIZE // input_group, -(-group_count // slice_count)
+    )
+    slice_size = groups_per_slice * input_group
+
+    input_shm = shared_memory.SharedMemory(create=True, size=data_length)
+    output_shm = shared_memory.SharedMemory(create=True, size=output_length)
+    try:
+        input_shm.buf[:data_length] = data
+        pool.map(
+            __parallel_worker,
+            [
+                (
+                    f,
+                    lut_name,
+                    input_shm.name,
+                    output_shm.name,
+                    start,
+                    min(start + slice_size, data_length),
+                    start // input_group * output_group,
+                )
+                for start in range(0, data_length, slice_size)
+            ],
+        )
+        return bytes(output_shm.buf[:output_length])
+    finally:
+        input_shm.close()
+        input_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
+
+
+def __encode_parallel(data, lut_name):
+    """Encode the given data in to Base85 in parallel worker processes.
+
+    The special values are replaced over the joined result, so the result is
+    identical to the serial encoder.
+
+    Args:
+        data (bytes): The data to be encoded.
+        lut_name (str): The name of the LUT in ``LUTS``.
+
+    Returns:
+        bytes: The encoded data.
+    """
+    lut = LUTS[lut_name]["int_to_char"]
+    byte_order = LUTS[lut_name]["byte_order"]
+    special_values = LUTS[lut_name].get("special_values")
+    if len(data) < PARALLEL_MIN_SIZE * 2:
+        return __b85_encode(data, lut, byte_order, special_values)
+
+    return_val = __run_parallel(__b85_encode, data, lut_name, 4, 5)
+    if special_values:
+        for key in special_values.keys():
+            return_val = return_val.replace(key, special_values[key])
+    return return_val
+
+
+def __decode_parallel(data, lut_name):
+    """Decode the given Base85 data in parallel worker processes.
+
+    The special values are expanded before the data is split in to slices, so
+    the slices are always aligned to 5 character groups.
+
+    Args:
+        data (bytes): The encoded data.
+        lut_name (str): The name of the LUT in ``LUTS``.
+
+    Returns:
+        bytes: The decoded data.
+    """
+    lut = LUTS[lut_name]["char_to_int"]
+    byte_order = LUTS[lut_name]["byte_order"]
+    special_values = LUTS[lut_name].get("special_values")
+    if special_values:
+        for key in special_values.keys():
+            data = data.replace(special_values[key], key)
+
+    if len(data) < PARALLEL_MIN_SIZE * 2 or len(data) % 5:
+        # let the serial decoder handle the malformed data
+        return __b85_decode(data, lut, byte_order)
+
+    return __run_parallel(__b85_decode, data, lut_name, 5, 4)
+
+
+def b85_encode(data):
+    """Encode the given data by using the standard LUT and byte order.
+
+    Args:
+        data (bytes): A string which contains a string to be encoded in Base85.
+
+    Returns:
+        bytes: The encoded data.
+    """
+    lut = LUTS["standard"]["int_to_char"]
+    byte_order = LUTS["standard"]["byte_order"]
+    return __b85_encode(data, lut, byte_order)
+
+
+def b85_encode_multithreaded(data):
+    """Encode the given data by using the standard LUT in parallel worker
+    processes.
+
+    Args:
+        data (bytes): A string which contains a string to be encoded in Base85.
+
+    Returns:
+        bytes: The encoded data.
+    """
+    return __encode_parallel(data, "standard")
 
 
 def rfc1924_b85_encode(data):
@@ -635,7 +957,7 @@ def rfc1924_b85_encode_multithreaded(data):
     Returns:
         bytes: The encoded data.
     """
-    return __encode_multithreaded(rfc1924_b85_encode, data)
+    return __encode_parallel(data, "rfc1924")
 
 
 def arnold_b85_encode(data):
@@ -662,12 +984,97 @@ def arnold_b85_encode_multithreaded(data):
     Returns:
         bytes: Encoded data.
     """
-    return __encode_multithreaded(arnold_b85_encode, data)
+    return __encode_parallel(data, "arnold")
+
+
+def arnold_b85_encode_iter(chunks):
+    """Encode the given stream of bytes in to Base85 using the arnold LUT.
+
+    Args:
+        chunks (Iterable[bytes]): Bytes to be encoded in Base85, can be split
+            at any byte.
+
+    Yields:
+        bytes: The encoded pieces, the joined result is identical to the result
+            of :func:`arnold_b85_encode` for the joined input.
+    """
+    lut = LUTS["arnold"]["int_to_char"]
+    byte_order = LUTS["arnold"]["byte_order"]
+    special_values = LUTS["arnold"]["special_values"]
+    return __iter_b85_encode(chunks, lut, byte_order, special_values)
 
 
 def __b85_decode(data, lut, byte_order, special_values=None):
     """Decode the given string data by using the given LUT and byte order.
 
+    Uses the NumPy engine if NumPy is available and falls back to the pure
+    Python implementation otherwise. Both produce byte identical results.
+
+    Args:
+        data (bytes): A string which contains the encoded data.
+        lut (dict): A dict where the keys are encoded characters and the
+            values are the integer correspondence of those characters.
+        byte_order (bytes): The byte order character for struct.pack.
+        special_values (dict): If given, the special characters are going to be
+            expanded back to their predefined values before decoding.
+
+    Returns:
+        bytes: Decoded data.
+    """
+    if numpy is not None:
+        return __b85_decode_numpy(data, lut, byte_order, special_values)
+    return __b85_decode_python(data, lut, byte_order, special_values)
+
+
+def __b85_decode_numpy(data, lut, byte_order, special_values=None):
+    """Decode the given string data by using NumPy array operations.
+
+    Malformed data (a trailing partial group, characters that are not in the
+    LUT or groups that overflow 32-bits) is handed over to the pure Python
+    implementation to raise the very same errors.
+
+    Args:
+        data (bytes): A string which contains the encoded data.
+        lut (dict): A dict where the keys are encoded characters and the
+            values are the integer correspondence of those characters.
+        byte_order (bytes): The byte order character for struct.pack.
+        special_values (dict): If given, the special characters are going to be
+            expanded back to their predefined values before decoding.
+
+    Returns:
+        bytes: Decoded data.
+    """
+    if special_values:
+        for key in special_values.keys():
+            data = data.replace(special_values[key], key)
+
+    if len(data) % 5:
+        return __b85_decode_python(data, lut, byte_order)
+
+    lut_array = numpy.full(256, -1, dtype=numpy.int64)
+    for char, value in lut.items():
+        lut_array[ord(char)] = value
+    powers = numpy.array([52200625, 614125, 7225, 85, 1], dtype=numpy.int64)
+    dtype = "%su4" % NUMPY_BYTE_ORDERS[byte_order]
+
+    chars = numpy.frombuffer(data, dtype=numpy.uint8)
+    parts = []
+    parts_append = parts.append
+    block_size = NUMPY_BLOCK_SIZE * 5
+    for i in range(0, len(chars), block_size):
+        values = lut_array[chars[i : i + block_size]]
+        if values.min() < 0:
+            return __b85_decode_python(data, lut, byte_order)
+        int_sums = values.reshape(-1, 5).dot(powers)
+        if int_sums.max() > 0xFFFFFFFF:
+            return __b85_decode_python(data, lut, byte_order)
+        parts_append(int_sums.astype(dtype).tobytes())
+    return b"".join(parts)
+
+
+def __b85_decode_python(data, lut, byte_order, special_values=None):
+    """Decode the given string data by using the given LUT and byte order.
+
     Args:
         data (bytes): A string which contains the encoded data.
         lut (dict): A dict where the keys are encoded characters and the
@@ -712,6 +1119,18 @@ def b85_decode(data):
     return __b85_decode(data, lut, byte_order)
 
 
+def b85_decode_multithreaded(data):
+    """Decode data by using the standard LUT in parallel worker processes.
+
+    Args:
+        data (bytes): A string which contains the encoded data.
+
+    Returns:
+        bytes: Decoded data.
+    """
+    return __decode_parallel(data, "standard")
+
+
 def rfc1924_b85_decode(data):
     """Decode data by using the RFC1924 LUT and byte order (=big endian).
 
@@ -723,6 +1142,18 @@ def rfc1924_b85_decode(data):
     return __b85_decode(data, lut, byte_order)
 
 
+def rfc1924_b85_decode_multithreaded(data):
+    """Decode data by using the RFC1924 LUT in parallel worker processes.
+
+    Args:
+        data (bytes): A string which contains the encoded data.
+
+    Returns:
+        bytes: Decoded data.
+    """
+    return __decode_parallel(data, "rfc1924")
+
+
 def arnold_b85_decode(data):
     """Decode the given data by using the Arnold LUT and byte order(=big endian).
 
@@ -739,6 +1170,19 @@ def arnold_b85_decode(data):
     # return __b85_decode(data, lut, byte_order)
 
 
+def arnold_b85_decode_multithreaded(data):
+    """Decode the given data by using the Arnold LUT in parallel worker
+    processes.
+
+    Args:
+        data (bytes): A string which contains the encoded data.
+
+    Returns:
+        bytes: Decoded data.
+    """
+    return __decode_parallel(data, "arnold")
+
+
 def mapper(encoded_data, raw_data, special_values=None):
     """Create a lut for known Base85 encoding.
 
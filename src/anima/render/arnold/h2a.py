@@ -2,9 +2,12 @@
 
 import os
 import gzip
+import re
 import struct
 import time
 
+from itertools import islice
+
 
 from anima.render.arnold import base85
 
@@ -13,7 +16,7 @@ try:
 except ImportError:
     hou = None
 
-from io import StringIO
+from io import BytesIO, StringIO
 
 
 class Buffer(object):
@@ -57,6 +60,165 @@ class Buffer(object):
         return self.file_str.getvalue()
 
 
+class AssWriter(object):
+    """Streams ASS node data to a file handler.
+
+    The array sections are encoded and written in fixed size chunks, and are
+    split in to lines while they are streamed, so the peak memory usage does
+    not depend on the size of the exported geometry.
+
+    :param file_handler: A file like object opened in binary mode.
+    :param int chunk_size: The number of raw bytes encoded at once.
+    """
+
+    def __init__(self, file_handler, chunk_size=4194304):
+        self.file_handler = file_handler
+        self.file_handler_write = file_handler.write
+        self.chunk_size = chunk_size
+
+    def write(self, data):
+        """writes the given data, text is encoded to utf-8
+        """
+        if not isinstance(data, bytes):
+            data = str(data).encode('utf-8')
+        self.file_handler_write(data)
+
+    def write_template(self, template, template_vars, streams=None):
+        """writes the given template, the ``%(key)s`` placeholders are filled
+        from the template_vars and the ones that are in the streams are filled
+        by calling the corresponding callable in the streams dictionary, which
+        should write its data directly to this writer.
+
+        :param str template: A template in ``%(key)s`` format.
+        :param dict template_vars: The values of the placeholders.
+        :param dict streams: A dictionary of callables.
+        """
+        if not streams:
+            self.write(template % template_vars)
+            return
+
+        placeholders = re.compile(
+            r'%%\((%s)\)s' % '|'.join(map(re.escape, streams))
+        )
+        # the split result alternates between static text and stream keys
+        for i, part in enumerate(placeholders.split(template)):
+            if i % 2:
+                streams[part]()
+            else:
+                self.write(part % template_vars)
+
+    def iter_chunks(self, buffers):
+        """yields the given buffers as chunks of self.chunk_size bytes, big
+        buffers are sliced and small ones are merged
+
+        :param buffers: An iterable of bytes
+        """
+        chunk_size = self.chunk_size
+        batch = []
+        batch_size = 0
+        for data in buffers:
+            for i in range(0, len(data), chunk_size):
+                chunk = data[i:i + chunk_size]
+                batch.append(chunk)
+                batch_size += len(chunk)
+                if batch_size >= chunk_size:
+                    yield b''.join(batch)
+                    batch = []
+                    batch_size = 0
+        if batch:
+            yield b''.join(batch)
+
+    def write_split(self, pieces, line_length):
+        """writes the given pieces split in to lines of line_length
+        characters, the result is identical to
+        ``split_data(b''.join(pieces), line_length)``
+
+        :param pieces: An iterable of bytes
+        :param int line_length: The number of characters per line.
+        """
+        column = None
+        for piece in pieces:
+            buffer = []
+            index = 0
+            piece_length = len(piece)
+            while index < piece_length:
+                if column is None:
+                    column = 0
+                elif column == line_length:
+                    buffer.append(b'\n')
+                    column = 0
+                line = piece[index:index + line_length - column]
+                buffer.append(line)
+                column += len(line)
+                index += len(line)
+            self.write(b''.join(buffer))
+
+    def write_encoded(self, buffers, line_length):
+        """encodes the given raw buffers in arnold base85 as one continuous
+        stream and writes them split in to lines of line_length characters
+
+        :param buffers: An iterable of raw bytes, the buffers are encoded as
+          if they were concatenated.
+        :param int line_length: The number of characters per line.
+        """
+        self.write_split(
+            base85.arnold_b85_encode_iter(self.iter_chunks(buffers)),
+            line_length
+        )
+
+    def write_joined(self, values, per_line=None, batch_size=10000):
+        """writes the given values joined with spaces, if per_line is given
+        every per_line values are written to a new line
+
+        :param values: An iterable of values.
+        :param int per_line: The number of values per line, None to write all
+          the values in one line.
+        :param int batch_size: The number of values to write at once when
+          per_line is None.
+        """
+        values = iter(values)
+        line_separator = '\n' if per_line else ' '
+        batch_size = per_line or batch_size
+        separator = ''
+        while True:
+            batch = list(islice(values, batch_size))
+            if not batch:
+                break
+            self.write('%s%s' % (separator, ' '.join(map(str, batch))))
+            separator = line_separator
+
+
+def write_ass_data(export_function, ass_file, *args, **kwargs):
+    """Calls the given export function with an AssWriter for the given
+    ass_file, or returns the exported data as a string if ass_file is None.
+
+    :param export_function: One of the ``*2ass`` functions.
+    :param ass_file: A file like object opened in binary mode or None.
+    """
+    if ass_file is not None:
+        export_function(AssWriter(ass_file), *args, **kwargs)
+        return
+
+    ass_file = BytesIO()
+    export_function(AssWriter(ass_file), *args, **kwargs)
+    return ass_file.getvalue().decode('utf-8')
+
+
+def timed(label, f):
+    """Wraps the given stream function to print its duration with the given
+    label
+
+    :param str label: The label to print.
+    :param f: The stream function.
+    """
+    def wrapper():
+        start = time.time()
+        f()
+        end = time.time()
+        print('%s: %3.3f' % (label, end - start))
+    return wrapper
+
+
 def geometry2ass(
         path, name, min_pixel_width, mode, export_type, export_motion,
         export_color, render_type, double_sided=True, invert_normals=False, **kwargs
@@ -90,25 +252,29 @@ def geometry2ass(
     except OSError:  # path exists
         pass
 
-    data = ''
-    if export_type == 0:
-        data = curves2ass(node, name, min_pixel_width, mode, export_motion)
-    elif export_type == 1:
-        data = polygon2ass(
-            node,
-            name,
-            export_motion,
-            export_color,
-            double_sided,
-            invert_normals,
-        )
-    elif export_type == 2:
-        data = particle2ass(node, name, export_motion, export_color, render_type)
-
+    # the data is encoded and written section by section
     write_start = time.time()
-    ass_file = file_handler(ass_path, 'w')
-    ass_file.write(data)
-    ass_file.close()
+    with file_handler(ass_path, 'wb') as ass_file:
+        if export_type == 0:
+            curves2ass(
+                node, name, min_pixel_width, mode, export_motion,
+                ass_file=ass_file
+            )
+        elif export_type == 1:
+            polygon2ass(
+                node,
+                name,
+                export_motion,
+                export_color,
+                double_sided,
+                invert_normals,
+                ass_file=ass_file,
+            )
+        elif export_type == 2:
+            particle2ass(
+                node, name, export_motion, export_color, render_type,
+                ass_file=ass_file
+            )
     write_end = time.time()
 
     print('Writing to file              : %3.3f' % (write_end - write_start))
@@ -131,9 +297,24 @@ def geometry2ass(
 
 def polygon2ass(
         node, name, export_motion=False, export_color=False, double_sided=True,
-        invert_normals=False
+        invert_normals=False, ass_file=None
 ):
     """exports polygon geometry to ass format
+
+    The data is streamed to the given ass_file, if no ass_file is given the
+    data is returned as a string.
+    """
+    return write_ass_data(
+        _polygon2ass, ass_file, node, name, export_motion, export_color,
+        double_sided, invert_normals
+    )
+
+
+def _polygon2ass(
+        writer, node, name, export_motion=False, export_color=False,
+        double_sided=True, invert_normals=False
+):
+    """streams polygon geometry to the given AssWriter
     """
     sample_count = 2 if export_motion else 1
 
@@ -178,223 +359,71 @@ polymesh
     # uvlist %(vertex_count)s 1 b85POINT2
     #%(vertex_uvs)s
 
-    skip_normals = False
-    skip_uvs = False
-    skip_colors = False
-
     intrinsic_values = geo.intrinsicValueDict()
 
     primitive_count = intrinsic_values['primitivecount']
     point_count = intrinsic_values['pointcount']
     vertex_count = intrinsic_values['vertexcount']
 
-    number_of_points_per_primitive = []
-    vertex_ids = []
-    # vertex_normals = []
-    # vertex_uvs = []
-    # uv_ids = []
-    # combined_uv_ids = []
-    ## uv_ids = split_data(' '.join(map(str, range(vertex_count))), 500)
-    # j = 0
-    # for i in range(vertex_count):
-    #     uv_ids.append(str(i))
-    #     j += 1
-    #     if j > 500:
-    #         j = 0
-    #         combined_uv_ids.append(' '.join(uv_ids))
-    #         uv_ids = []
-    vertex_colors = []
-
-    ## join for a last time
-    # if uv_ids:
-    #     combined_uv_ids.append(' '.join(uv_ids))
     #
-    # uv_ids = combined_uv_ids
-
-    # just for the first vertex try to read the uv to determine if we should
-    # skip the uvs or not
-    # skip_uvs = True
-
-    i = 0
-    j = 0
-    combined_vertex_ids = []
-    # combined_vertex_normals = []
-    combined_number_of_points_per_primitive = []
-
-    for prim in geo.iterPrims():
-        number_of_points_per_primitive.append(str(prim.numVertices()))
-        i += 1
-        if i > 500:
-            i = 0
-            combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
-            number_of_points_per_primitive = []
-        for vertex in prim.vertices():
-            point = vertex.point()
-            point_id = point.number()
-            vertex_ids.append(str(point_id))
-            # vertex_normals.extend(point.floatListAttribValue('N'))
-            # vertex_uv = vertex.floatListAttribValue('uv')
-            # vertex_uvs.append(vertex_uv[0])
-            # vertex_uvs.append(vertex_uv[1])
-            j += 1
-            if j > 500:
-                j = 0
-                combined_vertex_ids.append(' '.join(vertex_ids))
-                vertex_ids = []
-                # combined_vertex_normals.append(' '.join(map(str, vertex_normals)))
-                # vertex_normals = []
-                vertex_colors = []
-
-    # join for a last time
-    if number_of_points_per_primitive:
-        combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
-
-    if vertex_ids:
-        combined_vertex_ids.append(' '.join(vertex_ids))
-
-    # if vertex_normals:
-    #     combined_vertex_normals.append(' '.join(map(str, vertex_normals)))
-
-    # # encode uvs
-    # encoded_vertex_uvs = '{}'.format(
-    #     base85.arnold_b85_encode(
-    #         struct.pack(
-    #             '<{}d'.format(len(vertex_uvs)),
-    #             *vertex_uvs
-    #         )
-    #     )
-    # )
-    # splitted_vertex_uvs = split_data(encoded_vertex_uvs, 500)
-
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-
-    try:
-        point_colors = geo.pointFloatAttribValuesAsString('color')
-    except hou.OperationFailed:
-        # no color attribute skip it
-        skip_colors = True
-        point_colors = ''
-
-    # try:
-    #    point_normals = geo.pointFloatAttribValuesAsString('N')
-    #    # point_normals = geo.pointFloatAttribValues('N')
-    # except hou.OperationFailed:
-    #    # no normal attribute skip it
-    #    skip_normals = True
-    #    point_normals = ''
+    # Number Of Points Per Primitive
+    #
+    def write_number_of_points_per_primitive():
+        writer.write_joined(
+            (prim.numVertices() for prim in geo.iterPrims()),
+            per_line=501
+        )
 
     #
-    # Number Of Points Per Primitive
+    # Vertex Ids
     #
-    encode_start = time.time()
-    # encoded_number_of_points_per_primitive = 'B{}'.format(
-    #     base85.arnold_b85_encode(
-    #         struct.pack(
-    #             '>{}B'.format(len(number_of_points_per_primitive)),
-    #             *number_of_points_per_primitive
-    #         )
-    #     )
-    # )
-    encoded_number_of_points_per_primitive = '\n'.join(combined_number_of_points_per_primitive)
-    encode_end = time.time()
-    print('Encoding Number of Points  : {:3.3f}'.format(encode_end - encode_start))
-
-    split_start = time.time()
-    # splitted_number_of_points_per_primitive = \
-    #     re.sub(
-    #         "(.{500})", "\\1\n",
-    #         #' '.join(number_of_points_per_primitive),
-    #         encoded_number_of_points_per_primitive,
-    #         0
-    #     )
-    # splitted_number_of_points_per_primitive = ' '.join(encoded_number_of_points_per_primitive)
-    splitted_number_of_points_per_primitive = encoded_number_of_points_per_primitive
-    split_end = time.time()
-    print('Splitting Number of Points : %3.3f' % (split_end - split_start))
+    def write_vertex_ids():
+        writer.write_joined(
+            (
+                vertex.point().number()
+                for prim in geo.iterPrims()
+                for vertex in prim.vertices()
+            ),
+            per_line=501
+        )
 
     #
     # Point Positions
     #
-    encode_start = time.time()
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
-    encode_end = time.time()
-    print('Encoding Point Position    : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions : %3.3f' % (split_end - split_start))
-
-    # #
-    # # Vertex Normals
-    # #
-    # encode_start = time.time()
-    # encoded_vertex_normals = '\n'.join(combined_vertex_normals)#base85.arnold_b85_encode(point_normals)
-    # encode_end = time.time()
-    # print('Encoding Point Normals     : %3.3f' % (encode_end - encode_start))
-    #
-    # split_start = time.time()
-    # # splitted_vertex_normals = re.sub("(.{500})", "\\1\n", encoded_point_normals, 0)
-    # splitted_vertex_normals = encoded_vertex_normals
-    # # # split every n-th data
-    # # n = 100
-    # # splitted_point_normals = []
-    # # for i in range(len(point_normals) / n):
-    # #     start_index = n * i
-    # #     end_index = n * (i+1)
-    # #     splitted_point_normals.extend(point_normals[start_index:end_index])
-    # #     splitted_point_normals.append('\n')
-    # #
-    # # splitted_point_normals = ' '.join(map(str, splitted_point_normals))
-    # split_end = time.time()
-    # print('Splitting Vertex Normals    : %3.3f' % (split_end - split_start))
-
-    # #
-    # # Vertex Colors
-    # #
-
-    encode_start = time.time()
-    encoded_point_colors = base85.arnold_b85_encode(point_colors)
-    encode_end = time.time()
-    print('Encoding Point colors     : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_point_colors = split_data(encoded_point_colors, 100)
-    split_end = time.time()
-    print('Splitting Vertex Colors    : %3.3f' % (split_end - split_start))
+    def iter_point_positions():
+        yield geo.pointFloatAttribValuesAsString('P')
+        if export_motion:
+            yield geo.pointFloatAttribValuesAsString('pprime')
+
+    def write_point_positions():
+        writer.write_encoded(iter_point_positions(), 500)
 
     #
-    # Vertex Ids
+    # Vertex Colors
     #
-    encode_start = time.time()
-    # encoded_vertex_ids = 'B{}'.format(
-    #     base85.arnold_b85_encode(
-    #         struct.pack(
-    #             '>{}B'.format(len(vertex_ids)),
-    #             *vertex_ids
-    #         )
-    #     )
-    # )
-    encoded_vertex_ids = '\n'.join(combined_vertex_ids)
-    encode_end = time.time()
-    print('Encoding Vertex Ids        : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    # splitted_vertex_ids = re.sub(
-    #     "(.{500})", "\\1\n",
-    #     #' '.join(vertex_ids),
-    #     encoded_vertex_ids,
-    #     0
-    # )
-    # splitted_vertex_ids = ' '.join(encoded_vertex_ids)
-    splitted_vertex_ids = encoded_vertex_ids
-    split_end = time.time()
-    print('Splitting Vertex Ids       : %3.3f' % (split_end - split_start))
+    def iter_point_colors():
+        try:
+            yield geo.pointFloatAttribValuesAsString('color')
+        except hou.OperationFailed:
+            # no color attribute skip it
+            pass
+
+    def write_color_template():
+        if not export_color:
+            return
+        color_template = """
+            declare colorSet1 varying RGBA
+            colorSet1 %(point_count)s 1 b85RGBA
+            %(splitted_point_colors)s
+        """
+        writer.write_template(
+            color_template,
+            {'point_count': point_count},
+            {
+                'splitted_point_colors':
+                    lambda: writer.write_encoded(iter_point_colors(), 100)
+            }
+        )
 
     matrix = """1 0 0 0
 0 1 0 0
@@ -404,43 +433,52 @@ polymesh
     if export_motion:
         matrix += matrix
 
-    color_template = ''
-    if export_color:
-        color_template = """
-            declare colorSet1 varying RGBA
-            colorSet1 %(point_count)s 1 b85RGBA
-            %(splitted_point_colors)s
-        """
-
-        color_template = color_template % {
-            'point_count': point_count,
-            'splitted_point_colors':splitted_point_colors
-        }
-
-    data = base_template % {
+    template_vars = {
         'name': name,
         'point_count': point_count,
         'vertex_count': vertex_count,
         'primitive_count': primitive_count,
         'sample_count': sample_count,
-        'number_of_points_per_primitive': splitted_number_of_points_per_primitive,
-        'vertex_ids': splitted_vertex_ids,
-        'point_positions': splitted_point_positions,
         'matrix': matrix,
-        'color_template': color_template,
         'sidedness': 255 if double_sided else 0,
         'invert_normals': 'on' if invert_normals else 'off',
-        # 'uv_ids': uv_ids,
-        # 'vertex_uvs': splitted_vertex_uvs,
-        # 'normal_count': vertex_count,
-        # 'vertex_normals': splitted_vertex_normals,
     }
 
-    return data
+    writer.write_template(
+        base_template,
+        template_vars,
+        {
+            'number_of_points_per_primitive': timed(
+                'Writing Number of Points   ',
+                write_number_of_points_per_primitive
+            ),
+            'vertex_ids': timed('Writing Vertex Ids         ', write_vertex_ids),
+            'point_positions': timed(
+                'Writing Point Positions    ', write_point_positions
+            ),
+            'color_template': timed(
+                'Writing Point Colors       ', write_color_template
+            ),
+        }
+    )
 
 
-def particle2ass(node, name, export_motion=False, export_color=False, render_type=0):
-    """exports polygon geometry to ass format
+def particle2ass(node, name, export_motion=False, export_color=False,
+                 render_type=0, ass_file=None):
+    """exports particle geometry to ass format
+
+    The data is streamed to the given ass_file, if no ass_file is given the
+    data is returned as a string.
+    """
+    return write_ass_data(
+        _particle2ass, ass_file, node, name, export_motion, export_color,
+        render_type
+    )
+
+
+def _particle2ass(writer, node, name, export_motion=False, export_color=False,
+                  render_type=0):
+    """streams particle geometry to the given AssWriter
     """
     sample_count = 2 if export_motion else 1
 
@@ -465,71 +503,35 @@ points
  id -838484804
 %(color_template)s
 }"""
-    #  uvidxs %(vertex_count)s 1 UINT
-    #%(uv_ids)s
-    # uvlist %(vertex_count)s 1 b85POINT2
-    #%(vertex_uvs)s
-
-    skip_normals = False
-    skip_uvs = False
-    skip_colors = False
-    skip_radius = False
 
     intrinsic_values = geo.intrinsicValueDict()
 
     point_count = intrinsic_values['pointcount']
 
-    # i = 0
-    # j = 0
-    # combined_vertex_ids = []
-    # # combined_vertex_normals = []
-    # combined_number_of_points_per_primitive = []
-
     #
     # Point Positions
     #
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-        del point_prime_positions
-
-    encode_start = time.time()
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
-    encode_end = time.time()
-    print('Encoding Point Position    : %3.3f' % (encode_end - encode_start))
-    del point_positions
-
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions : %3.3f' % (split_end - split_start))
-    del encoded_point_positions
+    def iter_point_positions():
+        yield geo.pointFloatAttribValuesAsString('P')
+        if export_motion:
+            yield geo.pointFloatAttribValuesAsString('pprime')
+
+    def write_point_positions():
+        writer.write_encoded(iter_point_positions(), 500)
 
     #
     # Point Radius
     #
-    try:
-        point_radius = geo.pointFloatAttribValuesAsString('pscale')
-    except hou.OperationFailed:
-       # no radius attribute skip it
-        skip_radius = True
-        point_radius = ''
-
-    encode_start = time.time()
-    encoded_point_radius = base85.arnold_b85_encode(point_radius)
-    encode_end = time.time()
-    print('Encoding Point Radius    : %3.3f' % (encode_end - encode_start))
-    del point_radius
-
-    split_start = time.time()
-    splitted_point_radius = split_data(encoded_point_radius, 500)
-    split_end = time.time()
-    print('Splitting Point Radius : %3.3f' % (split_end - split_start))
-    del encoded_point_radius
-
-    render_type = render_type
+    def iter_point_radius():
+        try:
+            yield geo.pointFloatAttribValuesAsString('pscale')
+        except hou.OperationFailed:
+            # no radius attribute skip it
+            pass
+
+    def write_point_radius():
+        writer.write_encoded(iter_point_radius(), 500)
+
     render_as = "disk"
 
     if render_type == 1:
@@ -537,61 +539,75 @@ points
     elif render_type == 2:
         render_as = "quad"
 
-    # #
-    # # Vertex Colors
-    # #
-    color_template = ''
-    if export_color:
+    #
+    # Point Colors
+    #
+    def iter_point_colors():
         try:
-            point_colors = geo.pointFloatAttribValuesAsString('particle_color')
+            yield geo.pointFloatAttribValuesAsString('particle_color')
         except hou.OperationFailed:
-           # no color attribute skip it
-            skip_colors = True
-            point_colors = ''
-
-        encode_start = time.time()
-        encoded_point_colors = base85.arnold_b85_encode(point_colors)
-        encode_end = time.time()
-        print('Encoding Point colors     : %3.3f' % (encode_end - encode_start))
-        del point_colors
-
-        split_start = time.time()
-        splitted_point_colors = split_data(encoded_point_colors, 100)
-        split_end = time.time()
-        print('Splitting Point Colors : %3.3f' % (split_end - split_start))
-        del encoded_point_colors
+            # no color attribute skip it
+            pass
 
+    def write_color_template():
+        if not export_color:
+            return
         color_template = """
             declare rgbPP uniform RGB
             rgbPP %(point_count)s 1 b85RGB
             %(splitted_point_colors)s
         """
+        writer.write_template(
+            color_template,
+            {'point_count': point_count},
+            {
+                'splitted_point_colors':
+                    lambda: writer.write_encoded(iter_point_colors(), 100)
+            }
+        )
 
-        color_template = color_template % {
-            'point_count': point_count,
-            'splitted_point_colors': splitted_point_colors
-        }
-
-    data = base_template % {
+    template_vars = {
         'name': name,
         'point_count': point_count,
         'sample_count': sample_count,
         'render_as': render_as,
-        'point_radius': splitted_point_radius,
-        'point_positions': splitted_point_positions,
-        'color_template': color_template,
     }
-    del splitted_point_radius
-    del splitted_point_positions
-    return data
+
+    writer.write_template(
+        base_template,
+        template_vars,
+        {
+            'point_positions': timed(
+                'Writing Point Positions    ', write_point_positions
+            ),
+            'point_radius': timed(
+                'Writing Point Radius       ', write_point_radius
+            ),
+            'color_template': timed(
+                'Writing Point Colors       ', write_color_template
+            ),
+        }
+    )
 
 
 def curves2ass(node, hair_name, min_pixel_width=0.5, mode='ribbon',
-               export_motion=False):
+               export_motion=False, ass_file=None):
     """exports the node content to ass file
+
+    The data is streamed to the given ass_file, if no ass_file is given the
+    data is returned as a string.
+    """
+    return write_ass_data(
+        _curves2ass, ass_file, node, hair_name, min_pixel_width, mode,
+        export_motion
+    )
+
+
+def _curves2ass(writer, node, hair_name, min_pixel_width=0.5, mode='ribbon',
+                export_motion=False):
+    """streams the node content to the given AssWriter
     """
     sample_count = 2 if export_motion else 1
-    template_vars = dict()
     geo = node.geometry()
 
     base_template = """
@@ -636,141 +652,74 @@ curves
     # write down the radius for the tip twice
     radius_count = real_point_count
 
-    real_number_of_points_in_one_curve = real_point_count / number_of_curves
+    real_number_of_points_in_one_curve = real_point_count // number_of_curves
     number_of_points_in_one_curve = real_number_of_points_in_one_curve + 2
-    number_of_points_per_curve = [str(number_of_points_in_one_curve)] * number_of_curves
-
-    curve_ids = ' '.join(str(id_) for id_ in range(number_of_curves))
-
-    radius = None
 
     pack = struct.pack
 
-    # try to find the width as a point attribute to speed things up
-    getting_radius_start = time.time()
-    radius_attribute = geo.findPointAttrib('width')
-    if radius_attribute:
-        # this one works 100 times faster then iterating over each vertex
-        radius = geo.pointFloatAttribValuesAsString('width')
-    else:
-        # no radius in points, so iterate over each vertex
-        radius_i = 0
-        radius_str_buffer = []
-        radius_file_str = StringIO()
-        radius_file_str_write = radius_file_str.write
-        radius_str_buffer_append = radius_str_buffer.append
-        for prim in geo.prims():
-            prim_vertices = prim.vertices()
-
-            # radius
-            radius_i += real_number_of_points_in_one_curve
-            if radius_i >= 1000:
-                radius_file_str_write(''.join(radius_str_buffer))
-                radius_str_buffer = []
-                radius_str_buffer_append = radius_str_buffer.append
-                radius_i = 0
-
-            for vertex in prim_vertices:
-                radius_str_buffer_append(pack('f', vertex.attribValue('width')))
-
-        # do flushes again before getting the values
-        radius_file_str_write(''.join(radius_str_buffer))
-        radius = radius_file_str.getvalue()
-    getting_radius_end = time.time()
-    print('Getting Radius Info          : %3.3f' %
-          (getting_radius_end - getting_radius_start))
-
-    # point positions
-    encode_start = time.time()
-
-    # for motion blur use pprime
-    getting_point_positions_start = time.time()
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-
-    getting_point_positions_end = time.time()
-    print('Getting Point Position       : %3.3f' %
-          (getting_point_positions_end - getting_point_positions_start))
-
-    # repeat every first and last point coordinates
-    # (3 value each 3 * 4 = 12 characters) of every curve
-    zip_start = time.time()
-    point_positions = ''.join(
-        map(
-            lambda x: '%s%s%s' % (x[:12], x, x[-12:]),
-            map(
-                ''.join,
-                zip(*[iter(point_positions)] * (real_number_of_points_in_one_curve*4*3)))
+    def write_number_of_points_per_curve():
+        writer.write_joined(
+            [number_of_points_in_one_curve] * number_of_curves * sample_count
         )
-    )
-    zip_end = time.time()
-    print('Zipping Point Position       : %3.3f' % (zip_end - zip_start))
-
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
-    encode_end = time.time()
-    print('Encoding Point Position      : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions    : %3.3f' % (split_end - split_start))
-
-    # radius
-    encode_start = time.time()
-    encoded_radius = base85.arnold_b85_encode(radius)
-    encode_end = time.time()
-    print('Radius encode                : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_radius = split_data(encoded_radius, 500)
-    # extend for motion blur
-    # if export_motion:
-    #     splitted_radius = '%(data)s%(data)s' % {'data': splitted_radius}
-    split_end = time.time()
-    print('Splitting Radius             : %3.3f' % (split_end - split_start))
-
-    # uv
-    getting_uv_start = time.time()
-    u = geo.primFloatAttribValuesAsString('uv_u')
-    v = geo.primFloatAttribValuesAsString('uv_v')
-    getting_uv_end = time.time()
-    print('Getting uv                   : %3.3f' %
-          (getting_uv_end - getting_uv_start))
-
-    encode_start = time.time()
-    encoded_u = base85.arnold_b85_encode(u)
-    encode_end = time.time()
-    print('Encoding UParamcoord         : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_u = split_data(encoded_u, 500)
-    if export_motion:
-        splitted_u = '%(data)s%(data)s' % {'data': splitted_u}
-    split_end = time.time()
-    print('Splitting UParamCoord        : %3.3f' % (split_end - split_start))
 
-    encode_start = time.time()
-    encoded_v = base85.arnold_b85_encode(v)
-    encode_end = time.time()
-    print('Encoding VParamcoord         : %3.3f' % (encode_end - encode_start))
+    def write_curve_ids():
+        writer.write_joined(range(number_of_curves))
 
-    split_start = time.time()
-    splitted_v = split_data(encoded_v, 500)
-    if export_motion:
-        splitted_v = '%(data)s%(data)s' % {'data': splitted_v}
-    split_end = time.time()
-    print('Splitting VParamCoord        : %3.3f' % (split_end - split_start))
+    # for motion blur use pprime
+    def iter_point_positions():
+        # repeat every first and last point coordinates
+        # (3 value each 3 * 4 = 12 characters) of every curve
+        curve_size = real_number_of_points_in_one_curve * 4 * 3
+        curves_per_chunk = max(1, writer.chunk_size // curve_size)
+        attribute_names = ['P']
+        if export_motion:
+            attribute_names.append('pprime')
+        for attribute_name in attribute_names:
+            point_positions = geo.pointFloatAttribValuesAsString(attribute_name)
+            full_size = len(point_positions) - len(point_positions) % curve_size
+            for i in range(0, full_size, curve_size * curves_per_chunk):
+                chunk_end = min(i + curve_size * curves_per_chunk, full_size)
+                buffer = []
+                for j in range(i, chunk_end, curve_size):
+                    x = point_positions[j:j + curve_size]
+                    buffer.append(x[:12])
+                    buffer.append(x)
+                    buffer.append(x[-12:])
+                yield b''.join(buffer)
+            del point_positions
+
+    def write_point_positions():
+        writer.write_encoded(iter_point_positions(), 500)
 
-    print('len(encoded_point_positions) : %s' % len(encoded_point_positions))
-    print('(p + 2 * c) * 5 * 3          : %s' % (point_count * 5 * 3))
-    print('len(encoded_radius)          : %s' % len(encoded_radius))
-    print('len(uv)                      : %s' % len(u))
-    print('len(encoded_u)               : %s' % len(encoded_u))
-    print('len(encoded_v)               : %s' % len(encoded_v))
+    # try to find the width as a point attribute to speed things up
+    def iter_radius():
+        radius_attribute = geo.findPointAttrib('width')
+        if radius_attribute:
+            # this one works 100 times faster then iterating over each vertex
+            yield geo.pointFloatAttribValuesAsString('width')
+        else:
+            # no radius in points, so iterate over each vertex
+            for prim in geo.prims():
+                yield b''.join(
+                    pack('f', vertex.attribValue('width'))
+                    for vertex in prim.vertices()
+                )
+
+    def write_radius():
+        writer.write_encoded(iter_radius(), 500)
+
+    # uv, extend for motion blur
+    def write_u():
+        for _ in range(sample_count):
+            writer.write_encoded(
+                [geo.primFloatAttribValuesAsString('uv_u')], 500
+            )
+
+    def write_v():
+        for _ in range(sample_count):
+            writer.write_encoded(
+                [geo.primFloatAttribValuesAsString('uv_v')], 500
+            )
 
     # extend for motion blur
     matrix = """1 0 0 0
@@ -779,32 +728,33 @@ curves
   0 0 0 1
 """
     if export_motion:
-        number_of_points_per_curve.extend(number_of_points_per_curve)
         matrix += matrix
 
-    template_vars.update({
+    template_vars = {
         'name': node.path().replace('/', '_'),
         'curve_count': number_of_curves,
-        'real_point_count': real_point_count,
-        'number_of_points_per_curve': ' '.join(number_of_points_per_curve),
         'point_count': point_count,
-        'point_positions': splitted_point_positions,
-        'radius': splitted_radius,
         'radius_count': radius_count,
-        'curve_ids': curve_ids,
-        'uparamcoord': splitted_u,
-        'vparamcoord': splitted_v,
         'min_pixel_width': min_pixel_width,
         'mode': mode,
         'sample_count': sample_count,
         'matrix': matrix
-    })
-
-    rendered_curve_data = base_template % template_vars
-
-    del geo
+    }
 
-    return rendered_curve_data
+    writer.write_template(
+        base_template,
+        template_vars,
+        {
+            'number_of_points_per_curve': write_number_of_points_per_curve,
+            'point_positions': timed(
+                'Writing Point Positions      ', write_point_positions
+            ),
+            'radius': timed('Writing Radius               ', write_radius),
+            'uparamcoord': timed('Writing UParamCoord          ', write_u),
+            'vparamcoord': timed('Writing VParamCoord          ', write_v),
+            'curve_ids': write_curve_ids,
+        }
+    )
 
 
 def split_data(data, chunk_size):
@@ -4,7 +4,12 @@ import threading
 
 from anima.ui.base import AnimaDialogBase, ui_caller
 from anima.ui.lib import QtCore, QtWidgets
-from anima.publish import ProgressControllerBase
+from anima.publish import (
+    ProgressControllerBase,
+    PublisherEngine,
+    PublisherHistory,
+    PublisherResultCache,
+)
 
 
 class QProgressBarWrapper(ProgressControllerBase):
@@ -75,6 +80,7 @@ class PublisherElement(object):
 
     passing_text = "Passing"
     not_passing_text = "Not Passing"
+    cached_text = "Passing (cached, the inputs did not change)"
 
     def __init__(self, publisher=None):
         self.publisher = publisher
@@ -97,6 +103,10 @@ class PublisherElement(object):
         self.duration = 0.0
         self._state = False
 
+        # the publisher history and the result cache of the dialog
+        self.history = None
+        self.result_cache = None
+
     def create(self, parent=None):
         """Creates this publisher
 
@@ -306,64 +316,77 @@ class PublisherElement(object):
             self.publisher_name_label.setStyleSheet("color: red;")
         self._state = state
 
-    def run_publisher(self):
-        """runs the publisher"""
-        if self.publisher:
-            # reset the counter and state
-            self.state = False
-            self.performance_label.setText("x.x sec")
-            self.progress_bar.setValue(0)
+    def reset(self):
+        """resets the state and disables the check button before a run"""
+        self.state = False
+        self.performance_label.setText("x.x sec")
+        self.progress_bar.setValue(0)
 
-            # from anima.exc import PublishError
-            import sys
-            import traceback
-            import time
+        # disable Check button
+        self.check_push_button.setText("Checking...")
+        self.check_push_button.setEnabled(False)
+        try:
+            qApp = QtWidgets.qApp
+        except AttributeError:
+            qApp = QtWidgets.QApplication
+        qApp.sendPostedEvents()
 
-            start = time.time()
-            try:
-                # disable Check button
-                self.check_push_button.setText("Checking...")
-                self.check_push_button.setEnabled(False)
-                try:
-                    qApp = QtWidgets.qApp
-                except AttributeError:
-                    qApp = QtWidgets.QApplication
-                qApp.sendPostedEvents()
-                self.publisher(progress_controller=self.progress_bar_manager)
-                end = time.time()
-            except Exception as e:
-                end = time.time()
-                self.state = False
-                self.publisher_state_label.setToolTip(
-                    "\n".join(traceback.format_exc().splitlines()[-25:])
-                )
-            else:
-                self.state = True
-                self.publisher_state_label.setToolTip("")
+    def apply_result(self, result):
+        """updates the UI with the given publisher result
 
-            # set performance label
-            self.duration = end - start
+        :param result: A :class:`anima.publish.PublisherResult` instance.
+        """
+        if result.passed:
+            self.state = True
+            self.publisher_state_label.setToolTip(
+                self.cached_text if result.cached else ""
+            )
+        else:
+            self.state = False
+            self.publisher_state_label.setToolTip(
+                "\n".join(result.traceback.splitlines()[-25:])
+            )
+
+        # set performance label
+        self.duration = result.duration
+        if result.cached:
+            # the publisher didn't run
+            self.duration = 0.0
+            self.performance_label.setText("cached")
+        else:
             self.performance_label.setText("%0.1f sec" % self.duration)
-            self.check_push_button.setText("Check")
-            self.check_push_button.setEnabled(True)
+        self.check_push_button.setText("Check")
+        self.check_push_button.setEnabled(True)
 
-            # set fix label
-            if self.state is True:
-                self.fix_push_button.setDisabled(True)
-                self.fix_push_button.setStyleSheet("background-color: None")
-            else:
-                # disable fix button if fix definition does not exist
-                fix_def_name = "%s%s" % (self.publisher.__name__, self.fix_identifier)
+        # set fix label
+        if self.state is True:
+            self.fix_push_button.setDisabled(True)
+            self.fix_push_button.setStyleSheet("background-color: None")
+        else:
+            # disable fix button if fix definition does not exist
+            fix_def_name = "%s%s" % (self.publisher.__name__, self.fix_identifier)
 
-                from anima.dcc.mayaEnv import publish
+            from anima.dcc.mayaEnv import publish
+
+            # disable by default
+            self.fix_push_button.setDisabled(True)
+            self.fix_push_button.setStyleSheet("background-color: None")
+            # enable if the function exists
+            if fix_def_name in publish.__dict__:
+                self.fix_push_button.setEnabled(True)
+                self.fix_push_button.setStyleSheet("background-color: green")
 
-                # disable by default
-                self.fix_push_button.setDisabled(True)
-                self.fix_push_button.setStyleSheet("background-color: None")
-                # enable if the function exists
-                if fix_def_name in publish.__dict__:
-                    self.fix_push_button.setEnabled(True)
-                    self.fix_push_button.setStyleSheet("background-color: green")
+    def run_publisher(self):
+        """runs the publisher, it always runs even if its inputs didn't change"""
+        if self.publisher:
+            self.reset()
+            engine = PublisherEngine(
+                [self.publisher],
+                history=self.history,
+                progress_controller_factory=lambda p: self.progress_bar_manager,
+                result_cache=self.result_cache,
+            )
+            self.apply_result(engine.run(use_cache=False)[self.publisher])
 
 
 class PublisherRunner(threading.Thread):
@@ -394,6 +417,8 @@ class MainDialog(QtWidgets.QDialog, AnimaDialogBase):
         self.publish_callback = publish_callback
         self.version = version
         self.last_run_date = 0
+        self.history = PublisherHistory()
+        self.result_cache = PublisherResultCache()
 
         self._setup_ui()
         self.fill_ui()
@@ -596,6 +621,8 @@ class MainDialog(QtWidgets.QDialog, AnimaDialogBase):
         # generate one UI element per publisher
         # create the layout
         publisher_element = PublisherElement(publisher)
+        publisher_element.history = self.history
+        publisher_element.result_cache = self.result_cache
         publisher_element.create(parent=self)
         self.publisher_vertical_layout.addLayout(publisher_element.layout)
         return publisher_element
@@ -603,6 +630,9 @@ class MainDialog(QtWidgets.QDialog, AnimaDialogBase):
     def check_all_publishers(self):
         """runs all the publishers as if their check buttons are pushed one by
         one
+
+        The publishers that passed before and whose fingerprint didn't change
+        are not run again, their cached results are shown.
         """
         try:
             qApp = QtWidgets.qApp
@@ -612,16 +642,32 @@ class MainDialog(QtWidgets.QDialog, AnimaDialogBase):
 
         import time
 
-        current_time = time.time()
-        # do not run publishers if they ran less than 5 seconds ago
-        if current_time - self.last_run_date > 5:
-            for publisher in self.publishers:
-                # move the view to this publisher
-                self.scroll_area.ensureWidgetVisible(publisher.check_push_button)
-                publisher.run_publisher()
-                self.update_publisher_total_duration_info()
-                qApp.sendPostedEvents()
-            self.last_run_date = time.time()
+        elements = {}
+        for publisher in self.publishers:
+            publisher.reset()
+            elements.setdefault(publisher.publisher, []).append(publisher)
+
+        def get_progress_controller(p):
+            # move the view to this publisher
+            self.scroll_area.ensureWidgetVisible(elements[p][0].check_push_button)
+            return elements[p][0].progress_bar_manager
+
+        def apply_result(result):
+            for element in elements[result.publisher]:
+                element.apply_result(result)
+            self.update_publisher_total_duration_info()
+            qApp.sendPostedEvents()
+
+        # run them all with a shared scene snapshot
+        engine = PublisherEngine(
+            list(elements),
+            history=self.history,
+            progress_controller_factory=get_progress_controller,
+            callback=apply_result,
+            result_cache=self.result_cache,
+        )
+        engine.run()
+        self.last_run_date = time.time()
 
         return self.check_publisher_states()
 
@@ -642,6 +688,15 @@ class MainDialog(QtWidgets.QDialog, AnimaDialogBase):
         else:
             self.duration_label.setText("Publishers run in: %0.1f sec!" % seconds)
 
+        # show the slowest publishers in the history
+        self.duration_label.setToolTip(
+            "Slowest publishers (average):\n%s"
+            % "\n".join(
+                "%0.1f sec: %s" % (duration, key)
+                for key, duration in self.history.get_slowest(5)
+            )
+        )
+
     def check_publisher_states(self):
         """check publisher states"""
         if self.publishers:
@@ -10,8 +10,7 @@ from anima.ui.utils import choose_thumbnail, get_cached_icon
 from anima.utils import (
     create_structure,
     duplicate_task_hierarchy,
-    fix_task_computed_time,
-    fix_task_statuses,
+    fix_task_statuses_in_bulk,
     open_browser_in_location,
     task_hierarchy_io,
     upload_thumbnail,
@@ -786,9 +785,7 @@ class TaskDataContextMenuHandler(ContextMenuHandlerBase):
                 elif selected_action is fix_task_status_action:
                     for entity in self.parent.get_selected_tasks():
                         if isinstance(entity, Task):
-                            fix_task_statuses(entity)
-                            fix_task_computed_time(entity)
-                            DBSession.add(entity)
+                            fix_task_statuses_in_bulk(entity)
                     DBSession.commit()
 
                     unique_parent_items = []
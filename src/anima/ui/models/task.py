@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
 """Custom UI items and models are here."""
+import time
+from collections import OrderedDict
 
 from anima import defaults, logger
 from anima.ui.lib import QtCore, QtGui, QtWidgets
 from anima.ui.utils import get_cached_icon
 from anima.utils import (
-    partial_task_query,
+    partial_children_task_query,
     convert_to_partial_task,
-    get_unique_take_names,
+    get_unique_take_names_of_tasks,
 )
 
 from stalker import Project, SimpleEntity, Task
@@ -18,6 +20,144 @@ if False:
     from PySide2 import QtCore, QtGui, QtWidgets
 
 
+class TaskDataCache(object):
+    """Cache the partial children and the take names of the tasks by task id.
+
+    The children of many tasks and the take names of many tasks are fetched with
+    one query each. The entries of the tasks and versions that are created,
+    updated or deleted are removed when the DBSession is flushed. As the changes
+    done by the other users are not seen by the flush events, the entries
+    expire after ``max_age`` seconds and only the last used ``max_size`` entries
+    are kept.
+    """
+
+    max_age = 60
+    max_size = 10000
+
+    children = OrderedDict()
+    take_names = OrderedDict()
+    _events_registered = False
+
+    @classmethod
+    def _get_many(cls, cache, keys, fetch):
+        """Return the cached values of the given keys, fetch the missing ones.
+
+        Args:
+            cache (OrderedDict): The cache storing the (time, value) pairs.
+            keys (list): The keys to return the values of.
+            fetch: A callable that takes a list of keys and returns a dictionary
+                of key and value pairs.
+
+        Returns:
+            dict: A dictionary of key and value pairs.
+        """
+        now = time.time()
+        missing = []
+        for key in keys:
+            entry = cache.get(key)
+            if entry is None or now - entry[0] > cls.max_age:
+                missing.append(key)
+        if missing:
+            for key, value in fetch(missing).items():
+                cache[key] = (now, value)
+
+        result = {}
+        for key in keys:
+            cache.move_to_end(key)
+            result[key] = cache[key][1]
+
+        while len(cache) > cls.max_size:
+            cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def get_children(cls, parent_tasks):
+        """Return the partial children of the given tasks.
+
+        Args:
+            parent_tasks (list): A list of stalker.Task, stalker.Project or partial
+                task instances.
+
+        Returns:
+            dict: A dictionary of parent id and list of partial tasks pairs.
+        """
+        cls.register_events()
+        tasks_by_id = {t.id: t for t in parent_tasks}
+        return cls._get_many(
+            cls.children,
+            [t.id for t in parent_tasks],
+            lambda ids: partial_children_task_query([tasks_by_id[i] for i in ids]),
+        )
+
+    @classmethod
+    def get_take_names(cls, task_ids):
+        """Return the unique take names of the given tasks.
+
+        Args:
+            task_ids (list): A list of task ids.
+
+        Returns:
+            dict: A dictionary of task id and list of take name pairs.
+        """
+        cls.register_events()
+        return cls._get_many(cls.take_names, task_ids, get_unique_take_names_of_tasks)
+
+    @classmethod
+    def invalidate(cls, task_ids=None):
+        """Remove the cached data of the given tasks.
+
+        Args:
+            task_ids (list): A list of task or project ids, clears the whole cache
+                if it is None.
+        """
+        if task_ids is None:
+            cls.children.clear()
+            cls.take_names.clear()
+            return
+
+        for task_id in task_ids:
+            cls.children.pop(task_id, None)
+            cls.take_names.pop(task_id, None)
+
+    @classmethod
+    def register_events(cls):
+        """Register the DBSession events that invalidate the cache."""
+        if cls._events_registered:
+            return
+
+        from sqlalchemy import event
+
+        event.listen(DBSession, "after_flush", cls._after_flush)
+        cls._events_registered = True
+
+    @classmethod
+    def _after_flush(cls, session, flush_context):
+        """Invalidate the cached data of the changed tasks and versions.
+
+        Args:
+            session: The flushed session.
+            flush_context: The flush context.
+        """
+        from sqlalchemy.orm.attributes import get_history
+        from stalker import Version
+
+        task_ids = set()
+        for instance in (
+            list(session.new) + list(session.dirty) + list(session.deleted)
+        ):
+            if isinstance(instance, Task):
+                task_ids.update([instance.id, instance.parent_id, instance.project_id])
+                # also the previous parent of the moved tasks
+                for old_parent in get_history(instance, "parent").deleted:
+                    if old_parent is not None:
+                        task_ids.add(old_parent.id)
+            elif isinstance(instance, Version):
+                cls.take_names.pop(instance.task_id, None)
+        task_ids.discard(None)
+        if task_ids:
+            cls.invalidate(task_ids)
+
+
 class TaskNameCompleter(QtWidgets.QCompleter):
     """Task name completer.
 
@@ -141,9 +281,14 @@ class TaskItem(QtGui.QStandardItem):
 
     task_entity_types = ["Task", "Asset", "Shot", "Sequence"]
 
+    # the maximum number of child rows that is added in one fetchMore() call
+    fetch_batch_size = 500
+
     def __init__(self, *args, **kwargs):
         self.loaded = False
         self.fetched_all = False
+        self._child_tasks = None
+        self._fetched_row_count = 0
         task = kwargs.pop("task", None)
         self.show_takes = kwargs.pop("show_takes", False)
         self.display_full_path = kwargs.pop("display_full_path", False)
@@ -234,7 +379,11 @@ class TaskItem(QtGui.QStandardItem):
         return return_value
 
     def fetchMore(self):
-        """Fetch child items."""
+        """Fetch child items.
+
+        The child tasks are added in batches of ``fetch_batch_size`` rows, the
+        view calls this again when it is scrolled to the end of the loaded rows.
+        """
         logger.debug("TaskItem.fetchMore() is started for item: {}".format(self.text()))
 
         if not self.canFetchMore():
@@ -244,7 +393,20 @@ class TaskItem(QtGui.QStandardItem):
             return
 
         if self.task.has_children:
-            tasks = partial_task_query(parent_task=self.task)
+            if self._child_tasks is None:
+                self._child_tasks = TaskDataCache.get_children([self.task])[
+                    self.task.id
+                ]
+            start = self._fetched_row_count
+            end = start + self.fetch_batch_size
+            tasks = self._child_tasks[start:end]
+
+            if self.show_takes:
+                # fetch the take names of all the leaf tasks in this batch at once
+                TaskDataCache.get_take_names(
+                    [task.id for task in tasks if not task.has_children]
+                )
+
             task_items = []
             for task in tasks:
                 task_item = TaskItem(0, 4, task=task, show_takes=self.show_takes)
@@ -270,28 +432,40 @@ class TaskItem(QtGui.QStandardItem):
                 )
 
                 resources_item = QtGui.QStandardItem()
-                if task_item.task.resources != [None]:
+                if task_item.task.resources:
                     resources_item.setData(
                         ", ".join(map(str, task_item.task.resources)),
                         QtCore.Qt.DisplayRole,
                     )
 
                 self.appendRow([task_item, entity_type_item, resources_item])
+
+            model = self.model()
+            if isinstance(model, TaskTreeModel):
+                model.register_items(task_items)
+
+            self._fetched_row_count += len(tasks)
+            self.fetched_all = self._fetched_row_count >= len(self._child_tasks)
         elif self.show_takes:
             # There are no child tasks.
             # Look for takes
-            for take in get_unique_take_names(self.task.id):
+            take_names = TaskDataCache.get_take_names([self.task.id])[self.task.id]
+            for take in take_names:
                 take_item = TakeItem(task=self.task, take=take)
                 entity_type_item = QtGui.QStandardItem()
                 entity_type_item.setData("Take", QtCore.Qt.DisplayRole)
                 self.appendRow([take_item, entity_type_item])
-
-        self.fetched_all = True
+            self.fetched_all = True
 
         logger.debug(
             "TaskItem.fetchMore() is finished for item: {}".format(self.text())
         )
 
+    def fetch_all(self):
+        """Fetch all the child items at once."""
+        while self.canFetchMore():
+            self.fetchMore()
+
     def hasChildren(self):
         """Check if this TaskItem has children.
 
@@ -322,8 +496,14 @@ class TaskItem(QtGui.QStandardItem):
     def reload(self):
         """Reload the data."""
         # delete all the children and fetch them again
+        model = self.model()
+        if isinstance(model, TaskTreeModel):
+            model.unregister_children(self)
         for _ in range(self.rowCount()):
             self.removeRow(0)
+        TaskDataCache.invalidate([self.task.id])
+        self._child_tasks = None
+        self._fetched_row_count = 0
         self.fetched_all = False
         self.fetchMore()
 
@@ -463,11 +643,16 @@ class TakeItem(QtGui.QStandardItem):
 
 
 class TaskTreeModel(QtGui.QStandardItemModel):
-    """Implement the model view for the task hierarchy."""
+    """Implement the model view for the task hierarchy.
+
+    The TaskItems are registered by their task id as they are added to the
+    model, so the item of an entity can be found without scanning the tree.
+    """
 
     def __init__(self, *args, **kwargs):
         logger.debug("TaskTreeModel.__init__() is started")
         self.root = None
+        self.items_by_id = {}
 
         self.horizontal_labels = kwargs.pop("horizontal_labels", None)
         if self.horizontal_labels is None:
@@ -606,6 +791,8 @@ class TaskTreeModel(QtGui.QStandardItemModel):
             tasks (list): A list of Stalker Tasks instances.
         """
         logger.debug("TaskTreeModel.populateTree() is started")
+        # start with fresh data, to see the changes done by the other users
+        TaskDataCache.invalidate()
         self.setColumnCount(4)
         self.setHorizontalHeaderLabels(self.horizontal_labels)
 
@@ -617,9 +804,90 @@ class TaskTreeModel(QtGui.QStandardItemModel):
             task_item.setColumnCount(4)
 
             self.appendRow(task_item)
+            self.register_items([task_item])
 
         logger.debug("TaskTreeModel.populateTree() is finished")
 
+    def register_items(self, items):
+        """Register the given TaskItems by their task id.
+
+        An entity that is already registered with another item keeps its first
+        item.
+
+        Args:
+            items (List[TaskItem]): The TaskItems that are added to this model.
+        """
+        for item in items:
+            if item.task is not None:
+                self.items_by_id.setdefault(item.task.id, item)
+
+    def unregister_children(self, item):
+        """Unregister all the descendant TaskItems of the given item.
+
+        Args:
+            item (TaskItem): The TaskItem whose children are going to be removed.
+        """
+        items = [item]
+        while items:
+            parent_item = items.pop()
+            for row in range(parent_item.rowCount()):
+                child_item = parent_item.child(row, 0)
+                if not isinstance(child_item, TaskItem):
+                    continue
+                if self.items_by_id.get(child_item.task.id) is child_item:
+                    del self.items_by_id[child_item.task.id]
+                items.append(child_item)
+
+    def get_item(self, entity_id):
+        """Return the registered TaskItem of the given entity.
+
+        Args:
+            entity_id (int): The id of the entity.
+
+        Returns:
+            TaskItem: The TaskItem or None if the entity is not loaded yet.
+        """
+        item = self.items_by_id.get(entity_id)
+        if item is None:
+            return None
+        try:
+            if item.model() is self:
+                return item
+        except RuntimeError:
+            # the underlying C++ object is already deleted
+            pass
+        del self.items_by_id[entity_id]
+        return None
+
+    def fetch_item(self, entity_id, parent_item):
+        """Return the TaskItem of the given entity, fetching the remaining
+        children of the parent item batch by batch until it is loaded.
+
+        Args:
+            entity_id (int): The id of the entity.
+            parent_item (TaskItem): The item of the parent of the entity.
+
+        Returns:
+            TaskItem: The TaskItem or None if it can not be found.
+        """
+        item = self.get_item(entity_id)
+        while item is None and parent_item is not None and parent_item.canFetchMore():
+            parent_item.fetchMore()
+            item = self.get_item(entity_id)
+        return item
+
+    def prefetch(self, tasks):
+        """Fetch the children of the given tasks with one query.
+
+        Use this before expanding many items at once, so the items don't query
+        their children one by one.
+
+        Args:
+            tasks (list): A list of stalker.Task, stalker.Project or partial task
+                instances.
+        """
+        TaskDataCache.get_children(tasks)
+
     def canFetchMore(self, index):
         """Check if the item can fetch more items.
 
@@ -2,6 +2,9 @@
 """Utilities for UI stuff
 """
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from anima import logger
 from anima.ui.lib import QtCore, QtGui, QtWidgets
@@ -159,77 +162,330 @@ def clear_thumbnail(graphics_view):
     scene.clear()
 
 
-def update_graphics_view_with_entity_thumbnail(entity, graphics_view):
+def update_graphics_view_with_entity_thumbnail(
+    entity, graphics_view, asynchronous=True
+):
     """Updates the given QGraphicsView with the given Entity thumbnail
 
     Args:
         entity: A :class:`~stalker.SimpleEntity` instance.
         graphics_view: A ``QtWidgets.QGraphicsView`` instance.
+        asynchronous (bool): Decode the image in a background thread. The
+            default is True.
     """
-    from stalker import SimpleEntity, Task
+    from stalker import SimpleEntity
+    from anima.utils import get_nearest_thumbnail_paths
 
-    if not isinstance(entity, SimpleEntity) or not isinstance(
-        graphics_view, QtWidgets.QGraphicsView
-    ):
-        # do nothing
+    if not isinstance(graphics_view, QtWidgets.QGraphicsView):
+        return
+
+    if not isinstance(entity, SimpleEntity):
         logger.debug("task is not a stalker.SimpleEntity instance")
+        # clear the view, so a pending request doesn't show the thumbnail of
+        # the previous entity
+        update_graphics_view_with_image_file("", graphics_view)
         return
 
-    # get the thumbnail full path
-    full_path = None
-    if entity.thumbnail:
-        # use the cache system to get the thumbnail
-        # try to get it as a normal file
-        full_path = os.path.expandvars(entity.thumbnail.full_path)
-        if not os.path.exists(full_path):
-            full_path = None
-    else:
-        logger.debug("there is no thumbnail")
-        # try to get the thumbnail from parents
-        if isinstance(entity, Task):
-            for parent in reversed(entity.parents):
-                if parent.thumbnail:
-                    # try to get it as a normal file
-                    full_path = os.path.expandvars(parent.thumbnail.full_path)
-                    if not os.path.exists(full_path):
-                        full_path = None
-                    logger.debug("found parent thumbnail at: %s" % full_path)
-                    break
+    # get the thumbnail full path, use the parent thumbnail if the entity
+    # doesn't have one
+    full_path = get_nearest_thumbnail_paths([entity]).get(entity.id)
+    logger.debug("found thumbnail at: %s" % full_path)
+
+    # also called without a thumbnail to clear the view and the requested path
+    update_graphics_view_with_image_file(
+        full_path or "", graphics_view, asynchronous=asynchronous
+    )
 
-    if full_path:
-        update_graphics_view_with_image_file(full_path, graphics_view)
 
+def update_graphics_view_with_image_file(
+    image_full_path, graphics_view, asynchronous=True
+):
+    """Updates the QGraphicsView with the given image.
 
-def update_graphics_view_with_image_file(image_full_path, graphics_view):
-    """updates the QGraphicsView with the given image"""
+    The scaled pixmaps are served from the :class:`.ThumbnailService` cache.
 
+    Args:
+        image_full_path (str): The image full path.
+        graphics_view: A ``QtWidgets.QGraphicsView`` instance.
+        asynchronous (bool): Decode the image in a background thread and
+            update the graphics view when it is ready. The default is True.
+    """
     if not isinstance(graphics_view, QtWidgets.QGraphicsView):
         return
 
     clear_thumbnail(graphics_view)
 
-    if image_full_path != "":
-        image_full_path = os.path.normpath(image_full_path)
-        image_format = os.path.splitext(image_full_path)[-1].replace(".", "").upper()
-        logger.debug("creating pixmap from: %s" % image_full_path)
-
-        # size = conf.thumbnail_size
-        # width = size[0]
-        # height = size[1]
-        size = graphics_view.size()
-        width = size.width()
-        height = size.height()
-        logger.debug("width: %s" % width)
-        logger.debug("height: %s" % height)
-
-        if os.path.exists(image_full_path):
-            pixmap = QtGui.QPixmap(image_full_path, format=image_format).scaled(
-                width, height, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
-            )
-            # pixmap = QtGui.QPixmap(image_full_path, format='JPG')
+    if not image_full_path:
+        graphics_view.setProperty("thumbnail_full_path", "")
+        return
+
+    image_full_path = os.path.normpath(image_full_path)
+    logger.debug("creating pixmap from: %s" % image_full_path)
+
+    size = graphics_view.size()
+    width = size.width()
+    height = size.height()
+    logger.debug("width: %s" % width)
+    logger.debug("height: %s" % height)
+
+    # store the requested image, so a late result of a previous request
+    # doesn't override it
+    graphics_view.setProperty("thumbnail_full_path", image_full_path)
+
+    def add_pixmap(pixmap):
+        try:
+            if graphics_view.property("thumbnail_full_path") != image_full_path:
+                return
+            clear_thumbnail(graphics_view)
+            if pixmap is not None:
+                graphics_view.scene().addPixmap(pixmap)
+        except RuntimeError:
+            # the graphics view is deleted in the meantime
+            pass
+
+    if asynchronous:
+        ThumbnailService.request_pixmap(image_full_path, width, height, add_pixmap)
+    else:
+        add_pixmap(ThumbnailService.get_pixmap(image_full_path, width, height))
+
+
+class ThumbnailServiceNotifier(QtCore.QObject):
+    """Delivers the images decoded in the background threads to the GUI
+    thread.
+    """
+
+    image_decoded = QtCore.Signal(object, object)
+
+
+class ThumbnailService(object):
+    """An in-memory LRU cache of the scaled thumbnail pixmaps.
+
+    The pixmaps are stored by the image path, modification time and file size
+    along with the requested dimensions, so a changed file is decoded again.
+    The images are decoded to ``QImage`` instances in background threads and
+    are converted to ``QPixmap`` in the GUI thread, as the pixmaps can only be
+    created there.
+    """
+
+    max_entries = 256
+    max_workers = 4
+
+    hits = 0
+    misses = 0
+
+    _lock = threading.RLock()
+    _pixmaps = OrderedDict()
+    _callbacks = {}
+    _executor = None
+    _notifier = None
+
+    @classmethod
+    def get_cache_key(cls, full_path, width, height):
+        """Return the cache key of the given image.
+
+        Args:
+            full_path (str): The image full path.
+            width (int): The requested width.
+            height (int): The requested height.
+
+        Returns:
+            tuple: The cache key or None if the file doesn't exist.
+        """
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        return full_path, stat.st_mtime, stat.st_size, width, height
+
+    @classmethod
+    def decode_image(cls, full_path, width, height):
+        """Decode and scale the given image, it is safe to call this in a
+        background thread.
+
+        Args:
+            full_path (str): The image full path.
+            width (int): The width to fit the image in.
+            height (int): The height to fit the image in.
+
+        Returns:
+            QtGui.QImage: The scaled image or None if it can not be read.
+        """
+        image = QtGui.QImage(full_path)
+        if image.isNull():
+            logger.debug("can not decode image: %s" % full_path)
+            return None
+        return image.scaled(
+            width, height, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
+        )
+
+    @classmethod
+    def get(cls, key):
+        """Return the cached pixmap for the given key.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            QtGui.QPixmap: The cached pixmap or None.
+        """
+        with cls._lock:
+            pixmap = cls._pixmaps.get(key)
+            if pixmap is None:
+                cls.misses += 1
+                return None
+            cls._pixmaps.move_to_end(key)
+            cls.hits += 1
+            return pixmap
+
+    @classmethod
+    def _add(cls, key, image):
+        """Store the given image as a pixmap, must be called in the GUI thread.
+
+        Args:
+            key (tuple): The cache key.
+            image (QtGui.QImage): The decoded image.
+
+        Returns:
+            QtGui.QPixmap: The pixmap or None if the image is None.
+        """
+        if image is None:
+            return None
+        pixmap = QtGui.QPixmap.fromImage(image)
+        with cls._lock:
+            cls._pixmaps[key] = pixmap
+            cls._pixmaps.move_to_end(key)
+            while len(cls._pixmaps) > cls.max_entries:
+                cls._pixmaps.popitem(last=False)
+        return pixmap
+
+    @classmethod
+    def get_pixmap(cls, full_path, width, height):
+        """Return the scaled pixmap of the given image, decoding it in the
+        current thread if it is not cached.
+
+        Args:
+            full_path (str): The image full path.
+            width (int): The width to fit the image in.
+            height (int): The height to fit the image in.
+
+        Returns:
+            QtGui.QPixmap: The pixmap or None if the image can not be read.
+        """
+        key = cls.get_cache_key(full_path, width, height)
+        if key is None:
+            return None
+        pixmap = cls.get(key)
+        if pixmap is None:
+            pixmap = cls._add(key, cls.decode_image(full_path, width, height))
+        return pixmap
+
+    @classmethod
+    def get_executor(cls):
+        """Return the executor that decodes the images.
+
+        Returns:
+            ThreadPoolExecutor: The executor.
+        """
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.max_workers)
+            return cls._executor
+
+    @classmethod
+    def get_notifier(cls):
+        """Return the notifier that delivers the decoded images to the GUI
+        thread, it is created in the first call which should be in the GUI
+        thread.
+
+        Returns:
+            ThumbnailServiceNotifier: The notifier.
+        """
+        with cls._lock:
+            if cls._notifier is None:
+                cls._notifier = ThumbnailServiceNotifier()
+                cls._notifier.image_decoded.connect(
+                    cls._image_decoded, QtCore.Qt.QueuedConnection
+                )
+            return cls._notifier
+
+    @classmethod
+    def request_pixmap(cls, full_path, width, height, callback):
+        """Request the scaled pixmap of the given image.
+
+        The callback is called immediately for the cached pixmaps, otherwise
+        the image is decoded in a background thread and the callback is
+        called in the GUI thread when it is ready. Requests for the same
+        image are decoded once.
+
+        Args:
+            full_path (str): The image full path.
+            width (int): The width to fit the image in.
+            height (int): The height to fit the image in.
+            callback (callable): The function to call with the QPixmap or
+                None if the image can not be read.
+        """
+        key = cls.get_cache_key(full_path, width, height)
+        if key is None:
+            callback(None)
+            return
+
+        pixmap = cls.get(key)
+        if pixmap is not None:
+            callback(pixmap)
+            return
+
+        notifier = cls.get_notifier()
+        with cls._lock:
+            if key in cls._callbacks:
+                cls._callbacks[key].append(callback)
+                return
+            cls._callbacks[key] = [callback]
+
+        def decode():
+            image = None
+            try:
+                image = cls.decode_image(full_path, width, height)
+            finally:
+                notifier.image_decoded.emit(key, image)
+
+        cls.get_executor().submit(decode)
+
+    @classmethod
+    def _image_decoded(cls, key, image):
+        """Store the decoded image and call the callbacks waiting for it.
+
+        Args:
+            key (tuple): The cache key.
+            image (QtGui.QImage): The decoded image or None.
+        """
+        pixmap = cls._add(key, image)
+        with cls._lock:
+            callbacks = cls._callbacks.pop(key, [])
+        for callback in callbacks:
+            callback(pixmap)
+
+    @classmethod
+    def get_stats(cls):
+        """Return the cache statistics.
+
+        Returns:
+            dict: The hits, misses and entry count of the cache.
+        """
+        with cls._lock:
+            return {
+                "hits": cls.hits,
+                "misses": cls.misses,
+                "entries": len(cls._pixmaps),
+            }
 
-            scene = graphics_view.scene()
-            scene.addPixmap(pixmap)
+    @classmethod
+    def reset(cls):
+        """Clear the cached pixmaps and the statistics."""
+        with cls._lock:
+            cls._pixmaps.clear()
+            cls._callbacks.clear()
+            cls.hits = 0
+            cls.misses = 0
 
 
 def choose_thumbnail(parent, start_path=None, dialog_title="Choose Thumbnail"):
@@ -290,12 +290,9 @@ class TaskTreeView(QtWidgets.QTreeView):
         if not isinstance(tasks, list):
             tasks = [tasks]
 
-        items = []
-        for task in tasks:
-            item = self.load_task_item_hierarchy(task, tree_view)
-            if item:
-                selection_model.select(item.index(), selection_flag)
-                items.append(item)
+        items = [item for item in self.reveal_entities(tasks, tree_view) if item]
+        for item in items:
+            selection_model.select(item.index(), selection_flag)
 
         # scroll to the first item
         if items:
@@ -311,38 +308,77 @@ class TaskTreeView(QtWidgets.QTreeView):
         if not task:
             return
 
+        return self.reveal_entities([task], tree_view)[0]
+
+    def reveal_entities(self, entities, tree_view=None):
+        """Load and expand the items of the ancestors of the given entities.
+
+        The ancestor chains of all the tasks are queried at once and the
+        hierarchy is loaded level by level, fetching the children of all the
+        items in a level with one query.
+
+        Args:
+            entities (list): A list of stalker.Task or stalker.Project instances.
+            tree_view (QTreeView): QTreeView derivative.
+
+        Returns:
+            List[TaskItem]: The TaskItems of the entities in the given order, the
+                value is None for the entities that can not be found.
+        """
+        from anima.utils import get_task_ancestor_ids
+
+        if tree_view is None:
+            tree_view = self
+
+        model = tree_view.model()
         self.is_updating = True
-        item = self.find_entity_item(task)
-        if not item:
-            # the item is not loaded to the UI yet
-            # start loading its parents
-            # start from the project
-            if isinstance(task, Task):
-                item = self.find_entity_item(task.project, tree_view)
-            else:
-                item = self.find_entity_item(task, tree_view)
-            logger.debug("item for project: %s" % item)
-
-            if item:
-                tree_view.setExpanded(item.index(), True)
-
-            if isinstance(task, Task) and task.parents:
-                # now starting from the most outer parent expand the tasks
-                for parent in task.parents:
-                    item = self.find_entity_item(parent, tree_view)
-
-                    if item:
-                        tree_view.setExpanded(item.index(), True)
-
-            # finally select the task
-            item = self.find_entity_item(task, tree_view)
-
-            if not item:
-                # still no item
+
+        # the ids of the items from the project to the entity itself
+        task_ids = [
+            entity.id
+            for entity in entities
+            if isinstance(entity, Task) and model.get_item(entity.id) is None
+        ]
+        ancestor_ids = get_task_ancestor_ids(task_ids) if task_ids else {}
+        paths = [
+            ancestor_ids.get(entity.id, []) + [entity.id] if entity else []
+            for entity in entities
+        ]
+
+        expanded_ids = set()
+        max_depth = max([len(path) for path in paths] + [0])
+        for depth in range(1, max_depth):
+            # fetch the children of all the parent items at once
+            parent_items = {}
+            for path in paths:
+                if len(path) > depth:
+                    parent_item = model.get_item(path[depth - 1])
+                    if parent_item is not None:
+                        parent_items[parent_item.task.id] = parent_item
+            model.prefetch(
+                [item.task for item in parent_items.values() if item.canFetchMore()]
+            )
+
+            for path in paths:
+                if len(path) <= depth:
+                    continue
+                parent_item = parent_items.get(path[depth - 1])
+                if parent_item is None:
+                    continue
+                if parent_item.task.id not in expanded_ids:
+                    tree_view.setExpanded(parent_item.index(), True)
+                    expanded_ids.add(parent_item.task.id)
+                model.fetch_item(path[depth], parent_item)
+
+        items = []
+        for path in paths:
+            item = model.get_item(path[-1]) if path else None
+            if item is None:
                 logger.debug("can not find item")
+            items.append(item)
 
         self.is_updating = False
-        return item
+        return items
 
     def find_entity_item(self, entity, tree_view=None):
         """Find the item related to the stalker entity in the given QTreeView.
@@ -360,15 +396,24 @@ class TaskTreeView(QtWidgets.QTreeView):
         if tree_view is None:
             tree_view = self
 
-        indexes = self.get_item_indices_containing_text(entity.name, tree_view)
-        model = tree_view.model()
-        logger.debug("items matching name : %s" % indexes)
-        for index in indexes:
-            item = model.itemFromIndex(index)
-            if item:
-                if item.task.id == entity.id:
-                    return item
-        return None
+        return tree_view.model().get_item(entity.id)
+
+    def fetch_entity_item(self, entity, parent_item, tree_view=None):
+        """Find the item related to the stalker entity, fetching the remaining
+        children of the parent item batch by batch until it is found.
+
+        Args:
+            entity (Entity): Entity instances.
+            parent_item (TaskItem): The item of the parent of the entity.
+            tree_view (QTreeView): QTreeView derivative.
+
+        Returns:
+            TaskItem: The TaskItem that is the related entity.
+        """
+        if tree_view is None:
+            tree_view = self
+
+        return tree_view.model().fetch_item(entity.id, parent_item)
 
     @classmethod
     def get_item_indices_containing_text(cls, text, tree_view):
@@ -418,7 +463,16 @@ class TaskTreeView(QtWidgets.QTreeView):
         Args:
             index (QModelIndex):
         """
-        for item in self.get_selected_items():
+        items = self.get_selected_items()
+        # fetch the children of all the items at once
+        self.model().prefetch(
+            [
+                item.task
+                for item in items
+                if item.canFetchMore() and item.task.has_children
+            ]
+        )
+        for item in items:
             self.setExpanded(item.index(), True)
         self.auto_fit_column()
 
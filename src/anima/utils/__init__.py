@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import calendar
-import copy
+import collections
 import datetime
 import fractions
 import hashlib
+import json
 import math
 import os
 import platform
@@ -14,19 +15,22 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 import uuid
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from anima import defaults, logger
 
 import exifread
 
 import pytz
 
-from sqlalchemy import and_, exists, or_
+from sqlalchemy import and_, exists, func, literal, or_
 from sqlalchemy.exc import UnboundExecutionError
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import aliased, joinedload, selectinload
 from sqlalchemy.pool import NullPool
-from sqlalchemy.sql.functions import array_agg
 
 from stalker import (
     Asset,
@@ -43,7 +47,7 @@ from stalker import (
 )
 from stalker.db.session import DBSession
 from stalker.models.auth import AuthenticationLog, LOGIN, LocalSession
-from stalker.models.task import Task_Resources
+from stalker.models.task import Task_Resources, TaskDependency
 
 
 def all_equal(elements):
@@ -178,7 +182,54 @@ def md5_checksum(path):
 
 
 class StalkerThumbnailCache(object):
-    """A simple file cache system."""
+    """A size bounded LRU file cache for the thumbnails served by Stalker Server.
+
+    The thumbnails are stored under the "thumbnails" folder of the local cache
+    folder, named by the hash of their full path on the server, so the thumbnails
+    with the same file name don't collide. The least recently used thumbnails are
+    removed when the total size exceeds :attr:`.max_size`, which defaults to
+    ``defaults.thumbnail_cache_max_size``. The last access time of a thumbnail is
+    stored as its modification time, so the order is kept between sessions.
+
+    All the downloads use one authenticated session, which is logged in again only
+    when the user changes or the session expires.
+    """
+
+    max_size = None
+    max_workers = 8
+    hits = 0
+    misses = 0
+
+    _lock = threading.RLock()
+    _entries = None
+    _total_size = 0
+    _opener = None
+    _opener_login = None
+
+    @classmethod
+    def get_cache_path(cls):
+        """Return the thumbnail cache folder path.
+
+        Returns:
+            str: The cache folder path.
+        """
+        return os.path.normpath(
+            os.path.expanduser(os.path.join(defaults.local_cache_folder, "thumbnails"))
+        )
+
+    @classmethod
+    def get_cached_file_path(cls, thumbnail_full_path):
+        """Return the cached file path of the given thumbnail.
+
+        Args:
+            thumbnail_full_path (str): The thumbnail full path.
+
+        Returns:
+            str: The cached file path.
+        """
+        extension = os.path.splitext(thumbnail_full_path)[-1]
+        file_hash = hashlib.sha1(thumbnail_full_path.encode("utf-8")).hexdigest()
+        return os.path.join(cls.get_cache_path(), "%s%s" % (file_hash, extension))
 
     @classmethod
     def get(cls, thumbnail_full_path, login=None, password=None):
@@ -190,55 +241,241 @@ class StalkerThumbnailCache(object):
             password (str): The user password.
 
         Returns:
-            str: The thumbnail path.
+            str: The thumbnail path. The file doesn't exist if it is not cached and
+                no login and password is given to download it.
         """
-        # look up in the cache first
-        filename = os.path.basename(thumbnail_full_path)
-        logger.debug("filename : %s" % filename)
+        cached_file_full_path = cls.get_cached_file_path(thumbnail_full_path)
+        logger.debug("cached_file_full_path : %s" % cached_file_full_path)
 
-        cache_path = os.path.expanduser(defaults.local_cache_folder)
-        cached_file_full_path = os.path.join(cache_path, filename)
+        with cls._lock:
+            cls._load_entries()
+            is_cached = cls._touch(cached_file_full_path)
+            if is_cached:
+                cls.hits += 1
+            else:
+                cls.misses += 1
 
-        url = "%s/%s" % (defaults.stalker_server_internal_address, thumbnail_full_path)
-        login_url = "%s/login" % defaults.stalker_server_internal_address
+        if not is_cached and login and password:
+            cls._download(thumbnail_full_path, cached_file_full_path, login, password)
 
-        logger.debug("cache_path            : %s" % cache_path)
-        logger.debug("cached_file_full_path : %s" % cached_file_full_path)
-        logger.debug("url                   : %s" % url)
+        return cached_file_full_path
 
-        if not os.path.exists(cached_file_full_path) and login and password:
-            # download the file and put it on to the cache
-            if sys.version_info[0] >= 3:
-                # Python 3
-                from http.cookiejar import CookieJar
-                from urllib.request import build_opener
-                from urllib.parse import urlencode
-                from urllib.request import HTTPCookieProcessor
-            else:
-                # Python 2
-                from cookielib import CookieJar
-                from urllib import urlencode
-                from urllib2 import build_opener, HTTPCookieProcessor
-
-            cj = CookieJar()
-            opener = build_opener(HTTPCookieProcessor(cj))
-            login_data = urlencode(
-                {"login": login, "password": password, "submit": True}
+    @classmethod
+    def get_many(cls, thumbnail_full_paths, login=None, password=None):
+        """Return the files of the given thumbnails, the missing ones are
+        downloaded concurrently.
+
+        Args:
+            thumbnail_full_paths (List[str]): The thumbnail full paths.
+            login (str): The user name.
+            password (str): The user password.
+
+        Returns:
+            List[str]: The thumbnail paths in the same order with the given paths.
+        """
+        unique_thumbnail_full_paths = list(
+            collections.OrderedDict.fromkeys(thumbnail_full_paths)
+        )
+        if not unique_thumbnail_full_paths:
+            return []
+
+        with ThreadPoolExecutor(max_workers=cls.max_workers) as executor:
+            cached_file_full_paths = dict(
+                zip(
+                    unique_thumbnail_full_paths,
+                    executor.map(
+                        lambda path: cls.get(path, login=login, password=password),
+                        unique_thumbnail_full_paths,
+                    ),
+                )
             )
-            opener.open(login_url, login_data)
+        return [cached_file_full_paths[path] for path in thumbnail_full_paths]
+
+    @classmethod
+    def get_stats(cls):
+        """Return the cache statistics.
 
-            resp = opener.open(url)
-            data = resp.read()
+        Returns:
+            dict: The "hits", "misses", "count" and "size" of the cache.
+        """
+        with cls._lock:
+            cls._load_entries()
+            return {
+                "hits": cls.hits,
+                "misses": cls.misses,
+                "count": len(cls._entries),
+                "size": cls._total_size,
+            }
 
-            # put it in to a file
-            # TODO: from header decide ascii or binary mode
-            if not os.path.exists(cache_path):
-                os.makedirs(cache_path)
+    @classmethod
+    def reset(cls):
+        """Reset the counters and the session, and reload the entries from disk."""
+        with cls._lock:
+            cls.hits = 0
+            cls.misses = 0
+            cls._entries = None
+            cls._total_size = 0
+            cls._opener = None
+            cls._opener_login = None
 
-            with open(cached_file_full_path, "wb") as f:
-                f.write(data)
+    @classmethod
+    def _load_entries(cls):
+        """Load the cached files from disk, ordered by their last access time."""
+        if cls._entries is not None:
+            return
+
+        cls._entries = collections.OrderedDict()
+        cls._total_size = 0
+        cache_path = cls.get_cache_path()
+        try:
+            file_names = os.listdir(cache_path)
+        except OSError:
+            return
 
-        return cached_file_full_path
+        entries = []
+        for file_name in file_names:
+            if file_name.endswith("~"):
+                # an incomplete download
+                continue
+            try:
+                stat = os.stat(os.path.join(cache_path, file_name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, file_name, stat.st_size))
+
+        for _, file_name, size in sorted(entries):
+            cls._entries[os.path.join(cache_path, file_name)] = size
+            cls._total_size += size
+
+    @classmethod
+    def _touch(cls, cached_file_full_path):
+        """Mark the given cached file as the most recently used one.
+
+        Args:
+            cached_file_full_path (str): The cached file path.
+
+        Returns:
+            bool: True if the file is in the cache, False otherwise.
+        """
+        if cached_file_full_path not in cls._entries:
+            return False
+
+        if not os.path.exists(cached_file_full_path):
+            # removed by someone else
+            cls._total_size -= cls._entries.pop(cached_file_full_path)
+            return False
+
+        cls._entries.move_to_end(cached_file_full_path)
+        try:
+            os.utime(cached_file_full_path, None)
+        except OSError:
+            pass
+        return True
+
+    @classmethod
+    def _add(cls, cached_file_full_path, size):
+        """Add the given file to the cache and evict the least recently used files.
+
+        Args:
+            cached_file_full_path (str): The cached file path.
+            size (int): The file size in bytes.
+        """
+        with cls._lock:
+            cls._load_entries()
+            cls._total_size -= cls._entries.pop(cached_file_full_path, 0)
+            cls._entries[cached_file_full_path] = size
+            cls._total_size += size
+
+            max_size = cls.max_size
+            if max_size is None:
+                max_size = defaults.thumbnail_cache_max_size
+
+            # always keep the last one
+            while cls._total_size > max_size and len(cls._entries) > 1:
+                evicted_file_full_path, evicted_size = cls._entries.popitem(last=False)
+                cls._total_size -= evicted_size
+                logger.debug("evicting: %s" % evicted_file_full_path)
+                try:
+                    os.remove(evicted_file_full_path)
+                except OSError:
+                    pass
+
+    @classmethod
+    def _get_opener(cls, login, password, relogin=False):
+        """Return the authenticated opener of the given user.
+
+        Args:
+            login (str): The user name.
+            password (str): The user password.
+            relogin (bool): Log in again even if there is already an opener.
+
+        Returns:
+            OpenerDirector: The authenticated opener.
+        """
+        with cls._lock:
+            if cls._opener is None or cls._opener_login != login or relogin:
+                if sys.version_info[0] >= 3:
+                    # Python 3
+                    from http.cookiejar import CookieJar
+                    from urllib.request import build_opener
+                    from urllib.parse import urlencode
+                    from urllib.request import HTTPCookieProcessor
+                else:
+                    # Python 2
+                    from cookielib import CookieJar
+                    from urllib import urlencode
+                    from urllib2 import build_opener, HTTPCookieProcessor
+
+                login_url = "%s/login" % defaults.stalker_server_internal_address
+                opener = build_opener(HTTPCookieProcessor(CookieJar()))
+                login_data = urlencode(
+                    {"login": login, "password": password, "submit": True}
+                ).encode("utf-8")
+                opener.open(login_url, login_data).read()
+                cls._opener = opener
+                cls._opener_login = login
+            return cls._opener
+
+    @classmethod
+    def _download(cls, thumbnail_full_path, cached_file_full_path, login, password):
+        """Download the given thumbnail to the cache.
+
+        Args:
+            thumbnail_full_path (str): The thumbnail full path.
+            cached_file_full_path (str): The cached file path.
+            login (str): The user name.
+            password (str): The user password.
+        """
+        if sys.version_info[0] >= 3:
+            from urllib.error import HTTPError
+        else:
+            from urllib2 import HTTPError
+
+        url = "%s/%s" % (defaults.stalker_server_internal_address, thumbnail_full_path)
+        logger.debug("url                   : %s" % url)
+
+        try:
+            data = cls._get_opener(login, password).open(url).read()
+        except HTTPError as e:
+            if e.code not in (401, 403):
+                raise
+            # the session is expired, log in again
+            data = cls._get_opener(login, password, relogin=True).open(url).read()
+
+        # put it in to a file
+        # TODO: from header decide ascii or binary mode
+        cache_path = os.path.dirname(cached_file_full_path)
+        try:
+            os.makedirs(cache_path)
+        except OSError:
+            pass
+
+        # write to a temp file first, so a partial file is never served
+        temp_file_full_path = "%s.%s~" % (cached_file_full_path, uuid.uuid4().hex)
+        with open(temp_file_full_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_file_full_path, cached_file_full_path)
+        cls._add(cached_file_full_path, len(data))
 
 
 def do_db_setup():
@@ -315,8 +552,20 @@ class MediaManager(object):
     image sequence. The thumbnail of an image sequence will be a gif image.
 
     It will generate a zip file to serve all the images in an image sequence.
+
+    The web versions and thumbnails of the uploaded files can be generated in the
+    background with the ``*_async`` upload methods. These jobs run on a process pool
+    shared by all the instances, which is limited to ``media_job_max_workers``
+    processes.
     """
 
+    media_job_max_workers = max(1, (os.cpu_count() or 1) // 2)
+    media_job_executor_class = ProcessPoolExecutor
+    _media_job_executor = None
+    _media_jobs = {}
+    _media_info_cache_lock = threading.Lock()
+    _media_jobs_lock = threading.Lock()
+
     def __init__(self):
         self.reference_path = "References/Stalker_Pyramid/"
         self.version_output_path = "Outputs/Stalker_Pyramid/"
@@ -391,6 +640,13 @@ class MediaManager(object):
         self.ffmpeg_command_path = defaults.ffmpeg_command_path
         self.ffprobe_command_path = defaults.ffprobe_command_path
 
+        # media info cache
+        self.media_info_cache_path = os.path.normpath(
+            os.path.expanduser(os.path.join(defaults.local_cache_folder, "media_info"))
+        )
+        self.media_info_cache_max_count = defaults.media_info_cache_max_count
+        self.probe_max_workers = min(8, (os.cpu_count() or 1) + 4)
+
     @classmethod
     def reorient_image(cls, img):
         """Re-orient rotated images by looking at EXIF data.
@@ -507,18 +763,109 @@ class MediaManager(object):
         img.save(thumbnail_path)
         return thumbnail_path
 
+    @property
+    def thumbnail_filter_complex(self):
+        """Return the ffmpeg filter graph that composites three frames in to one
+        thumbnail.
+
+        Returns:
+            str: The filter graph.
+        """
+        return (
+            "[0:v:0]scale=3*%(tw)s/4:-1,pad=%(tw)s:%(th)s[s];"
+            "[1:v:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[m];"
+            "[2:v:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[e];"
+            "[s][e]overlay=%(tw)s/4:%(th)s-h[x];"
+            "[x][m]overlay=%(tw)s/8:%(th)s/2-h/2"
+            % {"tw": self.thumbnail_width, "th": self.thumbnail_height}
+        )
+
+    def get_video_duration(self, file_full_path):
+        """Return the duration of the given video in seconds.
+
+        Args:
+            file_full_path (str): A string showing the full path of the video file.
+
+        Returns:
+            float: The duration in seconds or None if it can not be determined.
+        """
+        media_info = self.get_video_info(file_full_path)
+        video_stream = None
+        for stream in media_info["stream_info"]:
+            if stream.get("codec_type") == "video":
+                video_stream = stream
+                break
+
+        candidates = [media_info["video_info"].get("duration")]
+        if video_stream:
+            candidates.insert(0, video_stream.get("duration"))
+        for duration in candidates:
+            try:
+                return float(duration)
+            except (TypeError, ValueError):
+                continue
+
+        if video_stream:
+            try:
+                frame_rate = float(
+                    fractions.Fraction(video_stream.get("r_frame_rate", ""))
+                )
+                return float(video_stream["nb_frames"]) / frame_rate
+            except (KeyError, ValueError, ZeroDivisionError):
+                pass
+
+        return None
+
     def generate_video_thumbnail(self, file_full_path):
         """Generate a thumbnail for the given video link.
 
+        The frames at the 10%, 50% and 90% of the video are extracted and
+        composited in a single ffmpeg call. Each input is seeked by timestamp, so
+        the video is decoded only around these frames. Falls back to
+        :meth:`.generate_video_thumbnail_with_frame_select` if the duration of the
+        video can not be determined or the single pass fails.
+
+        Args:
+            file_full_path (str): A string showing the full path of the video file.
+
+        Returns:
+            str: The thumbnail file path.
+        """
+        duration = self.get_video_duration(file_full_path)
+        if not duration:
+            return self.generate_video_thumbnail_with_frame_select(file_full_path)
+
+        thumbnail_path = tempfile.mktemp(suffix=self.thumbnail_format)
+        self.ffmpeg(
+            **{
+                "ss": ["%0.3f" % (duration * ratio) for ratio in [0.1, 0.5, 0.9]],
+                "i": [file_full_path] * 3,
+                "filter_complex": self.thumbnail_filter_complex,
+                "frames:v": 1,
+                "o": thumbnail_path,
+            }
+        )
+        if not os.path.exists(thumbnail_path):
+            logger.debug(
+                "single pass thumbnail extraction failed, using frame select: %s"
+                % file_full_path
+            )
+            return self.generate_video_thumbnail_with_frame_select(file_full_path)
+
+        return thumbnail_path
+
+    def generate_video_thumbnail_with_frame_select(self, file_full_path):
+        """Generate a thumbnail for the given video link by selecting the frames.
+
+        This decodes the video from the start for each extracted frame, so it is
+        slow for long videos, but works when the duration is not known.
+
         Args:
             file_full_path (str): A string showing the full path of the video file.
 
         Returns:
             str: The thumbnail file path.
         """
-        # TODO: split this in to two different methods, one generating
-        #       thumbnails from the video and another one accepting three
-        #       images
         media_info = self.get_video_info(file_full_path)
         video_info = media_info["video_info"]
 
@@ -546,7 +893,7 @@ class MediaManager(object):
 
             # get duration
             duration = video_stream.get("duration")
-            if duration == "N/A":  # no duration
+            if duration is None or duration == "N/A":  # no duration
                 duration = float(video_info.get("duration", 1))
             else:
                 duration = float(duration)
@@ -625,12 +972,7 @@ class MediaManager(object):
         self.ffmpeg(
             **{
                 "i": [start_thumb_path, mid_thumb_path, end_thumb_path],
-                "filter_complex": "[0:0]scale=3*%(tw)s/4:-1,pad=%(tw)s:%(th)s[s];"
-                "[1:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[m];"
-                "[2:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[e];"
-                "[s][e]overlay=%(tw)s/4:%(th)s-h[x];"
-                "[x][m]overlay=%(tw)s/8:%(th)s/2-h/2"
-                % {"tw": self.thumbnail_width, "th": self.thumbnail_height},
+                "filter_complex": self.thumbnail_filter_complex,
                 "o": thumbnail_path,
             }
         )
@@ -744,67 +1086,189 @@ class MediaManager(object):
     def get_video_info(self, full_path):
         """Return the video info like the duration in seconds and fps.
 
-        Uses ffmpeg to extract information about the video file.
+        Uses ffprobe to extract information about the video file. The values are
+        strings and the tags and dispositions are flattened as in the default
+        output of ffprobe, i.e. ``TAG:framerate``.
 
         Args:
             full_path (str): The full path of the video file
 
         Returns:
-            list: A list containing the video info.
+            dict: A dictionary with the "video_info" key holding the format info and
+                the "stream_info" key holding a list of stream info.
+        """
+        probe_data = self.probe(full_path)
+        return {
+            "video_info": self.flatten_probe_section(probe_data.get("format", {})),
+            "stream_info": [
+                self.flatten_probe_section(stream)
+                for stream in probe_data.get("streams", [])
+            ],
+        }
+
+    @classmethod
+    def flatten_probe_section(cls, section):
+        """Flatten the given ffprobe JSON output section.
+
+        Args:
+            section (dict): A stream or format section of the ffprobe JSON output.
+
+        Returns:
+            dict: The flattened section with string values.
+        """
+        flat_section = {}
+        for key, value in section.items():
+            if isinstance(value, dict):
+                prefix = "TAG" if key == "tags" else key.upper()
+                for sub_key, sub_value in value.items():
+                    flat_section["%s:%s" % (prefix, sub_key)] = str(sub_value)
+            elif not isinstance(value, list):
+                flat_section[key] = str(value)
+        return flat_section
+
+    def probe(self, full_path):
+        """Return the ffprobe JSON output of the given media file.
+
+        Runs ffprobe once to get both the streams and the format info. The result
+        is cached on disk per file path along with the size and modification time
+        of the file, so the same file is probed only once until it is changed, and
+        the cache entry of a changed file is overwritten. The least recently used
+        entries are removed when there are more than
+        :attr:`.media_info_cache_max_count` entries.
+
+        Args:
+            full_path (str): The full path of the media file.
+
+        Returns:
+            dict: The parsed ffprobe JSON output with the "streams" and "format" keys.
         """
+        cache_file_path = self.get_media_info_cache_file_path(full_path)
+        cache_key = None
+        if cache_file_path:
+            try:
+                stat = os.stat(full_path)
+                cache_key = "%s|%s" % (stat.st_size, stat.st_mtime)
+                with open(cache_file_path) as f:
+                    cache_data = json.load(f)
+                if cache_data.get("key") == cache_key:
+                    # mark as recently used
+                    os.utime(cache_file_path, None)
+                    return cache_data["data"]
+            except (IOError, OSError, ValueError, AttributeError, KeyError):
+                pass
+
         output_buffer = self.ffprobe(
             **{
-                "show_streams": full_path,
+                "v": "error",
+                "print_format": "json",
+                "show_streams": None,
+                "show_format": None,
+                "i": full_path,
             }
         )
+        try:
+            probe_data = json.loads("".join(output_buffer))
+        except ValueError:
+            probe_data = {}
 
-        media_info = {"video_info": None, "stream_info": []}
-        video_info = {}
-        stream_info = {}
-
-        # get STREAM info
-        line = output_buffer.pop(0).strip()
-        while line is not None:
-            if line == "[STREAM]":
-                # pop until you find [/STREAM]
-                while line != "[/STREAM]":
-                    if "=" in line:
-                        flag, value = line.split("=")
-                        stream_info[flag] = value
-                    line = output_buffer.pop(0).strip()
-
-                copy_stream = copy.deepcopy(stream_info)
-                media_info["stream_info"].append(copy_stream)
-                stream_info = {}
+        if cache_key and probe_data:
+            try:
+                os.makedirs(self.media_info_cache_path)
+            except OSError:
+                pass
+            # write to a temp file and move it, so concurrent probes of the same
+            # file never see a partially written cache file
+            temp_file_path = "%s.%s" % (cache_file_path, uuid.uuid4().hex)
             try:
-                line = output_buffer.pop(0).strip()
-            except IndexError:
-                line = None
+                with open(temp_file_path, "w") as f:
+                    json.dump({"key": cache_key, "data": probe_data}, f)
+                os.replace(temp_file_path, cache_file_path)
+            except (IOError, OSError):
+                logger.debug("could not write media info cache: %s" % cache_file_path)
+            else:
+                self.prune_media_info_cache()
 
-        # also get FORMAT info
-        output_buffer = self.ffprobe(
-            **{
-                "show_format": full_path,
-            }
+        return probe_data
+
+    def probe_many(self, full_paths, max_workers=None):
+        """Probe the given media files concurrently.
+
+        Args:
+            full_paths (List[str]): The full paths of the media files.
+            max_workers (int): The number of threads, the default is
+                :attr:`.probe_max_workers`.
+
+        Returns:
+            List[dict]: The ffprobe JSON outputs in the same order with the given
+                paths.
+        """
+        if max_workers is None:
+            max_workers = self.probe_max_workers
+
+        unique_full_paths = list(collections.OrderedDict.fromkeys(full_paths))
+        if not unique_full_paths:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            probe_data = dict(
+                zip(unique_full_paths, executor.map(self.probe, unique_full_paths))
+            )
+        return [probe_data[full_path] for full_path in full_paths]
+
+    def get_media_info_cache_file_path(self, full_path):
+        """Return the media info cache file path of the given media file.
+
+        Args:
+            full_path (str): The full path of the media file.
+
+        Returns:
+            str: The cache file path or None if the file doesn't exist.
+        """
+        full_path = os.path.normpath(os.path.abspath(full_path))
+        if not os.path.exists(full_path):
+            return None
+
+        return os.path.join(
+            self.media_info_cache_path,
+            "%s.json" % hashlib.md5(full_path.encode("utf-8")).hexdigest(),
         )
 
-        line = output_buffer.pop(0).strip()
-        while line is not None:
-            if line == "[FORMAT]":
-                # pop until you find [/FORMAT]
-                while line != "[/FORMAT]":
-                    if "=" in line:
-                        flag, value = line.split("=")
-                        video_info[flag] = value
-                    line = output_buffer.pop(0).strip()
-
-                media_info["video_info"] = video_info
+    def prune_media_info_cache(self):
+        """Remove the least recently used media info cache files, so there are at
+        most :attr:`.media_info_cache_max_count` files left.
+
+        The last access time of a cache file is stored as its modification time.
+        """
+        with self._media_info_cache_lock:
             try:
-                line = output_buffer.pop(0).strip()
-            except IndexError:
-                line = None
+                file_names = [
+                    file_name
+                    for file_name in os.listdir(self.media_info_cache_path)
+                    if file_name.endswith(".json")
+                ]
+            except OSError:
+                return
+
+            if len(file_names) <= self.media_info_cache_max_count:
+                return
+
+            entries = []
+            for file_name in file_names:
+                cache_file_path = os.path.join(self.media_info_cache_path, file_name)
+                try:
+                    entries.append((os.stat(cache_file_path).st_mtime, cache_file_path))
+                except OSError:
+                    continue
 
-        return media_info
+            entries.sort()
+            for _, cache_file_path in entries[
+                : max(0, len(entries) - self.media_info_cache_max_count)
+            ]:
+                logger.debug("evicting: %s" % cache_file_path)
+                try:
+                    os.remove(cache_file_path)
+                except OSError:
+                    pass
 
     def ffmpeg(self, **kwargs):
         """``ffmpeg`` command wrapper.
@@ -972,7 +1436,8 @@ class MediaManager(object):
         """`ffprobe`` command wrapper.
 
         Args:
-            kwargs: Keyword arguments to pass to the ffprobe command.
+            kwargs: Keyword arguments to pass to the ffprobe command. Use None as the
+                value of the flags that don't take a value.
 
         Returns:
             str: The command output buffer.
@@ -982,7 +1447,10 @@ class MediaManager(object):
         for key in kwargs:
             flag = "-" + key
             value = kwargs[key]
-            if not isinstance(value, list):
+            if value is None:
+                # a flag without a value
+                args.append(flag)
+            elif not isinstance(value, list):
                 # append the flag
                 args.append(flag)
                 # append the value
@@ -1261,7 +1729,7 @@ class MediaManager(object):
         Returns:
             str: The formatted filename.
         """
-        if isinstance(filename, str):
+        if isinstance(filename, bytes):
             filename = filename.decode("utf-8")
 
         # replace Turkish characters
@@ -1359,114 +1827,320 @@ class MediaManager(object):
 
         return file_full_path
 
-    def upload_reference(self, task, file_object, filename):
-        """Upload a reference for the given task.
-
-        Upload to the Task.path/References/Stalker_Pyramid/ folder and create a Link
-        object to there. Again the Link object will have a Repository root relative
-        path.
+    def generate_media_files(self, file_full_path, skip_unsupported=False):
+        """Generate the web version and the thumbnail of the given file.
 
-        It will also create a thumbnail under
-        {{Task.absolute_path}}/References/Stalker_Pyramid/Thumbs folder and a
-        web friendly version (PNG for images, WebM for video files) under
-        {{Task.absolute_path}}/References/Stalker_Pyramid/ForWeb folder.
+        The web version is placed in to the "ForWeb" folder and the thumbnail in to
+        the "Thumbnail" folder next to the given file.
 
         Args:
-            task (stalker.Task): The task that a reference is uploaded to. Should be an
-                instance of :class:`.Task` class.
-            file_object (file): The file like object holding the content of the uploaded
-                file.
-            filename (str): The original filename.
+            file_full_path (str): The full path of an image or video file.
+            skip_unsupported (bool): If True the files that are not an image or video
+                are skipped instead of raising a RuntimeError.
+
+        Raises:
+            RuntimeError: If the given file is not an image or video file and
+                ``skip_unsupported`` is False.
 
         Returns:
-            stalker.Link: A :class:`stalker.Link` instance.
+            (str, str): The full paths of the web version and the thumbnail. The
+                skipped ones are None.
         """
-        ############################################################
-        # ORIGINAL
-        ############################################################
-        file_path = os.path.join(os.path.join(task.absolute_path), self.reference_path)
+        file_path = os.path.dirname(file_full_path)
+        base_name = os.path.splitext(os.path.basename(file_full_path))[0]
+
+        output_full_paths = []
+        for folder_name, generate in [
+            ("ForWeb", self.generate_media_for_web),
+            ("Thumbnail", self.generate_thumbnail),
+        ]:
+            try:
+                temp_full_path = generate(file_full_path)
+            except RuntimeError:
+                if not skip_unsupported:
+                    raise
+                # not an image or video so skip it
+                output_full_paths.append(None)
+                continue
+
+            extension = os.path.splitext(temp_full_path)[-1]
+            output_full_path = os.path.join(
+                file_path, folder_name, "%s%s" % (base_name, extension)
+            )
 
-        # upload it
-        reference_file_full_path = self.upload_file(file_object, file_path, filename)
+            # move it to repository
+            try:
+                os.makedirs(os.path.dirname(output_full_path))
+            except OSError:  # path exists
+                pass
+            shutil.move(temp_full_path, output_full_path)
+            output_full_paths.append(output_full_path)
 
-        reference_file_file_name = os.path.basename(reference_file_full_path)
-        reference_file_base_name = os.path.splitext(reference_file_file_name)[0]
+        return tuple(output_full_paths)
 
-        # create a Link instance and return it.
-        # use a Repository relative path
-        repo = task.project.repository
-        relative_full_path = repo.make_relative(reference_file_full_path)
+    @classmethod
+    def attach_media_links(
+        cls, link, create_link, web_version_full_path, thumbnail_full_path
+    ):
+        """Create and attach the web version and thumbnail Links to the given Link.
 
-        link = Link(full_path=relative_full_path, original_filename=filename)
+        The first thumbnail of the Link is the web viewable version and the
+        thumbnail of the web version is the thumbnail.
 
-        # create a thumbnail for the given reference
-        # don't forget that the first thumbnail is the Web viewable version
-        # and the second thumbnail is the thumbnail
+        Args:
+            link (stalker.Link): The Link of the original file.
+            create_link: A callable that creates a :class:`stalker.Link` for the
+                given full path.
+            web_version_full_path (str): The web version full path or None.
+            thumbnail_full_path (str): The thumbnail full path or None.
+        """
+        if not web_version_full_path:
+            return
 
-        ############################################################
-        # WEB VERSION
-        ############################################################
-        web_version_temp_full_path = self.generate_media_for_web(
-            reference_file_full_path
-        )
-        web_version_extension = os.path.splitext(web_version_temp_full_path)[-1]
+        web_version_link = create_link(web_version_full_path)
+        link.thumbnail = web_version_link
+        if thumbnail_full_path:
+            web_version_link.thumbnail = create_link(thumbnail_full_path)
 
-        web_version_file_name = "%s%s" % (
-            reference_file_base_name,
-            web_version_extension,
-        )
-        web_version_full_path = os.path.join(
-            os.path.dirname(reference_file_full_path), "ForWeb", web_version_file_name
-        )
-        web_version_repo_relative_full_path = repo.make_relative(web_version_full_path)
-        web_version_link = Link(
-            full_path=web_version_repo_relative_full_path,
-            original_filename=web_version_file_name,
-        )
+    @classmethod
+    def get_media_job_executor(cls):
+        """Return the executor that runs the media jobs.
 
-        # move it to repository
-        try:
-            os.makedirs(os.path.dirname(web_version_full_path))
-        except OSError:  # path exists
-            pass
-        shutil.move(web_version_temp_full_path, web_version_full_path)
-
-        ############################################################
-        # THUMBNAIL
-        ############################################################
-        # finally generate a Thumbnail
-        thumbnail_temp_full_path = self.generate_thumbnail(reference_file_full_path)
-        thumbnail_extension = os.path.splitext(thumbnail_temp_full_path)[-1]
-        thumbnail_file_name = "%s%s" % (reference_file_base_name, thumbnail_extension)
-
-        thumbnail_full_path = os.path.join(
-            os.path.dirname(reference_file_full_path), "Thumbnail", thumbnail_file_name
-        )
-        thumbnail_repo_relative_full_path = repo.make_relative(thumbnail_full_path)
-        thumbnail_link = Link(
-            full_path=thumbnail_repo_relative_full_path,
-            original_filename=thumbnail_file_name,
-        )
+        Returns:
+            concurrent.futures.Executor: The shared executor of all the
+                MediaManager instances.
+        """
+        with cls._media_jobs_lock:
+            if cls._media_job_executor is None:
+                cls._media_job_executor = cls.media_job_executor_class(
+                    max_workers=cls.media_job_max_workers
+                )
+            return cls._media_job_executor
 
-        # move it to repository
-        try:
-            os.makedirs(os.path.dirname(thumbnail_full_path))
-        except OSError:  # path exists
-            pass
-        shutil.move(thumbnail_temp_full_path, thumbnail_full_path)
+    def submit_media_job(
+        self, link, file_full_path, create_link, skip_unsupported=False, callback=None
+    ):
+        """Generate the web version and the thumbnail of the given file in the
+        background.
 
-        ############################################################
-        # LINK Objects
-        ############################################################
-        # link them
-        # assign it as a reference to the given task
-        task.references.append(link)
-        link.thumbnail = web_version_link
-        web_version_link.thumbnail = thumbnail_link
+        Args:
+            link (stalker.Link): The Link of the original file.
+            file_full_path (str): The full path of the original file.
+            create_link: A callable that creates a :class:`stalker.Link` for the
+                given full path.
+            skip_unsupported (bool): If True the files that are not an image or video
+                are skipped instead of failing the job.
+            callback: A callable that is called with the :class:`.MediaJob` when the
+                job is finished.
 
-        return link
+        Returns:
+            MediaJob: The :class:`.MediaJob` instance.
+        """
+        job = MediaJob(link, file_full_path, create_link, callback=callback)
+        with self._media_jobs_lock:
+            self._media_jobs[job.id] = job
+        job.future = self.get_media_job_executor().submit(
+            self.generate_media_files, file_full_path, skip_unsupported
+        )
+        job.future.add_done_callback(job.finish)
+        return job
 
-    def upload_version(self, task, file_object, take_name=None, extension=""):
+    @classmethod
+    def get_media_job(cls, job_id):
+        """Return the media job with the given id.
+
+        Args:
+            job_id (str): The :attr:`.MediaJob.id`.
+
+        Returns:
+            MediaJob: The :class:`.MediaJob` or None if there is no such job.
+        """
+        with cls._media_jobs_lock:
+            return cls._media_jobs.get(job_id)
+
+    @classmethod
+    def get_media_job_status(cls, job_id):
+        """Return the status of the media job with the given id.
+
+        Args:
+            job_id (str): The :attr:`.MediaJob.id`.
+
+        Returns:
+            str: One of the :class:`.MediaJob` statuses or None if there is no such
+                job.
+        """
+        job = cls.get_media_job(job_id)
+        if job:
+            return job.status
+
+    @classmethod
+    def wait_media_jobs(cls, jobs=None, timeout=None):
+        """Wait for the given media jobs to finish and attach the Links of the
+        finished ones.
+
+        The finished jobs are unregistered, so they are not kept in memory by the
+        MediaManager after their Links are attached.
+
+        Args:
+            jobs (List[MediaJob]): The jobs to wait, the default is all the
+                registered jobs.
+            timeout (float): The maximum time to wait in seconds, the default is None
+                which waits until all the jobs are finished.
+
+        Returns:
+            bool: True if all the jobs are finished, False otherwise.
+        """
+        if jobs is None:
+            with cls._media_jobs_lock:
+                jobs = list(cls._media_jobs.values())
+
+        end_time = None if timeout is None else time.time() + timeout
+        all_finished = True
+        for job in jobs:
+            remaining = None if end_time is None else max(0, end_time - time.time())
+            if job.wait(remaining):
+                job.attach_links()
+                with cls._media_jobs_lock:
+                    cls._media_jobs.pop(job.id, None)
+            else:
+                all_finished = False
+        return all_finished
+
+    @classmethod
+    def clear_finished_media_jobs(cls):
+        """Unregister the finished media jobs that are not waited with
+        :meth:`.wait_media_jobs`.
+
+        Returns:
+            List[MediaJob]: The unregistered jobs.
+        """
+        with cls._media_jobs_lock:
+            finished_jobs = [
+                job for job in cls._media_jobs.values() if job.is_finished
+            ]
+            for job in finished_jobs:
+                del cls._media_jobs[job.id]
+        return finished_jobs
+
+    @classmethod
+    def shutdown_media_jobs(cls, wait=True):
+        """Shutdown the media job executor.
+
+        Args:
+            wait (bool): Wait for the running jobs to finish.
+        """
+        with cls._media_jobs_lock:
+            executor = cls._media_job_executor
+            cls._media_job_executor = None
+        if executor:
+            executor.shutdown(wait=wait)
+
+    def _upload_reference_original(self, task, file_object, filename):
+        """Upload the original file of a reference and create its Link.
+
+        Args:
+            task (stalker.Task): The task that a reference is uploaded to.
+            file_object (file): The file like object holding the content of the uploaded
+                file.
+            filename (str): The original filename.
+
+        Returns:
+            (stalker.Link, callable, str): The Link, a callable that creates the
+                Links of the generated media files and the uploaded file full path.
+        """
+        file_path = os.path.join(os.path.join(task.absolute_path), self.reference_path)
+
+        # upload it
+        reference_file_full_path = self.upload_file(file_object, file_path, filename)
+
+        # create a Link instance and return it.
+        # use a Repository relative path
+        repo = task.project.repository
+        relative_full_path = repo.make_relative(reference_file_full_path)
+
+        link = Link(full_path=relative_full_path, original_filename=filename)
+
+        # the media files are generated under the reference folder, resolve its
+        # relative path here, so the Links can be created without the repository
+        reference_file_path = os.path.dirname(reference_file_full_path)
+        relative_file_path = repo.make_relative(reference_file_path)
+
+        def create_link(full_path):
+            relative_path = os.path.relpath(full_path, reference_file_path)
+            return Link(
+                full_path="%s/%s"
+                % (relative_file_path, relative_path.replace("\\", "/")),
+                original_filename=os.path.basename(full_path),
+            )
+
+        return link, create_link, reference_file_full_path
+
+    def upload_reference(self, task, file_object, filename):
+        """Upload a reference for the given task.
+
+        Upload to the Task.path/References/Stalker_Pyramid/ folder and create a Link
+        object to there. Again the Link object will have a Repository root relative
+        path.
+
+        It will also create a thumbnail under
+        {{Task.absolute_path}}/References/Stalker_Pyramid/Thumbnail folder and a
+        web friendly version (PNG for images, WebM for video files) under
+        {{Task.absolute_path}}/References/Stalker_Pyramid/ForWeb folder.
+
+        Args:
+            task (stalker.Task): The task that a reference is uploaded to. Should be an
+                instance of :class:`.Task` class.
+            file_object (file): The file like object holding the content of the uploaded
+                file.
+            filename (str): The original filename.
+
+        Returns:
+            stalker.Link: A :class:`stalker.Link` instance.
+        """
+        link, create_link, reference_file_full_path = self._upload_reference_original(
+            task, file_object, filename
+        )
+        web_version_full_path, thumbnail_full_path = self.generate_media_files(
+            reference_file_full_path
+        )
+        self.attach_media_links(
+            link, create_link, web_version_full_path, thumbnail_full_path
+        )
+
+        # assign it as a reference to the given task
+        task.references.append(link)
+        return link
+
+    def upload_reference_async(self, task, file_object, filename, callback=None):
+        """Upload a reference for the given task and generate its media files in the
+        background.
+
+        Same as :meth:`.upload_reference` but returns as soon as the original file
+        is written and its Link is created. The web version and the thumbnail are
+        generated by a :class:`.MediaJob` in the background and their Links are
+        attached by :meth:`.wait_media_jobs`.
+
+        Args:
+            task (stalker.Task): The task that a reference is uploaded to. Should be an
+                instance of :class:`.Task` class.
+            file_object (file): The file like object holding the content of the uploaded
+                file.
+            filename (str): The original filename.
+            callback: A callable that is called with the :class:`.MediaJob` when the
+                job is finished.
+
+        Returns:
+            MediaJob: The :class:`.MediaJob`, the Link is in its ``link`` attribute.
+        """
+        link, create_link, reference_file_full_path = self._upload_reference_original(
+            task, file_object, filename
+        )
+        task.references.append(link)
+        return self.submit_media_job(
+            link, reference_file_full_path, create_link, callback=callback
+        )
+
+    def upload_version(self, task, file_object, take_name=None, extension=""):
         """Upload versions to the Task.path folder and create a Version object.
 
         Again the Version object will have a Repository root relative path.
@@ -1496,16 +2170,8 @@ class MediaManager(object):
 
         return v
 
-    def upload_version_output(self, version, file_object, filename):
-        """Upload a file as an output for the given :class:`.Version` instance.
-
-        Will store the file in {{Version.absolute_path}}/Outputs/Stalker_Pyramid/
-        folder.
-
-        It will also generate a thumbnail in
-        {{Version.absolute_path}}/Outputs/Stalker_Pyramid/Thumbs folder and a
-        web friendly version (PNG for images, WebM for video files) under
-        {{Version.absolute_path}}/Outputs/Stalker_Pyramid/ForWeb folder.
+    def _upload_version_output_original(self, version, file_object, filename):
+        """Upload the original file of a version output and create its Link.
 
         Args:
             version (stalker.Version): A :class:`.Version` instance that the output is
@@ -1515,11 +2181,9 @@ class MediaManager(object):
             filename (str): The original filename.
 
         Returns:
-            stalker.Link: stalker.Link instance.
+            (stalker.Link, callable, str): The Link, a callable that creates the
+                Links of the generated media files and the uploaded file full path.
         """
-        ############################################################
-        # ORIGINAL
-        ############################################################
         file_path = os.path.join(
             os.path.join(version.absolute_path), self.version_output_path
         )
@@ -1529,9 +2193,6 @@ class MediaManager(object):
             file_object, file_path, filename
         )
 
-        version_output_file_name = os.path.basename(version_output_file_full_path)
-        version_output_base_name = os.path.splitext(version_output_file_name)[0]
-
         # create a Link instance and return it.
         # use a Repository relative path
         repo = version.task.project.repository
@@ -1543,85 +2204,208 @@ class MediaManager(object):
             original_filename=str(filename),
         )
 
-        # create a thumbnail for the given version output
-        # don't forget that the first thumbnail is the Web viewable version
-        # and the second thumbnail is the thumbnail
-
-        ############################################################
-        # WEB VERSION
-        ############################################################
-        web_version_link = None
-        try:
-            web_version_temp_full_path = self.generate_media_for_web(
-                version_output_file_full_path
-            )
-            web_version_extension = os.path.splitext(web_version_temp_full_path)[-1]
-            web_version_full_path = os.path.join(
-                os.path.dirname(version_output_file_full_path),
-                "ForWeb",
-                version_output_base_name + web_version_extension,
-            )
-
-            web_version_link = Link(
-                full_path=repo.to_os_independent_path(web_version_full_path),
+        # the media files are generated under the output folder, resolve its os
+        # independent path here, so the Links can be created without querying the
+        # repositories
+        output_file_path = os.path.dirname(version_output_file_full_path)
+        os_independent_file_path = repo.to_os_independent_path(output_file_path)
+
+        def create_link(full_path):
+            relative_path = os.path.relpath(full_path, output_file_path)
+            return Link(
+                full_path="%s/%s"
+                % (os_independent_file_path, relative_path.replace("\\", "/")),
                 original_filename=filename,
             )
 
-            # move it to repository
-            try:
-                os.makedirs(os.path.dirname(web_version_full_path))
-            except OSError:  # path exists
-                pass
-            shutil.move(web_version_temp_full_path, web_version_full_path)
-        except RuntimeError:
-            # not an image or video so skip it
-            pass
+        return link, create_link, version_output_file_full_path
 
-        ############################################################
-        # THUMBNAIL
-        ############################################################
-        # finally generate a Thumbnail
-        thumbnail_link = None
-        try:
-            thumbnail_temp_full_path = self.generate_thumbnail(
-                version_output_file_full_path
-            )
-            thumbnail_extension = os.path.splitext(thumbnail_temp_full_path)[-1]
+    def upload_version_output(self, version, file_object, filename):
+        """Upload a file as an output for the given :class:`.Version` instance.
 
-            thumbnail_full_path = os.path.join(
-                os.path.dirname(version_output_file_full_path),
-                "Thumbnail",
-                version_output_base_name + thumbnail_extension,
-            )
+        Will store the file in {{Version.absolute_path}}/Outputs/Stalker_Pyramid/
+        folder.
 
-            thumbnail_link = Link(
-                full_path=repo.to_os_independent_path(thumbnail_full_path),
-                original_filename=filename,
-            )
+        It will also generate a thumbnail in
+        {{Version.absolute_path}}/Outputs/Stalker_Pyramid/Thumbnail folder and a
+        web friendly version (PNG for images, WebM for video files) under
+        {{Version.absolute_path}}/Outputs/Stalker_Pyramid/ForWeb folder.
 
-            # move it to repository
-            try:
-                os.makedirs(os.path.dirname(thumbnail_full_path))
-            except OSError:  # path exists
-                pass
-            shutil.move(thumbnail_temp_full_path, thumbnail_full_path)
-        except RuntimeError:
-            # not an image or video so skip it
-            pass
+        Args:
+            version (stalker.Version): A :class:`.Version` instance that the output is
+                uploaded for.
+            file_object (file): The file like object holding the content of the
+                uploaded file.
+            filename (str): The original filename.
+
+        Returns:
+            stalker.Link: stalker.Link instance.
+        """
+        (
+            link,
+            create_link,
+            version_output_file_full_path,
+        ) = self._upload_version_output_original(version, file_object, filename)
+        web_version_full_path, thumbnail_full_path = self.generate_media_files(
+            version_output_file_full_path, skip_unsupported=True
+        )
+        self.attach_media_links(
+            link, create_link, web_version_full_path, thumbnail_full_path
+        )
 
-        ############################################################
-        # LINK Objects
-        ############################################################
-        # link them
         # assign it as an output to the given version
         version.outputs.append(link)
-        if web_version_link:
-            link.thumbnail = web_version_link
-            if thumbnail_link:
-                web_version_link.thumbnail = thumbnail_link
-
         return link
 
+    def upload_version_output_async(
+        self, version, file_object, filename, callback=None
+    ):
+        """Upload a file as an output for the given :class:`.Version` instance and
+        generate its media files in the background.
+
+        Same as :meth:`.upload_version_output` but returns as soon as the original
+        file is written and its Link is created. The web version and the thumbnail
+        are generated by a :class:`.MediaJob` in the background and their Links are
+        attached by :meth:`.wait_media_jobs`.
+
+        Args:
+            version (stalker.Version): A :class:`.Version` instance that the output is
+                uploaded for.
+            file_object (file): The file like object holding the content of the
+                uploaded file.
+            filename (str): The original filename.
+            callback: A callable that is called with the :class:`.MediaJob` when the
+                job is finished.
+
+        Returns:
+            MediaJob: The :class:`.MediaJob`, the Link is in its ``link`` attribute.
+        """
+        (
+            link,
+            create_link,
+            version_output_file_full_path,
+        ) = self._upload_version_output_original(version, file_object, filename)
+        version.outputs.append(link)
+        return self.submit_media_job(
+            link,
+            version_output_file_full_path,
+            create_link,
+            skip_unsupported=True,
+            callback=callback,
+        )
+
+
+class MediaJob(object):
+    """Tracks the generation of the web version and the thumbnail of an uploaded
+    file.
+
+    The jobs are created by :meth:`.MediaManager.submit_media_job` and run on the
+    process pool of the :class:`.MediaManager`. The callback is called with the job
+    in a background thread when it is finished.
+
+    The Links of the generated files are attached to the :attr:`.link` with
+    :meth:`.attach_links`, which is called by :meth:`.MediaManager.wait_media_jobs`.
+    It is not called from the background thread, as the session of the Link can not
+    be used from two threads at the same time.
+
+    Args:
+        link (stalker.Link): The Link of the original file.
+        file_full_path (str): The full path of the original file.
+        create_link: A callable that creates a :class:`stalker.Link` for the given
+            full path.
+        callback: A callable that is called with the job when it is finished.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, link, file_full_path, create_link, callback=None):
+        self.id = uuid.uuid4().hex
+        self.link = link
+        self.file_full_path = file_full_path
+        self.create_link = create_link
+        self.callback = callback
+        self.future = None
+        self.web_version_full_path = None
+        self.thumbnail_full_path = None
+        self.error = None
+        self.links_attached = False
+        self._finished = threading.Event()
+
+    @property
+    def status(self):
+        """Return the status of the job.
+
+        Returns:
+            str: One of PENDING, RUNNING, DONE or FAILED.
+        """
+        if self._finished.is_set():
+            return self.FAILED if self.error is not None else self.DONE
+        if self.future is not None and (self.future.running() or self.future.done()):
+            return self.RUNNING
+        return self.PENDING
+
+    @property
+    def is_finished(self):
+        """Return True if the job is finished.
+
+        Returns:
+            bool: True if the job is finished, False otherwise.
+        """
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the job to finish.
+
+        Args:
+            timeout (float): The maximum time to wait in seconds.
+
+        Returns:
+            bool: True if the job is finished, False otherwise.
+        """
+        return self._finished.wait(timeout)
+
+    def finish(self, future):
+        """Store the result of the job and call the callback.
+
+        Args:
+            future (concurrent.futures.Future): The future of the job.
+        """
+        try:
+            self.web_version_full_path, self.thumbnail_full_path = future.result()
+        except Exception as e:
+            logger.error("media job failed for %s: %s" % (self.file_full_path, e))
+            self.error = e
+        finally:
+            self._finished.set()
+
+        if self.callback:
+            self.callback(self)
+
+    def attach_links(self):
+        """Attach the Links of the generated media files to the :attr:`.link`.
+
+        Does nothing if the job is not finished successfully or the Links are
+        already attached.
+
+        Returns:
+            bool: True if the Links are attached, False otherwise.
+        """
+        if self.status != self.DONE:
+            return False
+
+        if not self.links_attached:
+            self.links_attached = True
+            MediaManager.attach_media_links(
+                self.link,
+                self.create_link,
+                self.web_version_full_path,
+                self.thumbnail_full_path,
+            )
+        return True
+
 
 class Exposure(object):
     """A class for photo exposure calculation.
@@ -1758,13 +2542,19 @@ def file_browser_name():
     return file_browsers[platform.system().lower()]
 
 
-def generate_unique_shot_name(project, base_name, shot_name_increment=10):
+def generate_unique_shot_name(
+    project, base_name, shot_name_increment=10, existing_shot_names=None
+):
     """Generate a unique shot name and code based of the base_name.
 
     Args:
         project (stalker.Project): Search unique shot in this project.
         base_name (str): The base shot name
         shot_name_increment (int): The increment amount
+        existing_shot_names (set): The names of the existing shots in the
+            project. If given, the names are checked against this set instead of
+            querying the database for every candidate name, and the generated
+            name is added to the set.
 
     Raises:
         RuntimeError: If it is not possible to generate a unique name.
@@ -1799,7 +2589,12 @@ def generate_unique_shot_name(project, base_name, shot_name_increment=10):
     while True and i < 100000:
         name_parts[-1] = str(i).zfill(padding)
         shot_name = "_".join(name_parts)
-        if is_unique_shot_name(project, shot_name):
+        if existing_shot_names is not None:
+            if shot_name not in existing_shot_names:
+                logger.debug("generated unique shot name: %s" % shot_name)
+                existing_shot_names.add(shot_name)
+                return shot_name
+        elif is_unique_shot_name(project, shot_name):
             logger.debug("generated unique shot name: %s" % shot_name)
             return shot_name
         i += shot_name_increment
@@ -1824,7 +2619,9 @@ def is_unique_shot_name(project, shot_name):
     return unique_shot_name
 
 
-def duplicate_task(task, user, keep_resources=False):
+def duplicate_task(
+    task, user, keep_resources=False, status=None, existing_shot_names=None
+):
     """Duplicate the given task without children.
 
     Args:
@@ -1832,6 +2629,10 @@ def duplicate_task(task, user, keep_resources=False):
         user (stalker.User): A stalker.User instance which will be recorded as the
             creator of the new entities.
         keep_resources (bool): Set this True if you want to keep the resources.
+        status (stalker.Status): The status of the new task. The WFD status is
+            queried if skipped.
+        existing_shot_names (set): The names of the existing shots in the
+            project, passed to generate_unique_shot_name().
 
     Returns:
         stalker.Task: The newly created (duplicate) stalker.Task instance.
@@ -1847,7 +2648,9 @@ def duplicate_task(task, user, keep_resources=False):
 
         # generate a unique shot name based on task.name
         logger.debug("generating unique shot name!")
-        shot_name = generate_unique_shot_name(task.project, task.name)
+        shot_name = generate_unique_shot_name(
+            task.project, task.name, existing_shot_names=existing_shot_names
+        )
         extra_kwargs = {
             "name": shot_name,
             "code": shot_name,
@@ -1859,8 +2662,10 @@ def duplicate_task(task, user, keep_resources=False):
         extra_kwargs = {"code": task.code}
 
     # all duplicated tasks are new tasks
-    with DBSession.no_autoflush:
-        wfd = Status.query.filter(Status.code == "WFD").first()
+    wfd = status
+    if wfd is None:
+        with DBSession.no_autoflush:
+            wfd = Status.query.filter(Status.code == "WFD").first()
 
     utc_now = datetime.datetime.now(pytz.utc)
 
@@ -1971,6 +2776,51 @@ def cleanup_duplicate_residuals(task):
         cleanup_duplicate_residuals(child)
 
 
+def get_task_hierarchy(task):
+    """Load the given task and all of its children deeply with one query.
+
+    Args:
+        task (stalker.Task): The top most task of the hierarchy.
+
+    Returns:
+        dict: A dictionary of parent task id and children list pairs. The
+            children are ordered by their ids.
+    """
+    from sqlalchemy.orm import selectinload
+    from stalker import TaskDependency
+
+    hierarchy = (
+        DBSession.query(Task.id.label("id"))
+        .filter(Task.id == task.id)
+        .cte(name="task_hierarchy", recursive=True)
+    )
+    hierarchy = hierarchy.union_all(
+        DBSession.query(Task.id).filter(Task.parent_id == hierarchy.c.id)
+    )
+
+    tasks = (
+        Task.query.with_polymorphic("*")
+        .filter(Task.id.in_(DBSession.query(hierarchy.c.id)))
+        .options(
+            selectinload(Task.task_depends_to).selectinload(
+                TaskDependency.depends_to
+            ),
+            selectinload(Task.resources),
+            selectinload(Task.watchers),
+            selectinload(Task._responsible),
+            selectinload(Task.tags),
+        )
+        .order_by(Task.id)
+        .all()
+    )
+
+    children = {}
+    for t in tasks:
+        if t.id != task.id:
+            children.setdefault(t.parent_id, []).append(t)
+    return children
+
+
 def duplicate_task_hierarchy(
     task, parent, name, description, user, keep_resources=False, number_of_copies=1
 ):
@@ -1979,6 +2829,10 @@ def duplicate_task_hierarchy(
     Walks through the hierarchy of the given task and duplicates every
     instance it finds in a new task.
 
+    The hierarchy is loaded with one query, the unique shot names are
+    generated against the shot names that are queried once, and all the
+    copies are committed at once.
+
     Args:
         task (stalker.Task): The task that wanted to be duplicated.
         parent (stalker.Task): The parent task to move the newly created tasks under.
@@ -1995,40 +2849,83 @@ def duplicate_task_hierarchy(
     if not name:
         name = task.name
 
-    dup_tasks = []
-    for _ in range(number_of_copies):
-        if isinstance(task, Shot):
-            # generate a new unique name
-            if not is_unique_shot_name(task.project, name):
-                name = generate_unique_shot_name(task.project, name)
-
-        dup_task = walk_and_duplicate_task_hierarchy(
-            task, user, keep_resources=keep_resources
-        )
-        update_dependencies_in_duplicated_hierarchy(task)
-
-        cleanup_duplicate_residuals(task)
-        # update the parent
-        if parent is None and task.parent is not None:
-            parent = task.parent
+    # update the parent
+    if parent is None and task.parent is not None:
+        parent = task.parent
 
-        dup_task.parent = parent
-        # just rename the dup_task
+    children = get_task_hierarchy(task)
 
-        # check if this is a Shot before setting the name
-        if isinstance(task, Shot):
-            # set the other data
-            dup_task.sequences = task.sequences
-            dup_task.cut_in = task.cut_in
-            dup_task.cut_out = task.cut_out
+    with DBSession.no_autoflush:
+        wfd = Status.query.filter(Status.code == "WFD").first()
+        existing_shot_names = set(
+            shot_name
+            for (shot_name,) in DBSession.query(Shot.name).filter(
+                Shot.project == task.project
+            )
+        )
 
-        dup_task.name = name
-        dup_task.code = name
-        dup_task.description = description
+    dup_tasks = []
+    with DBSession.no_autoflush:
+        for _ in range(number_of_copies):
+            if isinstance(task, Shot):
+                # generate a new unique name
+                if name in existing_shot_names:
+                    name = generate_unique_shot_name(
+                        task.project, name, existing_shot_names=existing_shot_names
+                    )
+                existing_shot_names.add(name)
+
+            # duplicate parents before children
+            duplicates = {}
+            duplicated_pairs = []
+            tasks_to_duplicate = [task]
+            while tasks_to_duplicate:
+                t = tasks_to_duplicate.pop()
+                logger.debug("duplicating task : %s" % t)
+                dup_task = duplicate_task(
+                    t,
+                    user,
+                    keep_resources=keep_resources,
+                    status=wfd,
+                    existing_shot_names=existing_shot_names,
+                )
+                if t is task:
+                    # the top task is renamed below,
+                    # so release the generated shot name
+                    if isinstance(t, Shot):
+                        existing_shot_names.discard(dup_task.name)
+                else:
+                    dup_task.parent = duplicates[t.parent_id]
+                duplicates[t.id] = dup_task
+                duplicated_pairs.append((t, dup_task))
+                tasks_to_duplicate.extend(reversed(children.get(t.id, [])))
+
+            # update the dependencies
+            for t, dup_task in duplicated_pairs:
+                for dependent_task in t.depends:
+                    dup_task.depends.append(
+                        duplicates.get(dependent_task.id, dependent_task)
+                    )
+
+            dup_task = duplicates[task.id]
+            dup_task.parent = parent
+            # just rename the dup_task
+
+            # check if this is a Shot before setting the name
+            if isinstance(task, Shot):
+                # set the other data
+                dup_task.sequences = task.sequences
+                dup_task.cut_in = task.cut_in
+                dup_task.cut_out = task.cut_out
+
+            dup_task.name = name
+            dup_task.code = name
+            dup_task.description = description
+
+            dup_tasks.append(dup_task)
+            DBSession.add(dup_task)
 
-        dup_tasks.append(dup_task)
-        DBSession.add(dup_task)
-        DBSession.commit()
+    DBSession.commit()
 
     return dup_tasks
 
@@ -2048,6 +2945,158 @@ def fix_task_statuses(task):
         fix_task_computed_time(task)
 
 
+def fix_task_statuses_in_bulk(entity, batch_size=500):
+    """Fix the statuses, schedule info and computed times of all the tasks of
+    the given project or task hierarchy at once.
+
+    This does the same thing with calling :func:`.fix_task_statuses` and
+    :func:`.fix_task_computed_time` for every task in the hierarchy, starting
+    from the leaf tasks, but the tasks are loaded with their children and
+    dependencies in batches, the TimeLog start and end times are queried for all
+    the tasks with one grouped query and the statuses are queried once. The
+    changes are written in a single flush, it is the callers responsibility to
+    commit them.
+
+    Args:
+        entity (Union[stalker.Project, stalker.Task]): The project or the root
+            task of the hierarchy.
+        batch_size (int): The maximum number of task ids in one query.
+
+    Returns:
+        List[stalker.Task]: The fixed tasks, the leaf tasks first.
+    """
+    if isinstance(entity, Project):
+        task_ids = [
+            task_id
+            for (task_id,) in DBSession.query(Task.id).filter(
+                Task.project_id == entity.id
+            )
+        ]
+    else:
+        hierarchy = (
+            DBSession.query(Task.id.label("task_id"))
+            .filter(Task.id == entity.id)
+            .cte(name="hierarchy", recursive=True)
+        )
+        hierarchy = hierarchy.union_all(
+            DBSession.query(Task.id).filter(Task.parent_id == hierarchy.c.task_id)
+        )
+        task_ids = [task_id for (task_id,) in DBSession.query(hierarchy.c.task_id)]
+
+    tasks = {}
+    time_log_ranges = {}
+    logged_seconds = {}
+    for i in range(0, len(task_ids), batch_size):
+        batch_ids = task_ids[i : i + batch_size]
+        for task in (
+            Task.query.options(
+                joinedload(Task.status),
+                selectinload(Task.children),
+                selectinload(Task.task_depends_to)
+                .joinedload(TaskDependency.depends_to)
+                .joinedload(Task.status),
+            )
+            .filter(Task.id.in_(batch_ids))
+            .all()
+        ):
+            tasks[task.id] = task
+
+        for task_id, start, end in (
+            DBSession.query(
+                TimeLog.task_id, func.min(TimeLog.start), func.max(TimeLog.end)
+            )
+            .filter(TimeLog.task_id.in_(batch_ids))
+            .group_by(TimeLog.task_id)
+        ):
+            time_log_ranges[task_id] = (start, end)
+
+        effort_task_ids = [
+            task_id
+            for task_id in batch_ids
+            if not tasks[task_id].children
+            and tasks[task_id].schedule_model == "effort"
+            and task_id in time_log_ranges
+        ]
+        if effort_task_ids:
+            for task_id, start, end in DBSession.query(
+                TimeLog.task_id, TimeLog.start, TimeLog.end
+            ).filter(TimeLog.task_id.in_(effort_task_ids)):
+                duration = end - start
+                logged_seconds[task_id] = (
+                    logged_seconds.get(task_id, 0)
+                    + duration.days * 86400
+                    + duration.seconds
+                )
+
+    statuses = {
+        status.code: status
+        for status in Status.query.filter(Status.code.in_(["CMPL", "WIP"])).all()
+    }
+    utc_now = datetime.datetime.now(pytz.utc)
+
+    # the leaf tasks go first, sorted by their dependencies, then the
+    # containers from the deepest to the root
+    depths = {}
+    for task in tasks.values():
+        depth = 0
+        parent_id = task.parent_id
+        while parent_id in tasks:
+            depth += 1
+            parent_id = tasks[parent_id].parent_id
+        depths[task.id] = depth
+
+    sorted_leaf_tasks = []
+    visited = set()
+
+    def visit(t):
+        if t.id in visited:
+            return
+        visited.add(t.id)
+        for task_dependency in t.task_depends_to:
+            dependency = tasks.get(task_dependency.depends_to_id)
+            if dependency is not None and not dependency.children:
+                visit(dependency)
+        sorted_leaf_tasks.append(t)
+
+    for task in sorted(tasks.values(), key=lambda x: x.id):
+        if not task.children:
+            visit(task)
+
+    container_tasks = sorted(
+        [task for task in tasks.values() if task.children],
+        key=lambda x: (-depths[x.id], x.id),
+    )
+
+    with DBSession.no_autoflush:
+        for task in sorted_leaf_tasks:
+            task.update_status_with_dependent_statuses()
+            _check_task_status_by_schedule_model(
+                task, statuses.get("CMPL"), statuses.get("WIP"), utc_now
+            )
+            task._schedule_seconds = task.schedule_seconds
+            if task.schedule_model == "effort":
+                task._total_logged_seconds = logged_seconds.get(task.id, 0)
+            else:
+                task._total_logged_seconds = task.total_logged_seconds
+
+        for task in container_tasks:
+            task.update_status_with_children_statuses()
+            schedule_seconds = 0
+            total_logged_seconds = 0
+            for child in task.children:
+                schedule_seconds += child._schedule_seconds or 0
+                total_logged_seconds += child._total_logged_seconds or 0
+            task._schedule_seconds = schedule_seconds
+            task._total_logged_seconds = total_logged_seconds
+
+        for task in sorted_leaf_tasks + container_tasks:
+            start, end = time_log_ranges.get(task.id, (None, None))
+            _fix_task_computed_time(task, start, end)
+
+    DBSession.flush()
+    return sorted_leaf_tasks + container_tasks
+
+
 def check_task_status_by_schedule_model(task):
     """Check task status by schedule model.
 
@@ -2063,6 +3112,18 @@ def check_task_status_by_schedule_model(task):
     status_cmpl = Status.query.filter(Status.code == "CMPL").first()
     status_wip = Status.query.filter(Status.code == "WIP").first()
 
+    _check_task_status_by_schedule_model(task, status_cmpl, status_wip, utc_now)
+
+
+def _check_task_status_by_schedule_model(task, status_cmpl, status_wip, utc_now):
+    """Check task status by schedule model with the given statuses.
+
+    Args:
+        task (stalker.Task): A stalker.Task instance.
+        status_cmpl (stalker.Status): The CMPL status.
+        status_wip (stalker.Status): The WIP status.
+        utc_now (datetime.datetime): The current time in UTC.
+    """
     if task.is_leaf and task.schedule_model == "duration":
         depends_tasks_cmpl = True
         for dependent_task in task.depends:
@@ -2111,8 +3172,25 @@ def get_actual_start_time(task):
         TimeLog.query.filter(TimeLog.task == task).order_by(TimeLog.start.asc()).first()
     )
 
-    if first_time_log:
-        return first_time_log.start
+    return _get_actual_start_time(
+        task, first_time_log.start if first_time_log else None
+    )
+
+
+def _get_actual_start_time(task, first_time_log_start):
+    """Return the actual start time of the given task with the given earliest
+    time log start time.
+
+    Args:
+        task (stalker.Task): The stalker task instance.
+        first_time_log_start (datetime.datetime): The start time of the earliest
+            time log of the task or None if there are no time logs.
+
+    Returns:
+        datetime.datetime: The actual start time.
+    """
+    if first_time_log_start:
+        return first_time_log_start
     else:
         if task.schedule_model == "duration":
             start_time = task.project.start
@@ -2149,8 +3227,23 @@ def get_actual_end_time(task):
         TimeLog.query.filter(TimeLog.task == task).order_by(TimeLog.end.desc()).first()
     )
 
-    if end_time_log:
-        return end_time_log.end
+    return _get_actual_end_time(task, end_time_log.end if end_time_log else None)
+
+
+def _get_actual_end_time(task, last_time_log_end):
+    """Return the actual end time of the given task with the given latest time
+    log end time.
+
+    Args:
+        task (stalker.Task): The stalker task instance.
+        last_time_log_end (datetime.datetime): The end time of the latest time
+            log of the task or None if there are no time logs.
+
+    Returns:
+        datetime.datetime: The actual end time.
+    """
+    if last_time_log_end:
+        return last_time_log_end
     else:
         if task.schedule_model == "duration":
             end_time = task.project.start
@@ -2193,6 +3286,24 @@ def fix_task_computed_time(task):
         logger.debug("Task computed time is fixed!")
 
 
+def _fix_task_computed_time(task, first_time_log_start, last_time_log_end):
+    """Fix task's computed_start and computed_end time with the given time log
+    range.
+
+    Args:
+        task (stalker.Task): The stalker.Task instance.
+        first_time_log_start (datetime.datetime): The start time of the earliest
+            time log of the task or None.
+        last_time_log_end (datetime.datetime): The end time of the latest time
+            log of the task or None.
+    """
+    if task.status.code not in ["CMPL", "STOP", "OH"]:
+        return
+
+    task.computed_start = _get_actual_start_time(task, first_time_log_start)
+    task.computed_end = _get_actual_end_time(task, last_time_log_end)
+
+
 def smooth_array(data, iteration=1):
     """Smooths the given list of data.
 
@@ -2559,6 +3670,64 @@ def upload_thumbnail(task, thumbnail_full_path):
     return True
 
 
+def get_nearest_thumbnail_paths(entities, batch_size=500):
+    """Return the thumbnail paths of the given entities, using the thumbnail
+    of the nearest ancestor for the Tasks that don't have one.
+
+    The ancestor chains of all the Tasks in a batch are walked with one
+    recursive query, which stops climbing up as soon as a thumbnail is found.
+
+    Args:
+        entities (List[SimpleEntity]): The entities.
+        batch_size (int): The maximum number of task ids in one query.
+
+    Returns:
+        dict: The expanded thumbnail full paths by entity id, the value is
+            None if no thumbnail is found or it doesn't exist on disk.
+    """
+    thumbnail_paths = {}
+    task_ids = []
+    for entity in entities:
+        if isinstance(entity, Task):
+            task_ids.append(entity.id)
+            thumbnail_paths[entity.id] = None
+        else:
+            thumbnail = entity.thumbnail
+            thumbnail_paths[entity.id] = thumbnail.full_path if thumbnail else None
+
+    task_ids = list(set(task_ids))
+    for i in range(0, len(task_ids), batch_size):
+        batch_ids = task_ids[i : i + batch_size]
+        chain = (
+            DBSession.query(
+                Task.id.label("task_id"),
+                Task.parent_id.label("parent_id"),
+                Task.thumbnail_id.label("thumbnail_id"),
+            )
+            .filter(Task.id.in_(batch_ids))
+            .cte(name="thumbnail_chain", recursive=True)
+        )
+        chain = chain.union_all(
+            DBSession.query(chain.c.task_id, Task.parent_id, Task.thumbnail_id)
+            .filter(Task.id == chain.c.parent_id)
+            .filter(chain.c.thumbnail_id.is_(None))
+        )
+        # there is at most one thumbnail per task in the chain
+        for task_id, full_path in DBSession.query(
+            chain.c.task_id, Link.full_path
+        ).join(Link, Link.id == chain.c.thumbnail_id):
+            thumbnail_paths[task_id] = full_path
+
+    for entity_id, full_path in thumbnail_paths.items():
+        if full_path is not None:
+            full_path = os.path.expandvars(full_path)
+            if not os.path.exists(full_path):
+                full_path = None
+        thumbnail_paths[entity_id] = full_path
+
+    return thumbnail_paths
+
+
 def text_splitter(input_text, max_line_length=32):
     """Split the text from white spaces.
 
@@ -2632,38 +3801,193 @@ def to_unit(seconds, unit, model):
     return seconds / lut[unit]
 
 
-def convert_to_partial_task(task=None):
-    """Convert the given task to a partial representation.
+PartialEntity = collections.namedtuple(
+    "PartialEntity",
+    [
+        "id",
+        "name",
+        "entity_type",
+        "status_id",
+        "has_children",
+        "resources",
+        "parent_id",
+        "project_id",
+    ],
+)
+PartialEntity.__doc__ = """A lightweight, read only representation of a Task or Project.
+
+The ``resources`` is a list of user names, the ``parent_id`` and ``project_id``
+are None for Projects.
+"""
+
+
+def get_user_names(user_ids):
+    """Return the names of the given users using ``defaults.user_names_lut``.
+
+    The users that are not in the look-up table yet are queried and added to it.
 
     Args:
-        task (stalker.Task): A stalker.Task instance.
+        user_ids (list): A list of user ids.
+
+    Returns:
+        dict: A dictionary of user id and user name pairs.
+    """
+    user_names_lut = defaults.user_names_lut
+    missing_user_ids = [
+        user_id for user_id in set(user_ids) if user_id not in user_names_lut
+    ]
+    if missing_user_ids:
+        for user_id, user_name in DBSession.query(User.id, User.name).filter(
+            User.id.in_(missing_user_ids)
+        ):
+            user_names_lut[user_id] = user_name
+    return {user_id: user_names_lut.get(user_id) for user_id in user_ids}
+
+
+def get_task_resource_names(task_ids, batch_size=500):
+    """Return the resource names of the given tasks.
+
+    Args:
+        task_ids (list): A list of task ids.
+        batch_size (int): The maximum number of task ids in one query.
+
+    Returns:
+        dict: A dictionary of task id and list of resource name pairs.
+    """
+    resource_ids = {task_id: [] for task_id in task_ids}
+    all_resource_ids = set()
+    task_ids = list(resource_ids)
+    for i in range(0, len(task_ids), batch_size):
+        query = (
+            DBSession.query(Task_Resources.c.task_id, Task_Resources.c.resource_id)
+            .filter(Task_Resources.c.task_id.in_(task_ids[i : i + batch_size]))
+            .order_by(Task_Resources.c.task_id, Task_Resources.c.resource_id)
+        )
+        for task_id, resource_id in query:
+            resource_ids[task_id].append(resource_id)
+            all_resource_ids.add(resource_id)
+
+    user_names = get_user_names(all_resource_ids)
+    return {
+        task_id: [user_names[resource_id] for resource_id in ids]
+        for task_id, ids in resource_ids.items()
+    }
+
+
+def query_partial_tasks(*criteria):
+    """Query the tasks matching the given criteria as PartialEntity instances.
+
+    The query runs on any database dialect. The ``has_children`` value is
+    computed with a join to the grouped child counts of the matching tasks, and
+    the resource names are resolved with one more query through
+    :func:`.get_user_names`.
+
+    Args:
+        criteria: SQLAlchemy filter criteria for the stalker.Task class.
 
     Returns:
-        sqlalchemy.engine.row.Row: This can be used like a dictionary.
+        list[PartialEntity]: A list of PartialEntity instances ordered by name.
     """
-    inner_tasks = aliased(Task)
-    subquery = DBSession.query(Task.id).filter(Task.id == inner_tasks.parent_id)
-    return (
+    inner_tasks = aliased(Task.__table__)
+    task_ids = DBSession.query(Task.id).filter(*criteria).subquery()
+    child_counts = (
         DBSession.query(
-            Task.id,
-            Task.name,
-            Task.entity_type,
-            Task.status_id,
-            subquery.exists().label("has_children"),
-            array_agg(User.name).label("resources"),
+            inner_tasks.c.parent_id.label("parent_id"),
+            func.count(inner_tasks.c.id).label("child_count"),
         )
-        .outerjoin(Task_Resources, Task.__table__.c.id == Task_Resources.c.task_id)
-        .outerjoin(User, Task_Resources.c.resource_id == User.id)
-        .group_by(
+        .filter(inner_tasks.c.parent_id.in_(task_ids))
+        .group_by(inner_tasks.c.parent_id)
+        .subquery()
+    )
+    rows = (
+        DBSession.query(
             Task.id,
             Task.name,
             Task.entity_type,
             Task.status_id,
-            subquery.exists().label("has_children"),
+            child_counts.c.child_count,
+            Task.parent_id,
+            Task.project_id,
         )
-        .filter(Task.id == task.id)
-        .first()
+        .outerjoin(child_counts, Task.id == child_counts.c.parent_id)
+        .filter(*criteria)
+        .order_by(Task.name)
+        .all()
+    )
+    resource_names = get_task_resource_names([row.id for row in rows])
+    return [
+        PartialEntity(
+            id=row.id,
+            name=row.name,
+            entity_type=row.entity_type,
+            status_id=row.status_id,
+            has_children=bool(row.child_count),
+            resources=resource_names[row.id],
+            parent_id=row.parent_id,
+            project_id=row.project_id,
+        )
+        for row in rows
+    ]
+
+
+def query_partial_projects(*criteria):
+    """Query the projects matching the given criteria as PartialEntity instances.
+
+    Args:
+        criteria: SQLAlchemy filter criteria for the stalker.Project class.
+
+    Returns:
+        list[PartialEntity]: A list of PartialEntity instances ordered by name.
+    """
+    tasks = Task.__table__
+    root_task_counts = (
+        DBSession.query(
+            tasks.c.project_id.label("project_id"),
+            func.count(tasks.c.id).label("child_count"),
+        )
+        .filter(tasks.c.parent_id == None)  # noqa: E711
+        .group_by(tasks.c.project_id)
+        .subquery()
+    )
+    rows = (
+        DBSession.query(
+            Project.id,
+            Project.name,
+            Project.entity_type,
+            Project.status_id,
+            root_task_counts.c.child_count,
+        )
+        .outerjoin(root_task_counts, Project.id == root_task_counts.c.project_id)
+        .filter(*criteria)
+        .order_by(Project.name)
+        .all()
     )
+    return [
+        PartialEntity(
+            id=row.id,
+            name=row.name,
+            entity_type=row.entity_type,
+            status_id=row.status_id,
+            has_children=bool(row.child_count),
+            resources=[],
+            parent_id=None,
+            project_id=None,
+        )
+        for row in rows
+    ]
+
+
+def convert_to_partial_task(task=None):
+    """Convert the given task to a partial representation.
+
+    Args:
+        task (stalker.Task): A stalker.Task instance.
+
+    Returns:
+        PartialEntity: The partial task.
+    """
+    tasks = query_partial_tasks(Task.id == task.id)
+    return tasks[0] if tasks else None
 
 
 def convert_to_partial_project(project=None):
@@ -2673,19 +3997,10 @@ def convert_to_partial_project(project=None):
         project (stalker.Project): A stalker.Project instance.
 
     Returns:
-        sqlalchemy.engine.row.Row: This can be used like a dictionary.
+        PartialEntity: The partial project.
     """
-    inner_tasks = aliased(Task.__table__)
-    subquery = DBSession.query(inner_tasks.c.id).filter(
-        inner_tasks.c.project_id == Project.id
-    )
-    return DBSession.query(
-        Project.id,
-        Project.name,
-        Project.entity_type,
-        Project.status_id,
-        subquery.exists().label("has_children"),
-    ).filter(Project.id==project.id).first()
+    projects = query_partial_projects(Project.id == project.id)
+    return projects[0] if projects else None
 
 
 def partial_task_query(parent_task=None):
@@ -2699,61 +4014,122 @@ def partial_task_query(parent_task=None):
         parent_task (stalker.Task): This can be another result proxy object.
 
     Returns:
-        list[sqlalchemy.engine.row.Row]: Returns a list of sqlalchemy.engine.row.Row
-            instances which can be used like dictionaries.
+        list[PartialEntity]: Returns a list of PartialEntity instances.
     """
-    inner_tasks = aliased(Task)
-    subquery = DBSession.query(Task.id).filter(Task.id == inner_tasks.parent_id)
-    query = (
-        DBSession.query(
-            Task.id,
-            Task.name,
-            Task.entity_type,
-            Task.status_id,
-            subquery.exists().label("has_children"),
-            array_agg(User.name).label("resources"),
-        )
-        .outerjoin(Task_Resources, Task.__table__.c.id == Task_Resources.c.task_id)
-        .outerjoin(User, Task_Resources.c.resource_id == User.id)
-        .group_by(
-            Task.id,
-            Task.name,
-            Task.entity_type,
-            Task.status_id,
-            subquery.exists().label("has_children"),
-        )
-    )
     if parent_task.entity_type != "Project":
         # query child tasks
-        query = query.filter(Task.parent_id == parent_task.id)
-    else:
+        return query_partial_tasks(Task.parent_id == parent_task.id)
+
+    # query only root tasks
+    return query_partial_tasks(
+        Task.project_id == parent_task.id,
+        Task.parent_id == None,  # noqa: E711
+    )
+
+
+def partial_children_task_query(parent_tasks):
+    """Do a partial Task query for the children of all the given tasks at once.
+
+    This is the bulk version of :func:`.partial_task_query`, the children of all
+    the given tasks and projects are queried with a single query.
+
+    Args:
+        parent_tasks (list): A list of stalker.Task, stalker.Project or partial
+            task instances.
+
+    Returns:
+        dict: A dictionary of parent id and list of PartialEntity pairs ordered by
+            the task name. The root tasks of projects are stored under the project
+            id. Parents without children have an empty list.
+    """
+    parent_task_ids = []
+    project_ids = []
+    for parent_task in parent_tasks:
+        if parent_task.entity_type != "Project":
+            parent_task_ids.append(parent_task.id)
+        else:
+            project_ids.append(parent_task.id)
+
+    children = {parent_id: [] for parent_id in parent_task_ids + project_ids}
+    if not children:
+        return children
+
+    criteria = []
+    if parent_task_ids:
+        # query child tasks
+        criteria.append(Task.parent_id.in_(parent_task_ids))
+    if project_ids:
         # query only root tasks
-        query = query.filter(Task.project_id == parent_task.id).filter(
-            Task.parent_id == None  # noqa: E711
+        criteria.append(
+            and_(
+                Task.project_id.in_(project_ids),
+                Task.parent_id == None,  # noqa: E711
+            )
+        )
+
+    for task in query_partial_tasks(or_(*criteria)):
+        if task.parent_id is not None:
+            children[task.parent_id].append(task)
+        else:
+            children[task.project_id].append(task)
+    return children
+
+
+def get_task_ancestor_ids(task_ids, batch_size=500):
+    """Return the project and the ancestor ids of the given tasks.
+
+    The whole ancestor chain of all the tasks in a batch is queried with one
+    recursive query.
+
+    Args:
+        task_ids (list): A list of task ids.
+        batch_size (int): The maximum number of task ids in one query.
+
+    Returns:
+        dict: A dictionary of task id and list of ancestor id pairs. The lists
+            start with the project id and continue from the outermost parent to
+            the direct parent of the task.
+    """
+    ancestor_ids = {}
+    task_ids = list(set(task_ids))
+    for i in range(0, len(task_ids), batch_size):
+        batch_ids = task_ids[i : i + batch_size]
+        ancestors = (
+            DBSession.query(
+                Task.id.label("task_id"),
+                Task.project_id.label("project_id"),
+                Task.parent_id.label("ancestor_id"),
+                literal(0).label("depth"),
+            )
+            .filter(Task.id.in_(batch_ids))
+            .cte(name="ancestors", recursive=True)
+        )
+        ancestors = ancestors.union_all(
+            DBSession.query(
+                ancestors.c.task_id,
+                ancestors.c.project_id,
+                Task.parent_id,
+                ancestors.c.depth + 1,
+            ).filter(Task.id == ancestors.c.ancestor_id)
         )
-    return query.order_by(Task.name).all()
+        query = DBSession.query(
+            ancestors.c.task_id, ancestors.c.project_id, ancestors.c.ancestor_id
+        ).order_by(ancestors.c.task_id, ancestors.c.depth.desc())
+        for task_id, project_id, ancestor_id in query:
+            if task_id not in ancestor_ids:
+                ancestor_ids[task_id] = [project_id]
+            if ancestor_id is not None:
+                ancestor_ids[task_id].append(ancestor_id)
+    return ancestor_ids
 
 
 def partial_project_query():
     """Return all the projects in the database.
 
     Returns:
-        list[sqlalchemy.engine.row.Row]: Returns a list of sqlalchemy.engine.row.Row
-            instances which can be used like dictionaries.
+        list[PartialEntity]: Returns a list of PartialEntity instances.
     """
-    inner_tasks = aliased(Task.__table__)
-    subquery = DBSession.query(inner_tasks.c.id).filter(
-        inner_tasks.c.project_id == Project.id
-    )
-    query = DBSession.query(
-        Project.id,
-        Project.name,
-        Project.entity_type,
-        Project.status_id,
-        subquery.exists().label("has_children"),
-    )
-    query = query.order_by(Project.name)
-    return query.all()
+    return query_partial_projects()
 
 
 def get_task_hierarchy_name(task):
@@ -2798,6 +4174,36 @@ def get_unique_take_names(task_id, include_reprs=False):
     return [t[0] for t in query.distinct().order_by(Version.take_name).all()]
 
 
+def get_unique_take_names_of_tasks(task_ids, include_reprs=False):
+    """Return the unique take names of all the given tasks with a single query.
+
+    Args:
+        task_ids (list): A list of task ids.
+        include_reprs (bool): Including representations (takes with "@" in their name).
+            By default this is False.
+
+    Returns:
+        dict: A dictionary of task id and list of unique take names pairs. Tasks
+            without any versions have an empty list.
+    """
+    take_names = {task_id: [] for task_id in task_ids}
+    if not take_names:
+        return take_names
+
+    query = DBSession.query(Version.task_id, Version.take_name).filter(
+        Version.task_id.in_(list(take_names))
+    )
+    if not include_reprs:
+        from anima.representation import Representation
+        query = query.filter(~Version.take_name.contains(Representation.repr_separator))
+
+    for task_id, take_name in query.distinct().order_by(
+        Version.task_id, Version.take_name
+    ):
+        take_names[task_id].append(take_name)
+    return take_names
+
+
 def get_project_from_path(path):
     """Find project from path.
 
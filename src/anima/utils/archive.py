@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 """Archiver utilities."""
+import collections
+import hashlib
 import os
+import re
 import shutil
 import tempfile
+import threading
 import zipfile
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import anima
 from anima import logger
@@ -14,16 +21,201 @@ from stalker import Repository
 from anima.utils.progress import ProgressManagerFactory
 
 
+class ParallelZipFile(zipfile.ZipFile):
+    """A ZipFile that can also write members which are deflated elsewhere.
+
+    This allows the members to be compressed in parallel and then be written to
+    the ZIP file one after another.
+    """
+
+    def write_compressed(self, zinfo, fileobj):
+        """Write an already compressed member.
+
+        Args:
+            zinfo (zipfile.ZipInfo): The ZipInfo of the member with the
+                ``compress_type``, ``CRC``, ``file_size`` and ``compress_size``
+                already set.
+            fileobj (file): A file like object containing the compressed data.
+
+        Raises:
+            ValueError: If there is an open writing handle on the ZIP file.
+            zipfile.LargeZipFile: If the member requires ZIP64 extensions and the
+                ZIP file is opened with ``allowZip64=False``.
+        """
+        zip64 = (
+            zinfo.file_size > zipfile.ZIP64_LIMIT
+            or zinfo.compress_size > zipfile.ZIP64_LIMIT
+        )
+        if zip64 and not self._allowZip64:
+            raise zipfile.LargeZipFile("Filesize would require ZIP64 extensions")
+
+        # the same guards with ZipFile.write() and ZipFile.writestr()
+        with self._lock:
+            if self._writing:
+                raise ValueError(
+                    "Can't write to the ZIP file while there is "
+                    "another write handle open on it. "
+                    "Close the first handle before opening another."
+                )
+
+            zinfo.flag_bits = 0x00
+            self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+            self._writecheck(zinfo)
+            self._didModify = True
+
+            self.fp.write(zinfo.FileHeader(zip64))
+            shutil.copyfileobj(fileobj, self.fp)
+            self.start_dir = self.fp.tell()
+
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+
+
+class ReferenceRewriter(object):
+    """Find and rewrite the repository paths in text based scene files.
+
+    All the repository path prefixes are combined in to one compiled pattern, so
+    a file is scanned only once, line by line, and the result is written
+    straight to the destination file. The memory usage is bounded by the
+    longest line and the work is linear in the file size. It doesn't need the
+    DCC to be running, so it works for Maya ASCII files outside of Maya.
+
+    Args:
+        prefixes (List[str]): The repository path prefixes, the default is
+            ``$REPO`` and the values of the ``REPO*`` environment variables.
+        exclude_mask (List[str]): The file extensions of the references that
+            are going to be skipped.
+    """
+
+    path_chars_pattern = r"[\w\d\/_\.@\<\>]+"
+
+    def __init__(self, prefixes=None, exclude_mask=None):
+        if prefixes is None:
+            prefixes = self.default_prefixes()
+        if exclude_mask is None:
+            exclude_mask = []
+        self.exclude_mask = exclude_mask
+        # try the longer prefixes first
+        prefixes = sorted(set(prefixes), key=len, reverse=True)
+        self.regex = re.compile(
+            "(?:{}){}".format(
+                "|".join(map(re.escape, prefixes)), self.path_chars_pattern
+            )
+        )
+
+    @classmethod
+    def default_prefixes(cls):
+        """Return the default repository path prefixes.
+
+        Returns:
+            List[str]: ``$REPO`` and the values of the ``REPO*`` environment
+                variables.
+        """
+        prefixes = ["$REPO"]
+        for k, v in os.environ.items():
+            if k.startswith("REPO") and v:
+                # consider this as a repository path
+                prefixes.append(v)
+        return prefixes
+
+    def is_excluded(self, ref_path):
+        """Check if the given reference path is excluded.
+
+        Args:
+            ref_path (str): The reference path.
+
+        Returns:
+            bool: True if the reference path is excluded.
+        """
+        return os.path.splitext(ref_path)[-1] in self.exclude_mask
+
+    def find(self, data):
+        """Return the references in the given data.
+
+        Args:
+            data (str): The content of the scene file.
+
+        Returns:
+            List[str]: The unique reference paths in order of appearance.
+        """
+        ref_paths = {}
+        for ref_path in self.regex.findall(data):
+            if not self.is_excluded(ref_path):
+                ref_paths[ref_path] = None
+        return list(ref_paths)
+
+    def rewrite(self, path, new_path, get_new_ref_path):
+        """Copy the given file while rewriting the references in it.
+
+        Args:
+            path (str): The source scene file path.
+            new_path (str): The destination scene file path.
+            get_new_ref_path (Callable[[str], str]): A callable that returns the
+                new path of the given reference path, it is called only once per
+                unique reference path.
+
+        Returns:
+            List[str]: The unique reference paths in order of appearance.
+        """
+        # reference path to new reference path lookup
+        new_ref_paths = {}
+
+        def replace(match):
+            ref_path = match.group(0)
+            new_ref_path = new_ref_paths.get(ref_path)
+            if new_ref_path is None:
+                if self.is_excluded(ref_path):
+                    new_ref_path = ref_path
+                else:
+                    new_ref_path = get_new_ref_path(ref_path)
+                new_ref_paths[ref_path] = new_ref_path
+            return new_ref_path
+
+        sub = self.regex.sub
+        with open(path) as source_file, open(new_path, "w+") as new_file:
+            new_file.writelines(sub(replace, line) for line in source_file)
+
+        return [
+            ref_path for ref_path in new_ref_paths if not self.is_excluded(ref_path)
+        ]
+
+
 class ArchiverBase(object):
     """The base class for Archivers."""
 
     default_project_structure = ""
 
-    def __init__(self, exclude_mask=None, recursive_search=False):
+    # the ZIP compression level, 0 stores all the files without compression
+    compression_level = 6
+
+    # the already compressed or big binary files that barely compress, these
+    # are stored in the ZIP file without compression
+    store_extensions = [
+        ".abc",
+        ".exr",
+        ".jpeg",
+        ".jpg",
+        ".mov",
+        ".mp4",
+        ".png",
+        ".rs",
+        ".tx",
+        ".zip",
+    ]
+
+    def __init__(self, exclude_mask=None, recursive_search=False, max_workers=None):
         if exclude_mask is None:
             exclude_mask = []
         self.exclude_mask = exclude_mask
         self.recursive_search = recursive_search
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        self.max_workers = max_workers
+        self._copy_executor = None
+        self._copy_futures = []
+        self._copy_destinations = set()
+        self._copy_lock = threading.Lock()
 
     @classmethod
     def create_default_project(cls, path, name="DefaultProject"):
@@ -54,6 +246,10 @@ class ArchiverBase(object):
         It will also flatten all the referenced files, textures, image planes,
         Redshift Proxy files.
 
+        The references are walked breadth-first, every reference is processed
+        only once, and the files are copied on a bounded thread pool while the
+        references are being scanned.
+
         Args:
             paths (List[str]): A list of paths to the filed which wanted to be
                 flattened.
@@ -79,47 +275,171 @@ class ArchiverBase(object):
 
         logger.debug("creating new default project at: %s" % default_project_path)
 
-        ref_paths = []
-        for path in paths:
-            ref_paths += self._move_file_and_fix_references(
-                path, default_project_path, scenes_folder="scenes"
+        self._copy_futures = []
+        self._copy_destinations = set()
+        self._copy_executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            ref_paths = collections.deque()
+            visited_ref_paths = set()
+
+            def add_ref_paths(new_ref_paths):
+                """Add the not yet visited reference paths to the frontier.
+
+                Args:
+                    new_ref_paths (List[str]): The reference paths.
+
+                Returns:
+                    int: The number of reference paths added.
+                """
+                count = 0
+                for new_ref_path in new_ref_paths:
+                    if new_ref_path not in visited_ref_paths:
+                        visited_ref_paths.add(new_ref_path)
+                        ref_paths.append(new_ref_path)
+                        count += 1
+                return count
+
+            for path in paths:
+                add_ref_paths(
+                    self._move_file_and_fix_references(
+                        path, default_project_path, scenes_folder="scenes"
+                    )
+                )
+                progress_caller.step(message=os.path.basename(path))
+
+            progress_caller = pm.register(
+                max_iteration=len(ref_paths), title="Scan References"
             )
-            progress_caller.step(message=os.path.basename(path))
 
-        ref_paths = list(set(ref_paths))
+            while ref_paths:
+                ref_path = ref_paths.popleft()
+                # report progress upfront
+                progress_caller.step(message=os.path.basename(ref_path))
+
+                if (
+                    self.exclude_mask
+                    and os.path.splitext(ref_path)[-1] in self.exclude_mask
+                ):
+                    logger.debug("skipping: %s" % ref_path)
+                    continue
+
+                # fix different OS paths
+                for repo in all_repos:
+                    if repo.is_in_repo(ref_path):
+                        ref_path = repo.to_native_path(ref_path)
+
+                new_ref_paths = self._move_file_and_fix_references(
+                    ref_path, default_project_path, scenes_folder="scenes/refs"
+                )
+
+                # extend ref_paths with new ones
+                # and update progress caller step size
+                progress_caller.max_steps += add_ref_paths(new_ref_paths)
+
+            self._wait_copies()
+        finally:
+            self._copy_executor.shutdown(wait=True)
+            self._copy_executor = None
+
+        return default_project_path
+
+    def _copy_file(self, source, destination):
+        """Copy the given file to the destination.
+
+        While flattening the copy is scheduled on the copy thread pool,
+        otherwise it is done immediately. Every destination is copied only
+        once per flatten.
+
+        Args:
+            source (str): The source file path.
+            destination (str): The destination file path.
+        """
+        with self._copy_lock:
+            if destination in self._copy_destinations:
+                return
+            self._copy_destinations.add(destination)
+
+        if self._copy_executor is None:
+            self._do_copy_file(source, destination)
+        else:
+            self._copy_futures.append(
+                self._copy_executor.submit(self._do_copy_file, source, destination)
+            )
+
+    def _wait_copies(self):
+        """Wait the scheduled copies to finish and report the progress."""
+        if not self._copy_futures:
+            return
+
+        pm = ProgressManagerFactory.get_progress_manager()
         progress_caller = pm.register(
-            max_iteration=len(ref_paths), title="Scan References"
+            max_iteration=len(self._copy_futures), title="Copy Files"
         )
+        for future in as_completed(self._copy_futures):
+            progress_caller.step(message=os.path.basename(future.result()))
+        self._copy_futures = []
 
-        while len(ref_paths):
-            ref_path = ref_paths.pop(0)
-            # report progress upfront
-            progress_caller.step(message=os.path.basename(ref_path))
-
-            if (
-                self.exclude_mask
-                and os.path.splitext(ref_path)[-1] in self.exclude_mask
-            ):
-                logger.debug("skipping: %s" % ref_path)
-                continue
-
-            # fix different OS paths
-            for repo in all_repos:
-                if repo.is_in_repo(ref_path):
-                    ref_path = repo.to_native_path(ref_path)
-
-            new_ref_paths = self._move_file_and_fix_references(
-                ref_path, default_project_path, scenes_folder="scenes/refs"
-            )
+    @classmethod
+    def _do_copy_file(cls, source, destination):
+        """Copy the given file unless the destination is already a copy of it.
 
-            # extend ref_paths with new ones
-            for new_ref_path in new_ref_paths:
-                if new_ref_path not in ref_paths:
-                    ref_paths.append(new_ref_path)
-                    # update progress caller step size
-                    progress_caller.max_steps += 1
+        The destination is considered to be a copy of the source if their size,
+        modification time and checksum are the same.
 
-        return default_project_path
+        Args:
+            source (str): The source file path.
+            destination (str): The destination file path.
+
+        Returns:
+            str: The destination file path.
+        """
+        try:
+            if cls._is_same_file(source, destination):
+                logger.debug("skipping already copied file: {}".format(source))
+            else:
+                shutil.copy2(source, destination)
+        except (IOError, OSError):
+            logger.debug("could not copy: {}".format(source))
+        return destination
+
+    @classmethod
+    def _is_same_file(cls, source, destination):
+        """Check if the destination is a copy of the source.
+
+        Args:
+            source (str): The source file path.
+            destination (str): The destination file path.
+
+        Returns:
+            bool: True if the size, mtime and checksum of the files are the same.
+        """
+        if not os.path.isfile(destination):
+            return False
+        source_stat = os.stat(source)
+        destination_stat = os.stat(destination)
+        if (
+            source_stat.st_size != destination_stat.st_size
+            or int(source_stat.st_mtime) != int(destination_stat.st_mtime)
+        ):
+            return False
+        return cls._checksum(source) == cls._checksum(destination)
+
+    @classmethod
+    def _checksum(cls, path, block_size=1048576):
+        """Return the checksum of the given file.
+
+        Args:
+            path (str): The file path.
+            block_size (int): The number of bytes to read at once.
+
+        Returns:
+            str: The hex digest of the file content.
+        """
+        checksum = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                checksum.update(block)
+        return checksum.hexdigest()
 
     def _move_file_and_fix_references(
         self, path, project_path, scenes_folder="", refs_folder=""
@@ -151,13 +471,30 @@ class ArchiverBase(object):
         )
 
     @classmethod
-    def archive(cls, path, tempdir=None):
+    def archive(
+        cls,
+        path,
+        tempdir=None,
+        compression_level=None,
+        store_extensions=None,
+        max_workers=None,
+    ):
         """Create a zip file containing the given directory.
 
+        The files are compressed in parallel worker threads and then written to
+        the ZIP file in order. The files with one of the ``store_extensions``
+        are stored without compression.
+
         Args:
             path (str): Path to the archived directory.
             tempdir (str): The temporary dir to use for ZIP creation, the default value
                 is ``tempfile.gettempdir()``.
+            compression_level (int): The compression level between 0 and 9, the
+                default is ``ArchiverBase.compression_level``. 0 stores all the files.
+            store_extensions (List[str]): The file extensions to store without
+                compression, the default is ``ArchiverBase.store_extensions``.
+            max_workers (int): The number of compression threads, the default is
+                the number of CPUs.
 
         Returns:
             str: ZIP file path.
@@ -165,37 +502,116 @@ class ArchiverBase(object):
         if not tempdir:
             tempdir = tempfile.gettempdir()
 
+        if compression_level is None:
+            compression_level = cls.compression_level
+
+        if store_extensions is None:
+            store_extensions = cls.store_extensions
+        store_extensions = set(ext.lower() for ext in store_extensions)
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
         dir_name = os.path.basename(path)
         zip_path = os.path.join(tempdir, "%s.zip" % dir_name)
 
         parent_path = os.path.dirname(path) + "/"
 
-        max_iteration = 0
+        # (path, arch_path, compress)
+        members = []
         for current_dir_path, dir_names, file_names in os.walk(path):
-            max_iteration += len(dir_names)
-            max_iteration += len(file_names)
+            for dir_name in dir_names:
+                dir_path = os.path.join(current_dir_path, dir_name)
+                members.append((dir_path, dir_path[len(parent_path) :], False))
+
+            for file_name in file_names:
+                file_path = os.path.join(current_dir_path, file_name)
+                compress = (
+                    compression_level != 0
+                    and os.path.splitext(file_name)[-1].lower() not in store_extensions
+                )
+                members.append((file_path, file_path[len(parent_path) :], compress))
 
         pm = ProgressManagerFactory.get_progress_manager()
         progress_caller = pm.register(
-            max_iteration=max_iteration, title="Create ZIP File"
+            max_iteration=len(members), title="Create ZIP File"
         )
 
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as z:
-            for current_dir_path, dir_names, file_names in os.walk(path):
-                for dir_name in dir_names:
-                    dir_path = os.path.join(current_dir_path, dir_name)
-                    arch_path = dir_path[len(parent_path) :]
-                    z.write(dir_path, arch_path)
-                    progress_caller.step(message=dir_name)
-
-                for file_name in file_names:
-                    file_path = os.path.join(current_dir_path, file_name)
-                    arch_path = file_path[len(parent_path) :]
-                    z.write(file_path, arch_path)
-                    progress_caller.step(message=file_name)
+        # keep a limited number of compressed members waiting to be written
+        pending_members = collections.deque()
+        members = iter(members)
+
+        def schedule_members():
+            """Schedule the next members to be compressed."""
+            while len(pending_members) < max_workers * 2:
+                member = next(members, None)
+                if member is None:
+                    return
+                future = None
+                if member[2]:
+                    future = executor.submit(
+                        cls._compress_file,
+                        member[0],
+                        member[1],
+                        compression_level,
+                        tempdir,
+                    )
+                pending_members.append((member, future))
+
+        with ParallelZipFile(
+            zip_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True
+        ) as z, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            schedule_members()
+            while pending_members:
+                (member_path, arch_path, compress), future = pending_members.popleft()
+                if future is None:
+                    z.write(member_path, arch_path, compress_type=zipfile.ZIP_STORED)
+                else:
+                    zinfo, compressed_file = future.result()
+                    with compressed_file:
+                        z.write_compressed(zinfo, compressed_file)
+                progress_caller.step(message=os.path.basename(member_path))
+                schedule_members()
 
         return zip_path
 
+    @classmethod
+    def _compress_file(cls, path, arch_path, compression_level, tempdir):
+        """Deflate the given file for a ZIP file member.
+
+        Args:
+            path (str): The file path.
+            arch_path (str): The path of the file in the ZIP file.
+            compression_level (int): The compression level between 1 and 9.
+            tempdir (str): The temporary dir to store the big compressed data.
+
+        Returns:
+            (zipfile.ZipInfo, file): The ZipInfo of the member and a file like
+                object containing the compressed data.
+        """
+        zinfo = zipfile.ZipInfo.from_file(path, arch_path)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+        # raw deflate stream as it is in ZIP files
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+        compressed_file = tempfile.SpooledTemporaryFile(
+            max_size=16777216, dir=tempdir
+        )
+        crc = 0
+        file_size = 0
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1048576), b""):
+                crc = zlib.crc32(block, crc)
+                file_size += len(block)
+                compressed_file.write(compressor.compress(block))
+        compressed_file.write(compressor.flush())
+
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = compressed_file.tell()
+        compressed_file.seek(0)
+        return zinfo, compressed_file
+
 
 def archive_versions(
     versions,
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import threading
+import time
+
 
 class ProgressDialogBase(object):
     """Base class for all the other ProgressDialog variants."""
@@ -182,9 +185,38 @@ class ProgressManager(object):
     So calling ``register`` will register a new caller for the progress window. The
     ProgressManager will store the caller and will kill the ProgressDialog when all the
     callers are completed.
+
+    Updating the dialog can be more expensive than the work being tracked (i.e. the
+    Maya main progress bar repaints on every update). To throttle the updates set the
+    ``update_interval`` (in milliseconds) and/or ``update_percent`` attributes. The step
+    counters are always kept exact, but the dialog is only updated when the given
+    amount of time has passed or the progress has advanced by the given percent since
+    the last update. The last state is always flushed to the dialog before the caller
+    is ended::
+
+      # update the dialog at most every 100 ms or for every 5% of progress
+      pm = ProgressManager(update_interval=100, update_percent=5)
+
+    The manager is thread-safe, so the same caller can be stepped from worker threads.
+    As the dialogs can only be used from the thread that created them, the steps of
+    the other threads only update the counters and the pending state. The dialog is
+    updated, and the finished callers are ended, by the next :meth:`.step`,
+    :meth:`.flush` or :meth:`.end_progress` call from the thread that created the
+    dialog::
+
+      for future in as_completed(futures):
+          pm.flush()
+
+    Args:
+        dialog_class (type): A :class:`.ProgressDialogBase` derivative, default is
+            :class:`.ProgressDialogBase`.
+        update_interval (int): The minimum time in milliseconds between two dialog
+            updates. The default is 0 which updates the dialog on every step.
+        update_percent (float): The minimum progress in percent between two dialog
+            updates. The default is 0 which updates the dialog on every step.
     """
 
-    def __init__(self, dialog_class=None):
+    def __init__(self, dialog_class=None, update_interval=0, update_percent=0):
         self.in_progress = False
         self._dialog = None
         if dialog_class is None:
@@ -192,9 +224,17 @@ class ProgressManager(object):
         self.dialog_class = dialog_class
         self.callers = []
         self.title = ""
+        self._lock = threading.RLock()
         self._max_steps = 0
         self.max_steps = 0
         self.current_step = 0
+        self.update_interval = update_interval
+        self.update_percent = update_percent
+        self._last_update_time = None
+        self._last_update_step = 0
+        self._pending_update = None
+        self._dialog_thread = None
+        self._callers_to_end = []
 
     @property
     def max_steps(self):
@@ -223,6 +263,7 @@ class ProgressManager(object):
         """Create the progress dialog."""
         if self._dialog is None:
             self._dialog = self.dialog_class()
+            self._dialog_thread = threading.current_thread()
 
         self._dialog.set_range(0, self.max_steps)
         self._dialog.set_title(self.title)
@@ -253,19 +294,31 @@ class ProgressManager(object):
         """
         caller = ProgressCaller(max_steps=max_iteration, title=title)
         caller.manager = self
-        self.max_steps += max_iteration
+        with self._lock:
+            self.max_steps += max_iteration
 
-        # update the maximum
-        if not self.dialog:
-            self.create_dialog()
+            # update the maximum
+            if not self.dialog:
+                self.create_dialog()
 
-        self.dialog.set_range(0, self.max_steps)
-        self.dialog.set_current_step(self.current_step)
+            self.dialog.set_range(0, self.max_steps)
+            self.dialog.set_current_step(self.current_step)
 
-        # also store this
-        self.callers.append(caller)
+            # also store this
+            self.callers.append(caller)
         return caller
 
+    def _in_dialog_thread(self):
+        """Check if the current thread is the thread that created the dialog.
+
+        Returns:
+            bool: True if the dialog can be updated from the current thread.
+        """
+        return (
+            self._dialog_thread is None
+            or self._dialog_thread is threading.current_thread()
+        )
+
     def step(self, caller, step=1, message=""):
         """Increment the progress by the given amount.
 
@@ -275,34 +328,105 @@ class ProgressManager(object):
             step (int): The step size to increment, the default value is 1.
             message (str): The progress message as string.
         """
-        caller.current_step += step
-        self.current_step += step
-        if self.dialog:
-            self.dialog.set_current_step(self.current_step)
-            self.dialog.set_title("{} : {}".format(caller.title, message))
+        with self._lock:
+            caller.current_step += step
+            self.current_step += step
+            self._pending_update = "{} : {}".format(caller.title, message)
+            if not self._in_dialog_thread():
+                # leave the dialog to its own thread
+                if caller.current_step >= caller.max_steps:
+                    self.end_progress(caller)
+                return
+
+            if self._should_update():
+                self.flush()
+
+            if caller.current_step >= caller.max_steps:
+                # kill the caller
+                self.end_progress(caller)
+
+    def _should_update(self):
+        """Check if the dialog should be updated for the current step.
 
-        if caller.current_step >= caller.max_steps:
-            # kill the caller
-            self.end_progress(caller)
+        Returns:
+            bool: True if the throttling limits are exceeded or there are no limits,
+                False otherwise.
+        """
+        if not self.update_interval and not self.update_percent:
+            return True
+
+        if self._last_update_time is None:
+            return True
+
+        if self.update_interval:
+            elapsed = (time.time() - self._last_update_time) * 1000.0
+            if elapsed >= self.update_interval:
+                return True
+
+        if self.update_percent and self.max_steps:
+            progress = self.current_step - self._last_update_step
+            if abs(progress) * 100.0 / self.max_steps >= self.update_percent:
+                return True
+
+        return False
+
+    def flush(self):
+        """Push the pending progress state to the dialog and end the callers that
+        are finished in the other threads.
+
+        Does nothing if it is not called from the thread that created the dialog.
+        """
+        with self._lock:
+            if not self._in_dialog_thread():
+                return
+
+            if self._pending_update is not None:
+                title = self._pending_update
+                self._pending_update = None
+                self._last_update_time = time.time()
+                self._last_update_step = self.current_step
+                if self.dialog:
+                    self.dialog.set_current_step(self.current_step)
+                    self.dialog.set_title(title)
+
+            callers_to_end = self._callers_to_end
+            self._callers_to_end = []
+            for caller in callers_to_end:
+                self.end_progress(caller)
 
     def end_progress(self, caller=None):
         """End the progress for the given caller.
 
+        If it is not called from the thread that created the dialog, the caller is
+        ended by the next :meth:`.flush` call from that thread.
+
         Args:
             caller (ProgressCaller, None): A :class:`.ProgressCaller` instance.
         """
-        # remove the caller from the callers list
-        if caller in self.callers:
-            self.callers.remove(caller)
-            # also reduce the max_steps counter
-            # in case of an early kill
-            steps_left = caller.max_steps - caller.current_step
-            if steps_left > 0:
-                self.max_steps -= steps_left
-
-        if not self.callers:
-            self.max_steps = 0
-            self.current_step = 0
-            if self._dialog:
-                self._dialog.close()
-                self._dialog = None
+        with self._lock:
+            if not self._in_dialog_thread():
+                if caller not in self._callers_to_end:
+                    self._callers_to_end.append(caller)
+                return
+
+            # show the last state before removing the caller
+            self.flush()
+
+            # remove the caller from the callers list
+            if caller in self.callers:
+                self.callers.remove(caller)
+                # also reduce the max_steps counter
+                # in case of an early kill
+                steps_left = caller.max_steps - caller.current_step
+                if steps_left > 0:
+                    self.max_steps -= steps_left
+
+            if not self.callers:
+                self.max_steps = 0
+                self.current_step = 0
+                self._last_update_time = None
+                self._last_update_step = 0
+                if self._dialog:
+                    self._dialog.close()
+                    self._dialog = None
+                    self._dialog_thread = None
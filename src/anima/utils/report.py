@@ -3,6 +3,7 @@
 __version__ = "1.1.0"
 
 import os
+import re
 
 
 class NetflixReporter(object):
@@ -717,6 +718,178 @@ class NetflixReporter(object):
 
         return shot_methodologies
 
+    @classmethod
+    def get_shots(cls, scenes):
+        """Returns the shots of the given scenes with their child tasks, the child
+        task statuses, types and dependencies eagerly loaded.
+
+        The shots are looked up under the first "Shots" task of each scene and are
+        ordered by their code.
+
+        :param list scenes: A list of Stalker Task instances for the scenes.
+        :return: A dictionary with the scene ids as the keys and the list of shots of
+          that scene as the values.
+        """
+        from sqlalchemy.orm import joinedload, selectinload
+        from stalker import StatusList, Task, Shot
+        from stalker.models.task import TaskDependency
+
+        shots_by_scene_id = dict((scene.id, []) for scene in scenes)
+        if not scenes:
+            return shots_by_scene_id
+
+        shots_task_ids = {}
+        for scene_id, shots_task_id in (
+            Task.query.with_entities(Task.parent_id, Task.id)
+            .filter(Task.parent_id.in_(list(shots_by_scene_id)))
+            .filter(Task.name == "Shots")
+            .order_by(Task.id)
+        ):
+            shots_task_ids.setdefault(scene_id, shots_task_id)
+
+        if not shots_task_ids:
+            return shots_by_scene_id
+
+        scene_ids_by_shots_task_id = dict(
+            (shots_task_id, scene_id)
+            for scene_id, shots_task_id in shots_task_ids.items()
+        )
+
+        shots = (
+            Shot.query.filter(Shot.parent_id.in_(list(scene_ids_by_shots_task_id)))
+            .order_by(Shot.code)
+            .options(
+                selectinload(Shot.status_list).selectinload(StatusList.statuses),
+                selectinload(Shot.children).options(
+                    joinedload(Task.status),
+                    joinedload(Task.type),
+                    selectinload(Task.children),
+                    selectinload(Task.task_depends_to)
+                    .joinedload(TaskDependency.depends_to)
+                    .options(
+                        joinedload(Task.type),
+                        joinedload(Task.parent).joinedload(Task.type),
+                    ),
+                )
+            )
+            .all()
+        )
+        for shot in shots:
+            shots_by_scene_id[scene_ids_by_shots_task_id[shot.parent_id]].append(shot)
+
+        return shots_by_scene_id
+
+    @classmethod
+    def get_comp_or_cleanup_task(cls, shot):
+        """Returns the "Comp" task of the given shot or the "Cleanup" task if there
+        is no "Comp" task.
+
+        :param shot: A Stalker Shot instance.
+        :return: A Stalker Task instance or None.
+        """
+        child_tasks = sorted(shot.children, key=lambda x: x.id)
+        for task_name in ["Comp", "Cleanup"]:
+            for child_task in child_tasks:
+                if child_task.name == task_name:
+                    return child_task
+
+    @classmethod
+    def get_final_version_numbers(cls, task_ids):
+        """Returns the final version numbers of the given tasks.
+
+        The final version is the latest version of the take of the first version of
+        the task.
+
+        :param task_ids: A list of task ids or a query returning task ids.
+        :return: A dictionary with the task ids as the keys and the version numbers
+          as the values.
+        """
+        from sqlalchemy import func
+        from stalker import Version
+        from stalker.db.session import DBSession
+
+        first_version_ids = (
+            DBSession.query(func.min(Version.id))
+            .filter(Version.task_id.in_(task_ids))
+            .group_by(Version.task_id)
+        )
+        take_names = dict(
+            DBSession.query(Version.task_id, Version.take_name).filter(
+                Version.id.in_(first_version_ids)
+            )
+        )
+        if not take_names:
+            return {}
+
+        final_version_numbers = {}
+        for task_id, take_name, version_number in (
+            DBSession.query(
+                Version.task_id, Version.take_name, func.max(Version.version_number)
+            )
+            .filter(Version.task_id.in_(list(take_names)))
+            .group_by(Version.task_id, Version.take_name)
+        ):
+            if take_names[task_id] == take_name:
+                final_version_numbers[task_id] = version_number
+
+        return final_version_numbers
+
+    @classmethod
+    def get_logged_seconds(cls, task_ids):
+        """Returns the total logged seconds of the given tasks.
+
+        :param task_ids: A list of task ids or a query returning task ids.
+        :return: A dictionary with the task ids as the keys and the total logged
+          seconds as the values.
+        """
+        from stalker import TimeLog
+        from stalker.db.session import DBSession
+
+        logged_seconds = {}
+        for task_id, start, end in DBSession.query(
+            TimeLog.task_id, TimeLog.start, TimeLog.end
+        ).filter(TimeLog.task_id.in_(task_ids)):
+            duration = end - start
+            logged_seconds[task_id] = (
+                logged_seconds.get(task_id, 0)
+                + duration.days * 86400
+                + duration.seconds
+            )
+        return logged_seconds
+
+    @classmethod
+    def update_schedule_info(cls, shot, logged_seconds):
+        """Updates the schedule info of the given shot.
+
+        Does the same thing with ``Task.update_schedule_info()`` but uses the given
+        logged seconds for the effort based child tasks instead of querying them one
+        by one.
+
+        :param shot: A Stalker Shot instance.
+        :param dict logged_seconds: The total logged seconds of the child tasks as
+          returned by :meth:`.get_logged_seconds`.
+        """
+        if not shot.is_container:
+            shot.update_schedule_info()
+            return
+
+        schedule_seconds = 0
+        total_logged_seconds = 0
+        for child in shot.children:
+            if child.is_container:
+                child.update_schedule_info()
+                child_logged_seconds = child.total_logged_seconds
+            elif child.schedule_model == "effort":
+                child_logged_seconds = logged_seconds.get(child.id, 0)
+            else:
+                child_logged_seconds = child.total_logged_seconds
+
+            schedule_seconds += child.schedule_seconds if child.schedule_seconds else 0
+            total_logged_seconds += child_logged_seconds if child_logged_seconds else 0
+
+        shot._schedule_seconds = schedule_seconds
+        shot._total_logged_seconds = total_logged_seconds
+
     def report(
         self,
         seq,
@@ -729,6 +902,9 @@ class NetflixReporter(object):
     ):
         """Generates the report
 
+        The whole episode is loaded with a fixed number of queries and the report is
+        generated in memory.
+
         :param seq: The Sequence to generate the report of
         :param csv_output_path: The output path of the resultant CSV file
         :param vfx_turnover_to_vendor_date: The date that the picture lock has been received.
@@ -739,7 +915,7 @@ class NetflixReporter(object):
         """
         import datetime
         import pytz
-        from stalker import Task, Shot, Version, Type
+        from stalker import Task, Shot, Type
         from stalker.db.session import DBSession
         from anima.utils import do_db_setup
 
@@ -758,27 +934,30 @@ class NetflixReporter(object):
             .all()
         )
 
-        for scene in scenes:
-            shots_task = (
-                Task.query.filter(Task.name == "Shots")
-                .filter(Task.parent == scene)
-                .first()
-            )
-            for shot in (
-                Shot.query.filter(Shot.parent == shots_task).order_by(Shot.code).all()
-            ):
-
-                comp_or_cleanup_task = (
-                    Task.query.filter(Task.parent == shot)
-                    .filter(Task.name == "Comp")
-                    .first()
-                )
-                if not comp_or_cleanup_task:
-                    comp_or_cleanup_task = (
-                        Task.query.filter(Task.parent == shot)
-                        .filter(Task.name == "Cleanup")
-                        .first()
+        shots_by_scene_id = self.get_shots(scenes)
+
+        # the child tasks of all the shots in the episode
+        child_task_ids = DBSession.query(Task.id).filter(
+            Task.parent_id.in_(
+                DBSession.query(Shot.id).filter(
+                    Shot.parent_id.in_(
+                        DBSession.query(Task.id)
+                        .filter(Task.parent_id.in_([scene.id for scene in scenes]))
+                        .filter(Task.name == "Shots")
                     )
+                )
+            )
+        )
+        final_version_numbers = self.get_final_version_numbers(
+            child_task_ids.filter(Task.name.in_(["Comp", "Cleanup"]))
+        )
+        logged_seconds = self.get_logged_seconds(
+            child_task_ids.filter(Task.schedule_model == "effort")
+        )
+
+        for scene in scenes:
+            for shot in shots_by_scene_id[scene.id]:
+                comp_or_cleanup_task = self.get_comp_or_cleanup_task(shot)
                 if not comp_or_cleanup_task:
                     # no comp or cleanup task, something wrong
                     print("No Comp or CleanUp task in: %s" % shot.name)
@@ -790,12 +969,11 @@ class NetflixReporter(object):
                     and comp_or_cleanup_task.status
                     and comp_or_cleanup_task.status.code == "CMPL"
                 ):
-                    version = Version.query.filter(
-                        Version.task == comp_or_cleanup_task
-                    ).first()
-                    if version:
-                        latest_version = version.latest_version
-                        vfx_final_version = "v%03i" % latest_version.version_number
+                    version_number = final_version_numbers.get(
+                        comp_or_cleanup_task.id
+                    )
+                    if version_number is not None:
+                        vfx_final_version = "v%03i" % version_number
 
                 # {shot_cost};{currency};{report_date};{report_note}
                 total_bid_seconds = 0
@@ -808,7 +986,7 @@ class NetflixReporter(object):
                         child.bid_timing, child.bid_unit, child.schedule_model
                     )
 
-                shot.update_schedule_info()
+                self.update_schedule_info(shot, logged_seconds)
                 rendered_data = self.csv_format.format(
                     episode_number=ep.name[2:],
                     episode=ep,
@@ -863,6 +1041,9 @@ class NetflixReview(object):
     def __init__(self):
         self.outputs = []
 
+    query_batch_size = 500
+    version_name_regex = re.compile(r"^(?P<name>.+)_v(?P<version_number>[0-9]+)$")
+
     @classmethod
     def get_version_from_output(cls, output_path):
         """Returns the related Stalker Version from the given output path
@@ -870,21 +1051,144 @@ class NetflixReview(object):
         :param str output_path:
         :return:
         """
-        import os
+        return cls.get_versions_from_outputs([output_path])[0]
+
+    @classmethod
+    def get_versions_from_outputs(cls, output_paths):
+        """Returns the related Stalker Versions of the given output paths.
+
+        The version names are extracted from all the output paths up front. The
+        version names in the default ``<nice_name>_<take_name>_v<number>`` file
+        name format are split in to their version numbers and possible take names,
+        and the Versions are queried with equality matches on the
+        ``version_number`` and ``take_name`` columns, grouped by the version
+        number. These are matched to the Versions whose file name without the
+        extension is equal to the version name. The version names in any other
+        format, i.e. coming from a custom ``FilenameTemplate``, are matched to the
+        Versions whose ``full_path`` contains the version name. Both lookups run
+        one query per :attr:`.query_batch_size` names. For each output the Version
+        with the smallest ``full_path`` is returned. The task, the parent of the
+        task and its status are eagerly loaded.
+
+        :param list output_paths: A list of output paths.
+        :return: A list of Stalker Versions in the same order with the given output
+          paths, the items are None for the outputs that have no Version.
+        """
+        version_names = [
+            os.path.basename(output_path).split(".")[0] for output_path in output_paths
+        ]
+        unique_version_names = set(version_names)
+        if not unique_version_names:
+            return []
 
-        basename = os.path.basename(output_path)
-        version_name = basename.split(".")[0]
         from anima.utils import do_db_setup
 
         do_db_setup()
 
+        default_version_names = sorted(
+            version_name
+            for version_name in unique_version_names
+            if cls.version_name_regex.match(version_name)
+        )
+        other_version_names = sorted(
+            unique_version_names.difference(default_version_names)
+        )
+
+        versions_by_name = cls._get_versions_by_file_name(default_version_names)
+        versions_by_name.update(cls._get_versions_by_full_path(other_version_names))
+        return [versions_by_name.get(version_name) for version_name in version_names]
+
+    @classmethod
+    def _get_versions_query(cls):
+        """Return the base Version query of the output lookups.
+
+        :return: A Version query with the task, the parent of the task and its
+          status eagerly loaded, ordered by the ``full_path``.
+        """
+        from sqlalchemy.orm import joinedload
+        from stalker import Task, Version
+
+        return Version.query.options(
+            joinedload(Version.task).joinedload(Task.parent).joinedload(Task.status)
+        ).order_by(Version.full_path)
+
+    @classmethod
+    def _get_versions_by_file_name(cls, version_names):
+        """Returns the Versions whose file names are equal to the given version
+        names in the default ``<nice_name>_<take_name>_v<number>`` format.
+
+        :param list version_names: A list of version names matching the
+          :attr:`.version_name_regex`.
+        :return: A dictionary of version name and Version pairs.
+        """
+        from sqlalchemy import and_, or_
         from stalker import Version
 
-        return (
-            Version.query.filter(Version.full_path.contains(version_name))
-            .order_by(Version.full_path)
-            .first()
-        )
+        versions_by_name = {}
+        for i in range(0, len(version_names), cls.query_batch_size):
+            batch_version_names = version_names[i : i + cls.query_batch_size]
+
+            # group the possible take names by the version number
+            take_names_by_number = {}
+            for version_name in batch_version_names:
+                match = cls.version_name_regex.match(version_name)
+                name_parts = match.group("name").split("_")
+                take_names_by_number.setdefault(
+                    int(match.group("version_number")), set()
+                ).update(
+                    "_".join(name_parts[j:]) for j in range(len(name_parts))
+                )
+
+            query = cls._get_versions_query().filter(
+                or_(
+                    *[
+                        and_(
+                            Version.version_number == version_number,
+                            Version.take_name.in_(sorted(take_names)),
+                        )
+                        for version_number, take_names in sorted(
+                            take_names_by_number.items()
+                        )
+                    ]
+                )
+            )
+            for version in query:
+                if not version.full_path:
+                    continue
+                version_name = os.path.basename(version.full_path).split(".")[0]
+                versions_by_name.setdefault(version_name, version)
+        return versions_by_name
+
+    @classmethod
+    def _get_versions_by_full_path(cls, version_names):
+        """Returns the Versions whose ``full_path`` contains the given version
+        names.
+
+        This is the lookup of the version names that are not in the default file
+        name format.
+
+        :param list version_names: A list of version names.
+        :return: A dictionary of version name and Version pairs.
+        """
+        from sqlalchemy import or_
+        from stalker import Version
+
+        versions_by_name = {}
+        for i in range(0, len(version_names), cls.query_batch_size):
+            batch_version_names = version_names[i : i + cls.query_batch_size]
+            query = cls._get_versions_query().filter(
+                or_(
+                    *[
+                        Version.full_path.contains(version_name, autoescape=True)
+                        for version_name in batch_version_names
+                    ]
+                )
+            )
+            for version in query:
+                for version_name in batch_version_names:
+                    if version_name in version.full_path:
+                        versions_by_name.setdefault(version_name, version)
+        return versions_by_name
 
     def generate_csv(
         self, output_path="", vendor="", submission_note="", submitting_for=""
@@ -897,18 +1201,13 @@ class NetflixReview(object):
         :param submitting_for: "FINAL" or "WIP". The default value comes from the related task, if the task status is
           CMPL then it is set to "FINAL" else "WIP". If this argument is not empty then the value will be used directly.
         """
-        from anima.utils import do_db_setup
-
-        do_db_setup()
-        import os
-
         data = [
             "Version Name,Link,Scope Of Work,Vendor,Submitting For,Submission Note",
         ]
-        for output in self.outputs:
+        versions = self.get_versions_from_outputs(self.outputs)
+        for output, version in zip(self.outputs, versions):
             version_data = list()
             output_base_name = os.path.basename(output)
-            version = self.get_version_from_output(output)
             if not version:
                 continue
 
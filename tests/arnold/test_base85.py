@@ -178,3 +178,113 @@ def test_arnold_b85_encoding_real_world_data(raw_data, encoded_data, format_temp
             base85.arnold_b85_decode(encoded_data),
         )
     )
+
+
+@pytest.mark.parametrize(
+    "encoder, decoder",
+    [
+        (base85.b85_encode, base85.b85_decode),
+        (base85.rfc1924_b85_encode, base85.rfc1924_b85_decode),
+        (base85.arnold_b85_encode, base85.arnold_b85_decode),
+    ],
+)
+@pytest.mark.parametrize(
+    "raw_data",
+    [
+        b"",
+        b"\x01",
+        b"\x01\x02\x03",
+        bytes(range(256)) * 3,
+        struct.pack(b"<9f", 0.0, 1.0, 0.0, 0.0, 2.0, 1.0, 1.0, 0.5, 0.0),
+    ],
+)
+def test_numpy_engine_is_identical_to_python_engine(
+    monkeypatch, encoder, decoder, raw_data
+):
+    """testing if the NumPy engine encodes and decodes byte identical to the
+    pure Python implementation
+    """
+    pytest.importorskip("numpy")
+    numpy_encoded_data = encoder(raw_data)
+    numpy_decoded_data = decoder(numpy_encoded_data)
+
+    monkeypatch.setattr(base85, "numpy", None)
+    assert numpy_encoded_data == encoder(raw_data)
+    assert numpy_decoded_data == decoder(numpy_encoded_data)
+    assert raw_data == numpy_decoded_data[: len(raw_data)]
+
+
+def test_numpy_engine_raises_the_same_error_for_invalid_data():
+    """testing if the NumPy engine raises the same errors with the pure Python
+    implementation for malformed data
+    """
+    pytest.importorskip("numpy")
+    with pytest.raises(KeyError):
+        base85.b85_decode(b"ab cd")
+    with pytest.raises(struct.error):
+        base85.b85_decode(b"uuuuu")
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        [],
+        [b""],
+        [struct.pack(b"<4f", 0.0, 0.0, 1.0, 0.0)],
+        # special values spanning the chunks
+        [b"\x00", b"\x00\x00", b"\x00\x00\x00\x00\x00\x80?\x00", b"\x00\x00"],
+        [b"\x00\xff\x00\xff\x00\x00", b"\x00\x00\x00\x00\x00\x00\xff\x00"],
+        [struct.pack(b"<f", 1.0)[:i] for i in range(5)] * 3,
+    ],
+)
+def test_arnold_b85_encode_iter_is_identical_to_arnold_b85_encode(chunks):
+    """testing if arnold_b85_encode_iter generates the same data with
+    arnold_b85_encode for data split at any byte
+    """
+    assert base85.arnold_b85_encode(b"".join(chunks)) == b"".join(
+        base85.arnold_b85_encode_iter(iter(chunks))
+    )
+
+
+@pytest.mark.parametrize(
+    "encoder, parallel_encoder, decoder, parallel_decoder",
+    [
+        (
+            base85.b85_encode,
+            base85.b85_encode_multithreaded,
+            base85.b85_decode,
+            base85.b85_decode_multithreaded,
+        ),
+        (
+            base85.rfc1924_b85_encode,
+            base85.rfc1924_b85_encode_multithreaded,
+            base85.rfc1924_b85_decode,
+            base85.rfc1924_b85_decode_multithreaded,
+        ),
+        (
+            base85.arnold_b85_encode,
+            base85.arnold_b85_encode_multithreaded,
+            base85.arnold_b85_decode,
+            base85.arnold_b85_decode_multithreaded,
+        ),
+    ],
+)
+def test_parallel_encoders_are_identical_to_serial_encoders(
+    monkeypatch, encoder, parallel_encoder, decoder, parallel_decoder
+):
+    """testing if the parallel encoders and decoders generate the same data
+    with the serial ones
+    """
+    # use small slices to have the special values on the slice borders
+    monkeypatch.setattr(base85, "PARALLEL_MIN_SIZE", 12)
+    raw_data = b"".join(
+        [
+            bytes(range(256)),
+            b"\0" * 61,
+            struct.pack(b"<5f", 1.0, 0.0, 1.0, 1.0, 0.5),
+            bytes(range(255, 0, -3)),
+        ]
+    )
+    encoded_data = encoder(raw_data)
+    assert encoded_data == parallel_encoder(raw_data)
+    assert decoder(encoded_data) == parallel_decoder(encoded_data)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import io
+import struct
+
+import pytest
+
+from anima.render.arnold import base85, h2a
+
+
+@pytest.fixture(scope="function")
+def ass_writer():
+    """creates an AssWriter with a small chunk size writing to a BytesIO"""
+    yield h2a.AssWriter(io.BytesIO(), chunk_size=8)
+
+
+@pytest.mark.parametrize("line_length", [1, 3, 5, 500])
+@pytest.mark.parametrize(
+    "pieces", [[], [b""], [b"abcdefgh"], [b"ab", b"", b"cdefg", b"h", b"ijklmn"]]
+)
+def test_write_split_is_identical_to_split_data(ass_writer, pieces, line_length):
+    """testing if AssWriter.write_split() generates the same data with
+    split_data()
+    """
+    ass_writer.write_split(pieces, line_length)
+    data = b"".join(pieces).decode()
+    assert h2a.split_data(data, line_length) == (
+        ass_writer.file_handler.getvalue().decode()
+    )
+
+
+def test_write_encoded_is_identical_to_encoded_and_split_data(ass_writer):
+    """testing if AssWriter.write_encoded() generates the same data with
+    split_data(arnold_b85_encode())
+    """
+    positions = struct.pack(b"<12f", *([0.0, 1.0, 0.0, 0.5] * 3))
+    prime_positions = struct.pack(b"<3f", 1.0, 2.0, 0.0)
+    ass_writer.write_encoded([positions, prime_positions], 7)
+    encoded_data = base85.arnold_b85_encode(positions + prime_positions)
+    assert h2a.split_data(encoded_data.decode(), 7) == (
+        ass_writer.file_handler.getvalue().decode()
+    )
+
+
+@pytest.mark.parametrize(
+    "values, per_line, expected",
+    [
+        ([], None, ""),
+        (range(5), None, "0 1 2 3 4"),
+        (range(5), 2, "0 1\n2 3\n4"),
+        (range(4), 2, "0 1\n2 3"),
+    ],
+)
+def test_write_joined_is_working_properly(ass_writer, values, per_line, expected):
+    """testing if AssWriter.write_joined() is working properly"""
+    ass_writer.write_joined(values, per_line=per_line, batch_size=3)
+    assert expected == ass_writer.file_handler.getvalue().decode()
+
+
+def test_write_template_is_identical_to_template_formatting(ass_writer):
+    """testing if AssWriter.write_template() generates the same data with the
+    formatted template
+    """
+    template = "node\n{\n name %(name)s\n %(count)s\n%(data)s\n}"
+    ass_writer.write_template(
+        template,
+        {"name": "test", "count": 3},
+        {"data": lambda: ass_writer.write_joined(range(3))},
+    )
+    assert template % {"name": "test", "count": 3, "data": "0 1 2"} == (
+        ass_writer.file_handler.getvalue().decode()
+    )
@@ -1,64 +1,125 @@
 # -*- coding: utf-8 -*-
-"""Tests the speed of the base85 encode operation
+"""Benchmarks the serial, vectorized and parallel base85 encode and decode
+operations.
+
+Run it directly, optionally with the buffer sizes in MB to test::
+
+    python tests/arnold/test_speed.py 1 16 256 2048
+
+The pure Python serial encoder is only benchmarked up to 64 MB buffers, as it
+takes minutes for the bigger ones.
 """
-import time
+import os
 import re
-from struct import pack, unpack
+import sys
+import time
 
 from anima.render.arnold import base85
 
 
-if __name__ == "__main__":
-    repeat = 1
-    num_of_data = 50000000
+SERIAL_MAX_SIZE = 64 * 1024 * 1024
 
-    print("Repetition              : %s" % repeat)
-    print("Number of Data          : %s" % num_of_data)
 
-    start = time.time()
-    data = b"".join([pack(b"<I", i) for i in range(num_of_data)])
-    end = time.time()
-    generating_data = end - start
-    print("Generating data         : %.3f seconds" % generating_data)
+def benchmark(label, f, data):
+    """Run the given function with the data and print the throughput.
 
-    start = time.time()
-    unpacked_data = unpack(b"<%sI" % (len(data) // 4), data)
-    end = time.time()
-    unpacking_data = end - start
-    print("length of unpacked data : %s" % len(unpacked_data))
-    print("Unpacking data          : %.3f seconds" % unpacking_data)
+    Args:
+        label (str): The label of the benchmark.
+        f: The function to be benchmarked.
+        data (bytes): The data to pass to the function.
 
-    print("******** NORMAL ********")
+    Returns:
+        bytes: The result of the function.
+    """
     start = time.time()
-    normal_encoded_data = base85.arnold_b85_encode(data)
-    end = time.time()
-    encode_duration = end - start
-    print("Encoding %3i times took : %.3f seconds" % (repeat, encode_duration))
-    print("Averaging               : %.3f seconds" % (encode_duration / repeat))
+    result = f(data)
+    duration = time.time() - start
+    print(
+        "%-24s: %8.3f seconds %10.1f MB/s"
+        % (label, duration, len(data) / 1048576.0 / max(duration, 1e-9))
+    )
+    return result
 
-    print("**** MULTI-THREADED ****")
-    start = time.time()
-    thread_encoded_data = base85.arnold_b85_encode_multithreaded(data)
-    end = time.time()
-    encode_duration = end - start
-    print("Encoding %3i times took : %.3f seconds" % (repeat, encode_duration))
-    print("Averaging               : %.3f seconds" % (encode_duration / repeat))
 
-    assert normal_encoded_data == thread_encoded_data
+def run_python_engine(f):
+    """Return a function that runs f with the pure Python engine.
+
+    Args:
+        f: The function to run.
+    """
+
+    def wrapper(data):
+        numpy = base85.numpy
+        base85.numpy = None
+        try:
+            return f(data)
+        finally:
+            base85.numpy = numpy
+
+    return wrapper
+
+
+if __name__ == "__main__":
+    sizes_in_mb = [int(size) for size in sys.argv[1:]] or [1, 16, 256, 2048]
+
+    for size_in_mb in sizes_in_mb:
+        size = size_in_mb * 1024 * 1024
+        print("******** %s MB ********" % size_in_mb)
+        # mix the special values in
+        data = b"".join([os.urandom(size // 2), b"\0" * (size - size // 2)])
+
+        if size <= SERIAL_MAX_SIZE:
+            serial_encoded_data = benchmark(
+                "Serial encode",
+                run_python_engine(base85.arnold_b85_encode),
+                data,
+            )
+        else:
+            serial_encoded_data = None
+
+        encoded_data = benchmark(
+            "Vectorized encode", base85.arnold_b85_encode, data
+        )
+        parallel_encoded_data = benchmark(
+            "Parallel encode", base85.arnold_b85_encode_multithreaded, data
+        )
+        assert encoded_data == parallel_encoded_data
+        assert serial_encoded_data in (None, encoded_data)
+        del serial_encoded_data
+        del parallel_encoded_data
+
+        if size <= SERIAL_MAX_SIZE:
+            benchmark(
+                "Serial decode",
+                run_python_engine(base85.arnold_b85_decode),
+                encoded_data,
+            )
+        decoded_data = benchmark(
+            "Vectorized decode", base85.arnold_b85_decode, encoded_data
+        )
+        assert data == decoded_data
+        del decoded_data
+        parallel_decoded_data = benchmark(
+            "Parallel decode",
+            base85.arnold_b85_decode_multithreaded,
+            encoded_data,
+        )
+        assert data == parallel_decoded_data
+        del parallel_decoded_data
 
     print("************************")
     print("Test Regex vs List Append")
     print("Splitting with RegEx")
     start = time.time()
-    regex_splitted_data = re.sub(b"(.{500})", b"\\1\n", normal_encoded_data, 0)
+    regex_splitted_data = re.sub(b"(.{500})", b"\\1\n", encoded_data, 0)
     end = time.time()
     print("Using RegEx             : %.3f seconds" % (end - start))
 
     print("Splitting with List Appends")
     start = time.time()
     list_splitted_data = []
-    for i in range(0, len(normal_encoded_data), 500):
-        list_splitted_data.append(normal_encoded_data[i : i + 500])
+    for i in range(0, len(encoded_data), 500):
+        list_splitted_data.append(encoded_data[i : i + 500])
     list_splitted_data = b"\n".join(list_splitted_data)
     end = time.time()
     print("Using List Append       : %.3f seconds" % (end - start))
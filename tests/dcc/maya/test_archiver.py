@@ -952,3 +952,117 @@ def test_bind_to_original_will_bind_the_references_to_their_original_counter_par
     assert all_refs[0].unresolvedPath() == data["asset2_model_take1_v001"].full_path
     assert all_refs[1].unresolvedPath() == data["asset2_model_take1_v001"].full_path
     assert all_refs[2].unresolvedPath() == data["asset2_model_take1_v001"].full_path
+
+
+def create_version_with_file_name(project, task_name, take_name="Main"):
+    """creates a Version under a new task in the given project and returns it"""
+    from stalker import Task, Version
+    from stalker.db.session import DBSession
+
+    task = Task(name=task_name, project=project)
+    DBSession.add(task)
+    DBSession.commit()
+    version = Version(task=task, take_name=take_name)
+    DBSession.add(version)
+    DBSession.commit()
+    version.update_paths()
+    version.extension = ".ma"
+    DBSession.commit()
+    return version
+
+
+def test_find_versions_by_file_name_searches_the_given_project_first(
+    create_test_db, create_project
+):
+    """testing if _find_versions_by_file_name returns the Version of the given
+    project when more than one project has a Version with the same file name
+    """
+    from stalker import Project
+
+    project1 = create_project
+    project2 = Project.query.filter(Project.code == "TP2").first()
+    version1 = create_version_with_file_name(project1, "Layout")
+    version2 = create_version_with_file_name(project2, "Layout")
+    assert version1.filename == version2.filename
+
+    result = Archiver._find_versions_by_file_name(
+        [version1.filename], project=project2
+    )
+    assert result == {version2.filename: version2}
+
+    result = Archiver._find_versions_by_file_name(
+        [version1.filename], project=project1
+    )
+    assert result == {version1.filename: version1}
+
+
+def test_find_versions_by_file_name_falls_back_to_the_other_projects(
+    create_test_db, create_project
+):
+    """testing if _find_versions_by_file_name searches all the projects ordered
+    by Project.date_created for the file names that are not in the given
+    project
+    """
+    import datetime
+    from stalker import Project
+    from stalker.db.session import DBSession
+
+    project1 = create_project
+    project2 = Project.query.filter(Project.code == "TP2").first()
+    version1 = create_version_with_file_name(project1, "Layout")
+    version2 = create_version_with_file_name(project2, "Layout")
+    version3 = create_version_with_file_name(project2, "Lighting")
+
+    # the file is only in the second project
+    result = Archiver._find_versions_by_file_name(
+        [version3.filename], project=project1
+    )
+    assert result == {version3.filename: version3}
+
+    # the oldest project wins
+    project2.date_created = project1.date_created - datetime.timedelta(days=1)
+    DBSession.commit()
+    result = Archiver._find_versions_by_file_name([version1.filename])
+    assert result == {version2.filename: version2}
+
+    project2.date_created = project1.date_created + datetime.timedelta(days=1)
+    DBSession.commit()
+    result = Archiver._find_versions_by_file_name([version1.filename])
+    assert result == {version1.filename: version1}
+
+
+def test_find_versions_by_file_name_with_underscores_in_the_file_names(
+    create_test_db, create_project
+):
+    """testing if _find_versions_by_file_name doesn't treat the underscores in
+    the file names as a wildcard
+    """
+    from sqlalchemy import event
+    from stalker.db.session import DBSession
+
+    project = create_project
+    version1 = create_version_with_file_name(project, "Char_Model")
+    version2 = create_version_with_file_name(project, "CharXModel")
+    assert version1.filename.replace("_", "X", 1) == version2.filename
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    engine = DBSession.connection().engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = Archiver._find_versions_by_file_name(
+            [version1.filename, "missing_file.ma"], project=project
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert result == {version1.filename: version1}
+    # the underscores are escaped in the LIKE patterns
+    assert any(
+        "ESCAPE '/'" in statement
+        and version1.filename.replace("_", "/_") in parameters
+        for statement, parameters in statements
+    )
@@ -551,3 +551,206 @@ def test_trim_repo_path_with_multiple_repositories(create_test_db):
         '/Volumes/S/TP2/Test_Task_1/Test_Task_1_Main_v001'
     )
     assert trimmed_path == expected_value2
+
+
+class ReferenceTestDCC(DCCBase):
+    """A DCC that returns the inputs of its version as the references."""
+
+    def deep_version_inputs_update(self):
+        pass
+
+    def get_current_version(self):
+        return self._version
+
+    def get_referenced_versions(self, parent_ref=None):
+        return self._version.inputs
+
+
+def test_check_referenced_versions_resolves_deep_references(
+    create_test_db, create_project
+):
+    """testing if check_referenced_versions resolves the deep references from
+    the deepest to the shallowest
+    """
+    leaf_tasks = [
+        t for t in Task.query.filter(Task.project == create_project).all()
+        if t.is_leaf
+    ]
+    model_task, rig_task, layout_task, scene_task = leaf_tasks[:4]
+
+    model_v1 = Version(task=model_task)
+    model_v1.is_published = True
+    model_v2 = Version(task=model_task)
+    model_v2.is_published = True
+    rig_v1 = Version(task=rig_task, inputs=[model_v1])
+    rig_v1.is_published = True
+    rig_v2 = Version(task=rig_task, inputs=[model_v2])
+    rig_v2.is_published = True
+    layout_v1 = Version(task=layout_task, inputs=[rig_v1])
+    layout_v1.is_published = True
+    scene_v1 = Version(task=scene_task, inputs=[layout_v1, model_v2])
+    DBSession.add_all(
+        [model_v1, model_v2, rig_v1, rig_v2, layout_v1, scene_v1]
+    )
+    DBSession.commit()
+
+    dcc = ReferenceTestDCC(version=scene_v1)
+    result = dcc.check_referenced_versions()
+
+    assert sorted(result.pop("root"), key=lambda x: x.id) == [model_v2, layout_v1]
+    assert result == {
+        "leave": [model_v2],
+        "update": [model_v1, rig_v1],
+        "create": [layout_v1],
+    }
+
+
+def test_check_referenced_versions_resolves_multiple_referenced_versions(
+    create_test_db, create_project
+):
+    """testing if check_referenced_versions lists a version that is
+    referenced multiple times with the same action
+    """
+    leaf_tasks = [
+        t for t in Task.query.filter(Task.project == create_project).all()
+        if t.is_leaf
+    ]
+    model_task, rig_task, layout_task, scene_task = leaf_tasks[:4]
+
+    model_v1 = Version(task=model_task)
+    model_v1.is_published = True
+    model_v2 = Version(task=model_task)
+    model_v2.is_published = True
+    rig_v1 = Version(task=rig_task, inputs=[model_v1])
+    rig_v1.is_published = True
+    layout_v1 = Version(task=layout_task, inputs=[model_v1])
+    layout_v1.is_published = True
+    scene_v1 = Version(task=scene_task, inputs=[rig_v1, layout_v1])
+    DBSession.add_all([model_v1, model_v2, rig_v1, layout_v1, scene_v1])
+    DBSession.commit()
+
+    dcc = ReferenceTestDCC(version=scene_v1)
+    result = dcc.check_referenced_versions()
+
+    assert sorted(result.pop("root"), key=lambda x: x.id) == [rig_v1, layout_v1]
+    assert sorted(result.pop("create"), key=lambda x: x.id) == [rig_v1, layout_v1]
+    assert result == {"leave": [], "update": [model_v1, model_v1]}
+
+
+def test_get_versions_from_full_paths_returns_versions_in_order(
+    create_test_db, create_project
+):
+    """testing if get_versions_from_full_paths returns the versions of the
+    given paths in the same order and None for unknown paths
+    """
+    task = [
+        t for t in Task.query.filter(Task.project == create_project).all()
+        if t.is_leaf
+    ][0]
+    version1 = Version(task=task)
+    DBSession.add(version1)
+    DBSession.commit()
+    version1.update_paths()
+    version2 = Version(task=task)
+    DBSession.add(version2)
+    DBSession.commit()
+    version2.update_paths()
+    DBSession.commit()
+
+    result = DCCBase.get_versions_from_full_paths(
+        [
+            version2.absolute_full_path,
+            None,
+            "/some/unknown/path.ma",
+            version1.absolute_full_path,
+            version2.absolute_full_path,
+        ]
+    )
+    assert result == [version2, None, None, version1, version2]
+
+
+def test_get_version_from_full_path_uses_the_version_path_cache(
+    create_test_db, create_project
+):
+    """testing if get_version_from_full_path uses the VersionPathCache and the
+    cache is invalidated when the version is renamed
+    """
+    from sqlalchemy import event
+
+    task = [
+        t for t in Task.query.filter(Task.project == create_project).all()
+        if t.is_leaf
+    ][0]
+    version1 = Version(task=task)
+    DBSession.add(version1)
+    DBSession.commit()
+    version1.update_paths()
+    DBSession.commit()
+    full_path = version1.absolute_full_path
+
+    assert DCCBase.get_version_from_full_path(full_path) == version1
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args, **kwargs):
+        if '"Versions"' in statement:
+            statements.append(statement)
+
+    engine = DBSession.connection().engine
+    event.listen(engine, "before_cursor_execute", count_statements)
+    try:
+        assert DCCBase.get_version_from_full_path(full_path) == version1
+        assert statements == []
+
+        # rename the version
+        version1.take_name = "Renamed"
+        version1.update_paths()
+        DBSession.commit()
+        assert DCCBase.get_version_from_full_path(full_path) is None
+        assert (
+            DCCBase.get_version_from_full_path(version1.absolute_full_path)
+            == version1
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statements)
+
+
+def test_get_versions_from_full_paths_queries_cached_versions_by_id(
+    create_test_db, create_project
+):
+    """testing if get_versions_from_full_paths queries the cached versions that
+    are not in the session only by their ids
+    """
+    from sqlalchemy import event
+
+    task = [
+        t for t in Task.query.filter(Task.project == create_project).all()
+        if t.is_leaf
+    ][0]
+    version1 = Version(task=task)
+    DBSession.add(version1)
+    DBSession.commit()
+    version1.update_paths()
+    DBSession.commit()
+    version1_id = version1.id
+    full_path = version1.absolute_full_path
+
+    assert DCCBase.get_versions_from_full_paths([full_path])[0] == version1
+    DBSession.expunge_all()
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args, **kwargs):
+        if '"Versions"' in statement:
+            statements.append(statement)
+
+    engine = DBSession.connection().engine
+    event.listen(engine, "before_cursor_execute", count_statements)
+    try:
+        result = DCCBase.get_versions_from_full_paths([full_path])
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statements)
+
+    assert result[0].id == version1_id
+    assert len(statements) == 1
+    assert '"Versions".full_path IN' not in statements[0]
@@ -474,3 +474,52 @@ class TrackTestCase(unittest.TestCase):
             expected_xml,
             t.to_xml()
         )
+
+    def test_optimize_clips_makes_clip_ids_unique(self):
+        """testing if the optimize_clips method will give unique ids to the
+        clips with the same ids
+        """
+        t = Track()
+        for i, id_ in enumerate(
+            ['shot1', 'shot1', 'shot2', 'shot1 2', 'shot1', 'shot2', 'shot 3 x']
+        ):
+            c = Clip()
+            c.id = id_
+            c.file = File(pathurl='file:///tmp/shot%s.mov' % (i % 2))
+            t.clips.append(c)
+
+        t.optimize_clips()
+
+        self.assertEqual(
+            ['shot1', 'shot1 2', 'shot2', 'shot1 3', 'shot1 4', 'shot2 2',
+             'shot 3 x'],
+            [c.id for c in t.clips]
+        )
+        self.assertIs(t.clips[0].file, t.clips[2].file)
+        self.assertIs(t.clips[1].file, t.clips[3].file)
+        self.assertIsNot(t.clips[0].file, t.clips[1].file)
+
+    def test_write_xml_writes_the_same_xml_with_to_xml(self):
+        """testing if the write_xml method writes the same xml with the to_xml
+        method to the given stream
+        """
+        import io
+
+        def create_track():
+            t = Track()
+            for i in range(4):
+                c = Clip(id='shot%s' % i, name='shot%s' % i, start=i * 10,
+                         end=i * 10 + 10, duration=10, out=10)
+                c.file = File(duration=10, name='shot%s' % i,
+                              pathurl='file:///tmp/shot%s.mov' % (i % 2))
+                t.clips.append(c)
+            t.optimize_clips()
+            return t
+
+        stream = io.StringIO()
+        create_track().write_xml(stream, indentation=4, pre_indent=2)
+
+        self.assertEqual(
+            create_track().to_xml(indentation=4, pre_indent=2),
+            stream.getvalue()
+        )
@@ -287,3 +287,279 @@ def test_registering_to_multiple_types_with_lists(prepare_publishers):
     called = []
     run_publishers("Test3")
     assert called == ["func4", "func2", "func3"]
+
+
+def test_run_publishers_runs_the_dependencies_first(prepare_publishers):
+    """testing if run_publishers runs the dependencies of a publisher before
+    it
+    """
+    called = []
+
+    @publisher("Test", depends=["func2"])
+    def func1():
+        called.append("func1")
+
+    @publisher("Test")
+    def func2():
+        called.append("func2")
+
+    run_publishers("Test")
+    assert called == ["func2", "func1"]
+
+
+def test_run_publishers_raises_the_first_error(prepare_publishers):
+    """testing if run_publishers raises the error of the first failing
+    publisher and doesn't run the rest
+    """
+    called = []
+
+    @publisher("Test")
+    def func1():
+        raise RuntimeError("func1 failed")
+
+    @publisher("Test")
+    def func2():
+        called.append("func2")
+
+    with pytest.raises(RuntimeError) as cm:
+        run_publishers("Test")
+
+    assert str(cm.value) == "func1 failed"
+    assert called == []
+
+
+def test_publisher_engine_skips_publishers_with_failing_dependencies(
+    prepare_publishers,
+):
+    """testing if PublisherEngine skips the publishers whose dependencies did
+    not pass and runs the others
+    """
+    from anima.publish import PublisherEngine, PublisherResult
+
+    @publisher("Test")
+    def func1():
+        raise RuntimeError("func1 failed")
+
+    @publisher("Test", depends=[func1])
+    def func2():
+        pass
+
+    @publisher("Test")
+    def func3():
+        pass
+
+    results = PublisherEngine([func1, func2, func3]).run()
+    assert list(results) == [func1, func2, func3]
+    assert results[func1].state == PublisherResult.FAILED
+    assert isinstance(results[func1].exception, RuntimeError)
+    assert "func1 failed" in results[func1].traceback
+    assert results[func2].state == PublisherResult.SKIPPED
+    assert results[func3].state == PublisherResult.PASSED
+
+
+def test_publisher_engine_raises_value_error_for_circular_dependencies(
+    prepare_publishers,
+):
+    """testing if PublisherEngine raises a ValueError for circular
+    dependencies
+    """
+    from anima.publish import PublisherEngine
+
+    @publisher("Test", depends=["func2"])
+    def func1():
+        pass
+
+    @publisher("Test", depends=["func1"])
+    def func2():
+        pass
+
+    with pytest.raises(ValueError) as cm:
+        PublisherEngine([func1, func2]).run()
+
+    assert str(cm.value) == "Circular publisher dependency: func1 -> func2 -> func1"
+
+
+def test_publisher_engine_shares_the_snapshot_data(prepare_publishers):
+    """testing if the snapshot data is generated once for the read-only
+    publishers and generated again after a publisher that modifies the scene
+    """
+    from anima.publish import PublisherEngine, SceneSnapshot
+
+    provider_calls = []
+    seen_data = []
+
+    def get_nodes(snapshot):
+        provider_calls.append("nodes")
+        return len(provider_calls)
+
+    @publisher("Test", requires=["nodes"], read_only=True)
+    def func1(snapshot=None):
+        seen_data.append(snapshot.get("nodes"))
+
+    @publisher("Test", requires=["nodes"], read_only=True)
+    def func2(snapshot=None):
+        seen_data.append(snapshot.get("nodes"))
+
+    @publisher("Test")
+    def func3():
+        """modifies the scene"""
+
+    @publisher("Test", requires=["nodes"], read_only=True)
+    def func4(snapshot=None):
+        seen_data.append(snapshot["nodes"])
+
+    snapshot = SceneSnapshot(providers={"nodes": get_nodes})
+    results = PublisherEngine([func1, func2, func3, func4], snapshot=snapshot).run()
+    assert all(result.passed for result in results.values())
+    assert seen_data == [1, 1, 2]
+
+
+def test_publisher_engine_runs_read_only_publishers_concurrently(
+    prepare_publishers,
+):
+    """testing if PublisherEngine runs the read-only publishers concurrently
+    when max_workers is bigger than 1
+    """
+    import threading
+    from anima.publish import PublisherEngine
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    @publisher("Test", read_only=True)
+    def func1():
+        barrier.wait()
+
+    @publisher("Test", read_only=True)
+    def func2():
+        barrier.wait()
+
+    results = PublisherEngine([func1, func2], max_workers=2).run()
+    assert all(result.passed for result in results.values())
+
+
+def test_publisher_history_records_the_durations(prepare_publishers, tmp_path):
+    """testing if PublisherHistory records and restores the durations of the
+    publishers
+    """
+    import time
+    from anima.publish import PublisherEngine, PublisherHistory
+
+    @publisher("Test")
+    def func1():
+        time.sleep(0.05)
+
+    @publisher("Test")
+    def func2():
+        raise RuntimeError("func2 failed")
+
+    history_path = str(tmp_path / "publisher_history.json")
+    history = PublisherHistory(history_path)
+    PublisherEngine([func1, func2], history=history).run()
+    PublisherEngine([func1, func2], history=history).run()
+
+    history = PublisherHistory(history_path)
+    entry = history.get_entry(func1)
+    assert len(entry["durations"]) == 2
+    assert entry["state"] == "passed"
+    assert history.get_entry(func2)["state"] == "failed"
+    assert history.get_average_duration(func1) >= 0.05
+    slowest = history.get_slowest(1)
+    assert slowest[0][0] == PublisherHistory.get_key(func1)
+
+
+def test_publisher_engine_reuses_the_results_with_unchanged_fingerprints(
+    prepare_publishers,
+):
+    """testing if PublisherEngine reruns only the publishers whose fingerprint
+    changed or that failed the last time
+    """
+    from anima.publish import PublisherEngine, PublisherResultCache, SceneSnapshot
+
+    scene = {"nodes": ["node1", "node2"], "bad_nodes": ["node3"]}
+    called = []
+
+    @publisher(
+        "Test",
+        requires=["nodes"],
+        read_only=True,
+        fingerprint=lambda snapshot: snapshot.get("nodes"),
+    )
+    def func1(snapshot=None):
+        called.append("func1")
+
+    @publisher("Test", fingerprint=lambda snapshot: len(scene["bad_nodes"]))
+    def func2():
+        called.append("func2")
+        if scene["bad_nodes"]:
+            raise RuntimeError("there are bad nodes")
+
+    @publisher("Test")
+    def func3():
+        """doesn't declare a fingerprint"""
+        called.append("func3")
+
+    result_cache = PublisherResultCache()
+
+    def run(use_cache=True):
+        snapshot = SceneSnapshot(providers={"nodes": lambda s: list(scene["nodes"])})
+        engine = PublisherEngine(
+            [func1, func2, func3], snapshot=snapshot, result_cache=result_cache
+        )
+        return engine.run(use_cache=use_cache)
+
+    results = run()
+    assert called == ["func1", "func2", "func3"]
+    assert not any(result.cached for result in results.values())
+    assert results[func2].passed is False
+
+    # nothing changed, the failing one and the one without a fingerprint run
+    called = []
+    results = run()
+    assert called == ["func2", "func3"]
+    assert results[func1].cached is True
+    assert results[func1].passed is True
+
+    # fix the failing one
+    scene["bad_nodes"] = []
+    called = []
+    results = run()
+    assert called == ["func2", "func3"]
+    assert results[func2].passed is True
+
+    # change the input of func1
+    scene["nodes"].append("node4")
+    called = []
+    results = run()
+    assert called == ["func1", "func3"]
+    assert results[func1].cached is False
+    assert results[func2].cached is True
+
+    # force all to run
+    called = []
+    run(use_cache=False)
+    assert called == ["func1", "func2", "func3"]
+
+
+def test_publisher_engine_runs_publishers_with_failing_fingerprints(
+    prepare_publishers,
+):
+    """testing if PublisherEngine runs the publishers normally if their
+    fingerprint can not be generated
+    """
+    from anima.publish import PublisherEngine, PublisherResultCache
+
+    called = []
+
+    def broken_fingerprint(snapshot):
+        raise RuntimeError("broken")
+
+    @publisher("Test", fingerprint=broken_fingerprint)
+    def func1():
+        called.append("func1")
+
+    result_cache = PublisherResultCache()
+    for _ in range(2):
+        results = PublisherEngine([func1], result_cache=result_cache).run()
+        assert results[func1].passed is True
+        assert results[func1].cached is False
+    assert called == ["func1", "func1"]
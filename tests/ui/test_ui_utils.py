@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import sys
+
+import pytest
+
+
+@pytest.fixture(scope="function")
+def graphics_view(monkeypatch):
+    """returns a QGraphicsView and stores the asynchronous thumbnail requests
+    instead of decoding the images
+    """
+    from anima.ui.lib import QtWidgets
+    from anima.ui.utils import ThumbnailService
+
+    app = QtWidgets.QApplication.instance()
+    if not app:
+        app = QtWidgets.QApplication(sys.argv)
+
+    requests = []
+
+    def request_pixmap(full_path, width, height, callback):
+        requests.append((full_path, callback))
+
+    monkeypatch.setattr(ThumbnailService, "request_pixmap", request_pixmap)
+
+    view = QtWidgets.QGraphicsView()
+    view.thumbnail_requests = requests
+    yield view
+    view.deleteLater()
+
+
+def test_update_graphics_view_with_entity_thumbnail_ignores_late_results(
+    graphics_view, monkeypatch
+):
+    """testing if the pending thumbnail of the previous entity is not shown in
+    the graphics view when the current entity has no thumbnail
+    """
+    import anima.utils
+    from stalker import SimpleEntity
+    from anima.ui.lib import QtGui
+    from anima.ui.utils import update_graphics_view_with_entity_thumbnail
+
+    entity_a = SimpleEntity(name="Entity A")
+    entity_a.id = 1
+    entity_b = SimpleEntity(name="Entity B")
+    entity_b.id = 2
+    thumbnail_paths = {1: "/tmp/entity_a.png", 2: None}
+    monkeypatch.setattr(
+        anima.utils,
+        "get_nearest_thumbnail_paths",
+        lambda entities: {e.id: thumbnail_paths[e.id] for e in entities},
+    )
+
+    update_graphics_view_with_entity_thumbnail(entity_a, graphics_view)
+    assert len(graphics_view.thumbnail_requests) == 1
+    update_graphics_view_with_entity_thumbnail(entity_b, graphics_view)
+    assert len(graphics_view.thumbnail_requests) == 1
+    assert not graphics_view.property("thumbnail_full_path")
+
+    # the decoding of the first thumbnail finishes late
+    pixmap = QtGui.QPixmap(10, 10)
+    graphics_view.thumbnail_requests[0][1](pixmap)
+    assert graphics_view.scene().items() == []
+
+    # the same for the entities that are not a SimpleEntity
+    update_graphics_view_with_entity_thumbnail(entity_a, graphics_view)
+    update_graphics_view_with_entity_thumbnail(None, graphics_view)
+    assert not graphics_view.property("thumbnail_full_path")
+    graphics_view.thumbnail_requests[1][1](pixmap)
+    assert graphics_view.scene().items() == []
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+
+import pytest
+
+from anima.utils.archive import ArchiverBase
+
+
+class DummyArchiver(ArchiverBase):
+    """An archiver that reads the references from a dictionary."""
+
+    default_project_structure = """scenes
+scenes/refs"""
+
+    def __init__(self, references, **kwargs):
+        super(DummyArchiver, self).__init__(**kwargs)
+        self.references = references
+        self.visited_paths = []
+
+    def _move_file_and_fix_references(
+        self, path, project_path, scenes_folder="", refs_folder=""
+    ):
+        self.visited_paths.append(path)
+        self._copy_file(
+            path, os.path.join(project_path, scenes_folder, os.path.basename(path))
+        )
+        return self.references.get(path, [])
+
+
+@pytest.fixture(scope="function")
+def create_scene_files(tmpdir):
+    """creates dummy scene files referencing each other"""
+    source_dir = tmpdir.mkdir("source")
+    paths = {}
+    for name in ["shot.ma", "char.ma", "env.ma", "tex1.exr", "tex2.exr"]:
+        path = source_dir.join(name)
+        path.write(name * 1000)
+        paths[name] = str(path)
+
+    references = {
+        paths["shot.ma"]: [paths["char.ma"], paths["env.ma"]],
+        # a cycle and a shared texture
+        paths["char.ma"]: [paths["tex1.exr"], paths["env.ma"], paths["shot.ma"]],
+        paths["env.ma"]: [paths["tex1.exr"], paths["tex2.exr"], paths["char.ma"]],
+    }
+    yield paths, references, str(tmpdir.mkdir("temp"))
+
+
+def test_flatten_visits_every_reference_only_once(create_test_db, create_scene_files):
+    """testing if ArchiverBase.flatten() visits every reference only once"""
+    paths, references, tempdir = create_scene_files
+    archiver = DummyArchiver(references)
+    project_path = archiver.flatten([paths["shot.ma"]], tempdir=tempdir)
+
+    # the root scene is also flattened in to the refs folder as it is
+    # referenced by char.ma
+    assert sorted(archiver.visited_paths) == sorted(
+        list(paths.values()) + [paths["shot.ma"]]
+    )
+    # breadth-first
+    assert archiver.visited_paths[:4] == [
+        paths["shot.ma"],
+        paths["char.ma"],
+        paths["env.ma"],
+        paths["tex1.exr"],
+    ]
+    assert sorted(os.listdir(os.path.join(project_path, "scenes/refs"))) == [
+        "char.ma",
+        "env.ma",
+        "shot.ma",
+        "tex1.exr",
+        "tex2.exr",
+    ]
+
+
+def test_flatten_skips_files_that_are_already_copied(
+    create_test_db, create_scene_files, monkeypatch
+):
+    """testing if ArchiverBase.flatten() skips the files that are already
+    copied with the same size, mtime and checksum
+    """
+    paths, references, tempdir = create_scene_files
+    archiver = DummyArchiver(references, max_workers=2)
+    project_path = archiver.flatten([paths["shot.ma"]], tempdir=tempdir)
+
+    # change one of the textures
+    with open(paths["tex2.exr"], "w") as f:
+        f.write("changed")
+
+    copied_paths = []
+
+    def copy2(source, destination):
+        copied_paths.append(source)
+        return shutil.copy(source, destination)
+
+    monkeypatch.setattr(shutil, "copy2", copy2)
+    archiver.flatten([paths["shot.ma"]], tempdir=tempdir)
+    assert copied_paths == [paths["tex2.exr"]]
+
+    with open(os.path.join(project_path, "scenes/refs/tex2.exr")) as f:
+        assert f.read() == "changed"
+
+
+@pytest.fixture(scope="function")
+def create_project_folder(tmpdir):
+    """creates a project folder to be archived"""
+    project_dir = tmpdir.mkdir("temp").mkdir("Project")
+    project_dir.mkdir("empty")
+    project_dir.mkdir("scenes")
+    file_contents = {
+        "Project/scenes/shot.ma": b"requires maya\n" * 10000,
+        "Project/scenes/plate.EXR": b"exr data" * 1000,
+        "Project/scenes/hair.abc": b"abc data" * 1000,
+        "Project/workspace.mel": b"",
+    }
+    for arch_path, content in file_contents.items():
+        tmpdir.join("temp", arch_path).write_binary(content)
+    yield str(project_dir), str(tmpdir.mkdir("zip")), file_contents
+
+
+def test_archive_stores_already_compressed_files(create_project_folder):
+    """testing if ArchiverBase.archive() deflates the files and stores the
+    files with one of the store_extensions
+    """
+    import zipfile
+
+    project_path, tempdir, file_contents = create_project_folder
+    zip_path = ArchiverBase.archive(project_path, tempdir=tempdir, max_workers=2)
+
+    with zipfile.ZipFile(zip_path) as z:
+        assert z.testzip() is None
+        assert sorted(z.namelist()) == sorted(
+            list(file_contents) + ["Project/empty/", "Project/scenes/"]
+        )
+        for arch_path, content in file_contents.items():
+            assert z.read(arch_path) == content
+        compress_types = {
+            zinfo.filename: zinfo.compress_type for zinfo in z.infolist()
+        }
+
+    assert compress_types["Project/scenes/shot.ma"] == zipfile.ZIP_DEFLATED
+    assert compress_types["Project/scenes/plate.EXR"] == zipfile.ZIP_STORED
+    assert compress_types["Project/scenes/hair.abc"] == zipfile.ZIP_STORED
+
+
+def test_archive_compression_level_and_store_extensions(create_project_folder):
+    """testing if ArchiverBase.archive() uses the given compression level and
+    store_extensions
+    """
+    import zipfile
+
+    project_path, tempdir, file_contents = create_project_folder
+    zip_path = ArchiverBase.archive(
+        project_path, tempdir=tempdir, compression_level=9, store_extensions=[".ma"]
+    )
+    with zipfile.ZipFile(zip_path) as z:
+        assert z.getinfo("Project/scenes/shot.ma").compress_type == zipfile.ZIP_STORED
+        assert (
+            z.getinfo("Project/scenes/plate.EXR").compress_type
+            == zipfile.ZIP_DEFLATED
+        )
+        for arch_path, content in file_contents.items():
+            assert z.read(arch_path) == content
+
+    zip_path = ArchiverBase.archive(project_path, tempdir=tempdir, compression_level=0)
+    with zipfile.ZipFile(zip_path) as z:
+        assert set(zinfo.compress_type for zinfo in z.infolist()) == {
+            zipfile.ZIP_STORED
+        }
+
+
+def test_reference_rewriter_rewrites_references_in_a_single_pass(tmpdir, monkeypatch):
+    """testing if ReferenceRewriter.rewrite() rewrites all the references and
+    returns the unique reference paths
+    """
+    from anima.utils.archive import ReferenceRewriter
+
+    monkeypatch.setenv("REPOTR", "/mnt/T/")
+    source = tmpdir.join("shot.ma")
+    source.write(
+        "//Maya ASCII 2022 scene\n"
+        'file -rdi 1 -rfn "charRN" "$REPOTR/TP/Char/char.ma";\n'
+        'file -r -rfn "charRN" "/mnt/T/TP/Char/char.ma";\n'
+        'setAttr ".ftn" -type "string" "$REPOTR/TP/Tex/diffuse.<udim>.exr";\n'
+        'setAttr ".ftn" -type "string" "/mnt/T/TP/Tex/skip.psd";\n'
+    )
+    destination = tmpdir.join("new_shot.ma")
+
+    calls = []
+
+    def get_new_ref_path(ref_path):
+        calls.append(ref_path)
+        return "scenes/refs/{}".format(ref_path.split("/")[-1])
+
+    rewriter = ReferenceRewriter(exclude_mask=[".psd"])
+    ref_paths = rewriter.rewrite(str(source), str(destination), get_new_ref_path)
+
+    assert ref_paths == [
+        "$REPOTR/TP/Char/char.ma",
+        "/mnt/T/TP/Char/char.ma",
+        "$REPOTR/TP/Tex/diffuse.<udim>.exr",
+    ]
+    assert calls == ref_paths
+    assert destination.read() == (
+        "//Maya ASCII 2022 scene\n"
+        'file -rdi 1 -rfn "charRN" "scenes/refs/char.ma";\n'
+        'file -r -rfn "charRN" "scenes/refs/char.ma";\n'
+        'setAttr ".ftn" -type "string" "scenes/refs/diffuse.<udim>.exr";\n'
+        'setAttr ".ftn" -type "string" "/mnt/T/TP/Tex/skip.psd";\n'
+    )
+    assert rewriter.find(source.read()) == ref_paths
+
+
+def write_members(zip_path, contents, **kwargs):
+    """writes the given contents to a ParallelZipFile with write_compressed,
+    alternating the stored and deflated members
+    """
+    import io
+    import zipfile
+    import zlib
+    from anima.utils.archive import ParallelZipFile
+
+    with ParallelZipFile(zip_path, "w", **kwargs) as z:
+        for i, (arch_path, content) in enumerate(sorted(contents.items())):
+            zinfo = zipfile.ZipInfo(arch_path)
+            zinfo.file_size = len(content)
+            zinfo.CRC = zlib.crc32(content)
+            if i % 2:
+                zinfo.compress_type = zipfile.ZIP_STORED
+                data = content
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                data = compressor.compress(content) + compressor.flush()
+            zinfo.compress_size = len(data)
+            z.write_compressed(zinfo, io.BytesIO(data))
+
+
+@pytest.mark.parametrize("zip64_limit", [None, 1024])
+def test_parallel_zip_file_write_compressed_writes_valid_members(
+    tmpdir, monkeypatch, zip64_limit
+):
+    """testing if ParallelZipFile.write_compressed writes valid stored and
+    deflated members, also when the members require ZIP64 extensions
+    """
+    import zipfile
+
+    if zip64_limit is not None:
+        # pretend the members are bigger than 4 GB
+        monkeypatch.setattr(zipfile, "ZIP64_LIMIT", zip64_limit)
+
+    contents = {
+        "Project/scenes/shot%s.ma" % i: ("shot%s " % i).encode() * (500 * (i + 1))
+        for i in range(4)
+    }
+    zip_path = str(tmpdir.join("test.zip"))
+    write_members(zip_path, contents)
+
+    with zipfile.ZipFile(zip_path) as z:
+        assert z.testzip() is None
+        assert sorted(z.namelist()) == sorted(contents)
+        assert set(zinfo.compress_type for zinfo in z.infolist()) == {
+            zipfile.ZIP_STORED,
+            zipfile.ZIP_DEFLATED,
+        }
+        for arch_path, content in contents.items():
+            assert z.read(arch_path) == content
+            if zip64_limit is not None:
+                # the ZIP64 extra field is written
+                assert z.getinfo(arch_path).extra
+
+    if zip64_limit is not None:
+        with pytest.raises(zipfile.LargeZipFile):
+            write_members(str(tmpdir.join("test2.zip")), contents, allowZip64=False)
+
+
+def test_parallel_zip_file_write_compressed_with_an_open_write_handle(tmpdir):
+    """testing if ParallelZipFile.write_compressed raises a ValueError when there
+    is an open write handle on the ZIP file
+    """
+    import io
+    import zipfile
+    from anima.utils.archive import ParallelZipFile
+
+    with ParallelZipFile(str(tmpdir.join("test.zip")), "w") as z:
+        with z.open("first.txt", "w") as f:
+            f.write(b"data")
+            zinfo = zipfile.ZipInfo("second.txt")
+            zinfo.file_size = zinfo.compress_size = 4
+            with pytest.raises(ValueError):
+                z.write_compressed(zinfo, io.BytesIO(b"data"))
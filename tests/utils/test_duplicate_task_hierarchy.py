@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+
+def test_generate_unique_shot_name_uses_existing_shot_names(create_test_db):
+    """testing if generate_unique_shot_name checks the candidates against the
+    given existing shot names and adds the generated name to them
+    """
+    from anima.utils import generate_unique_shot_name
+
+    existing_shot_names = {"Ep001_001_0010", "Ep001_001_0020"}
+    result = generate_unique_shot_name(
+        None, "Ep001_001_0010", existing_shot_names=existing_shot_names
+    )
+    assert result == "Ep001_001_0030"
+    assert "Ep001_001_0030" in existing_shot_names
+
+    result = generate_unique_shot_name(
+        None, "Ep001_001_0010", existing_shot_names=existing_shot_names
+    )
+    assert result == "Ep001_001_0040"
+
+
+def test_duplicate_task_hierarchy_duplicates_the_hierarchy(
+    create_test_db, create_project
+):
+    """testing if duplicate_task_hierarchy duplicates the whole hierarchy with
+    unique shot names and maps the dependencies to the duplicates
+    """
+    from stalker import Task, User
+    from stalker.db.session import DBSession
+    from anima.utils import duplicate_task_hierarchy
+
+    user = User(name="Test User", login="tuser", email="t@u.com", password="pass")
+    DBSession.add(user)
+
+    shots_task = Task.query.filter(Task.name == "Shots").first()
+    model_task = Task.query.filter(Task.name == "Model").first()
+    for shot in shots_task.children:
+        child_tasks = {t.name: t for t in shot.children}
+        child_tasks["Anim"].depends = [child_tasks["Camera"], model_task]
+    DBSession.commit()
+
+    shot_names = sorted(shot.name for shot in shots_task.children)
+
+    dup_tasks = duplicate_task_hierarchy(
+        shots_task, None, "Shots Copy", "Duplicated", user, number_of_copies=2
+    )
+
+    assert len(dup_tasks) == 2
+    all_dup_shot_names = []
+    for dup_task in dup_tasks:
+        assert dup_task.name == "Shots Copy"
+        assert dup_task.description == "Duplicated"
+        assert dup_task.parent == shots_task.parent
+        assert len(dup_task.children) == len(shots_task.children)
+        for dup_shot in dup_task.children:
+            assert dup_shot.entity_type == "Shot"
+            all_dup_shot_names.append(dup_shot.name)
+            child_tasks = {t.name: t for t in dup_shot.children}
+            assert sorted(t.id for t in child_tasks["Anim"].depends) == sorted(
+                [model_task.id, child_tasks["Camera"].id]
+            )
+
+    # all shot names are unique
+    assert len(set(all_dup_shot_names + shot_names)) == len(
+        all_dup_shot_names + shot_names
+    )
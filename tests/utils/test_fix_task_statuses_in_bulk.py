@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytz
+
+
+def test_fix_task_statuses_in_bulk_matches_fix_task_statuses(
+    create_test_db, create_project
+):
+    """testing if fix_task_statuses_in_bulk gives the same statuses, schedule
+    info and computed times with calling fix_task_statuses for every task
+    """
+    from stalker import Project, Status, Task, TimeLog, User
+    from stalker.db.session import DBSession
+    from anima.utils import (
+        fix_task_computed_time,
+        fix_task_statuses,
+        fix_task_statuses_in_bulk,
+    )
+
+    user = User(name="Test User", login="tuser", email="t@u.com", password="pass")
+    DBSession.add(user)
+
+    project = Project.query.filter(Project.code == "TP").first()
+    tasks = Task.query.filter(Task.project == project).all()
+    leaf_tasks = [task for task in tasks if task.is_leaf]
+    for task in leaf_tasks:
+        task.resources = [user]
+
+    shots_task = Task.query.filter(Task.name == "Shots").first()
+    model_task = Task.query.filter(Task.name == "Model").first()
+    for shot in shots_task.children:
+        child_tasks = {t.name: t for t in shot.children}
+        child_tasks["Anim"].depends = [child_tasks["Camera"], model_task]
+    DBSession.commit()
+
+    now = datetime.datetime.now(pytz.utc).replace(
+        hour=10, minute=0, second=0, microsecond=0
+    )
+    start = now - datetime.timedelta(days=3)
+    DBSession.add_all(
+        [
+            TimeLog(
+                task=model_task,
+                resource=user,
+                start=start,
+                end=start + datetime.timedelta(hours=2),
+            ),
+            TimeLog(
+                task=model_task,
+                resource=user,
+                start=start + datetime.timedelta(days=1),
+                end=start + datetime.timedelta(days=1, hours=3),
+            ),
+        ]
+    )
+    DBSession.commit()
+
+    # break the statuses
+    status_cmpl = Status.query.filter(Status.code == "CMPL").first()
+    status_wip = Status.query.filter(Status.code == "WIP").first()
+    model_task.status = status_cmpl
+    for task in tasks:
+        if not task.is_leaf:
+            task.status = status_wip
+    DBSession.commit()
+
+    def get_state():
+        return {
+            task.id: (
+                task.status.code,
+                task.schedule_seconds,
+                task.total_logged_seconds,
+                task.computed_start,
+                task.computed_end,
+            )
+            for task in Task.query.filter(Task.project == project).all()
+        }
+
+    # fix the tasks one by one, the leaves first
+    fixed_tasks = fix_task_statuses_in_bulk(project)
+    assert len(fixed_tasks) == len(tasks)
+    DBSession.rollback()
+
+    for task in fixed_tasks:
+        task = Task.query.get(task.id)
+        fix_task_statuses(task)
+        fix_task_computed_time(task)
+    DBSession.flush()
+    expected_state = get_state()
+    DBSession.rollback()
+
+    fix_task_statuses_in_bulk(project)
+    assert get_state() == expected_state
+    assert model_task.status.code == "CMPL"
+    assert model_task.computed_start == start
+    assert model_task.computed_end == start + datetime.timedelta(days=1, hours=3)
+    assert model_task.total_logged_seconds == 5 * 3600
+
+
+def test_fix_task_statuses_in_bulk_with_a_task(create_test_db, create_project):
+    """testing if fix_task_statuses_in_bulk only fixes the given task and its
+    descendants when a task is given
+    """
+    from stalker import Task
+    from anima.utils import fix_task_statuses_in_bulk
+
+    shots_task = Task.query.filter(Task.name == "Shots").first()
+    descendant_ids = set()
+    parents = [shots_task]
+    while parents:
+        parent = parents.pop()
+        descendant_ids.add(parent.id)
+        parents.extend(parent.children)
+
+    fixed_tasks = fix_task_statuses_in_bulk(shots_task, batch_size=3)
+    assert set(task.id for task in fixed_tasks) == descendant_ids
+    assert fixed_tasks[-1] is shots_task
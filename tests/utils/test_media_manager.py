@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+
+PROBE_OUTPUT = {
+    "streams": [
+        {
+            "index": 0,
+            "codec_type": "video",
+            "width": 1920,
+            "height": 1080,
+            "r_frame_rate": "25/1",
+            "nb_frames": "250",
+            "disposition": {"default": 1},
+            "tags": {"language": "und"},
+            "side_data_list": [{"side_data_type": "Display Matrix"}],
+        },
+        {"index": 1, "codec_type": "audio", "sample_rate": "48000"},
+    ],
+    "format": {
+        "filename": "test.mov",
+        "duration": "10.000000",
+        "tags": {"framerate": "25"},
+    },
+}
+
+
+@pytest.fixture(scope="function")
+def media_manager(tmpdir, monkeypatch):
+    """returns a MediaManager instance which doesn't run the real ffprobe and
+    uses a temp media info cache
+    """
+    from anima.utils import MediaManager
+
+    mm = MediaManager()
+    mm.media_info_cache_path = str(tmpdir.join("media_info"))
+    mm.ffprobe_calls = []
+
+    def ffprobe(**kwargs):
+        mm.ffprobe_calls.append(kwargs)
+        return [line + "\n" for line in json.dumps(PROBE_OUTPUT, indent=2).split("\n")]
+
+    monkeypatch.setattr(mm, "ffprobe", ffprobe)
+    yield mm
+
+
+def test_get_video_info_runs_ffprobe_once(media_manager, tmpdir):
+    """testing if get_video_info runs ffprobe only once and returns the stream
+    and format info in the ffprobe default output format
+    """
+    video_path = tmpdir.join("test.mov")
+    video_path.write("not a video")
+
+    media_info = media_manager.get_video_info(str(video_path))
+    assert len(media_manager.ffprobe_calls) == 1
+    assert media_manager.ffprobe_calls[0]["i"] == str(video_path)
+    assert media_info["video_info"] == {
+        "filename": "test.mov",
+        "duration": "10.000000",
+        "TAG:framerate": "25",
+    }
+    assert media_info["stream_info"] == [
+        {
+            "index": "0",
+            "codec_type": "video",
+            "width": "1920",
+            "height": "1080",
+            "r_frame_rate": "25/1",
+            "nb_frames": "250",
+            "DISPOSITION:default": "1",
+            "TAG:language": "und",
+        },
+        {"index": "1", "codec_type": "audio", "sample_rate": "48000"},
+    ]
+
+
+def test_probe_caches_the_result_on_disk(media_manager, tmpdir):
+    """testing if the probe results are cached on disk and the cache is
+    invalidated when the file changes
+    """
+    import os
+    from anima.utils import MediaManager
+
+    video_path = tmpdir.join("test.mov")
+    video_path.write("not a video")
+
+    assert media_manager.probe(str(video_path)) == PROBE_OUTPUT
+    assert media_manager.probe(str(video_path)) == PROBE_OUTPUT
+    assert len(media_manager.ffprobe_calls) == 1
+
+    # a new instance uses the same cache
+    mm2 = MediaManager()
+    mm2.media_info_cache_path = media_manager.media_info_cache_path
+    mm2.ffprobe = media_manager.ffprobe
+    assert mm2.probe(str(video_path)) == PROBE_OUTPUT
+    assert len(media_manager.ffprobe_calls) == 1
+
+    # changing the file invalidates the cache and overwrites the cache file
+    video_path.write("still not a video but longer")
+    assert media_manager.probe(str(video_path)) == PROBE_OUTPUT
+    assert len(media_manager.ffprobe_calls) == 2
+    assert len(os.listdir(media_manager.media_info_cache_path)) == 1
+    assert media_manager.probe(str(video_path)) == PROBE_OUTPUT
+    assert len(media_manager.ffprobe_calls) == 2
+
+
+def test_probe_evicts_the_least_recently_used_cache_files(media_manager, tmpdir):
+    """testing if the least recently used media info cache files are removed
+    when there are more than media_info_cache_max_count files
+    """
+    import os
+
+    media_manager.media_info_cache_max_count = 2
+    paths = []
+    for i in range(3):
+        video_path = tmpdir.join("test%s.mov" % i)
+        video_path.write("not a video %s" % i)
+        paths.append(str(video_path))
+
+    media_manager.probe(paths[0])
+    media_manager.probe(paths[1])
+    # mark the first one as the oldest and then use it again
+    cache_file_paths = [media_manager.get_media_info_cache_file_path(p) for p in paths]
+    os.utime(cache_file_paths[0], (1, 1))
+    os.utime(cache_file_paths[1], (2, 2))
+    media_manager.probe(paths[0])
+    assert len(media_manager.ffprobe_calls) == 2
+
+    media_manager.probe(paths[2])
+    assert sorted(os.listdir(media_manager.media_info_cache_path)) == sorted(
+        os.path.basename(p) for p in [cache_file_paths[0], cache_file_paths[2]]
+    )
+
+    media_manager.probe(paths[1])
+    assert len(media_manager.ffprobe_calls) == 4
+    assert len(os.listdir(media_manager.media_info_cache_path)) == 2
+
+
+def test_probe_many_probes_the_unique_paths(media_manager, tmpdir):
+    """testing if probe_many probes each unique path once and returns the
+    results in the given order
+    """
+    paths = []
+    for i in range(5):
+        video_path = tmpdir.join("test%s.mov" % i)
+        video_path.write("not a video %s" % i)
+        paths.append(str(video_path))
+
+    result = media_manager.probe_many(paths + paths[:2], max_workers=3)
+    assert result == [PROBE_OUTPUT] * 7
+    assert sorted(call["i"] for call in media_manager.ffprobe_calls) == sorted(paths)
+
+
+def test_generate_video_thumbnail_extracts_the_frames_in_one_call(
+    media_manager, tmpdir, monkeypatch
+):
+    """testing if generate_video_thumbnail seeks to the frames by timestamp and
+    composites them with a single ffmpeg call
+    """
+    video_path = str(tmpdir.join("test.mov"))
+    ffmpeg_calls = []
+
+    def ffmpeg(**kwargs):
+        ffmpeg_calls.append(kwargs)
+        with open(kwargs["o"], "w") as f:
+            f.write("thumbnail")
+
+    monkeypatch.setattr(media_manager, "ffmpeg", ffmpeg)
+    thumbnail_path = media_manager.generate_video_thumbnail(video_path)
+
+    assert len(ffmpeg_calls) == 1
+    assert ffmpeg_calls[0]["o"] == thumbnail_path
+    assert ffmpeg_calls[0]["i"] == [video_path] * 3
+    assert ffmpeg_calls[0]["ss"] == ["1.000", "5.000", "9.000"]
+    assert ffmpeg_calls[0]["filter_complex"] == media_manager.thumbnail_filter_complex
+    os.remove(thumbnail_path)
+
+
+def test_generate_video_thumbnail_falls_back_to_frame_select(
+    media_manager, tmpdir, monkeypatch
+):
+    """testing if generate_video_thumbnail falls back to selecting the frames if
+    the single pass fails
+    """
+    video_path = str(tmpdir.join("test.mov"))
+    ffmpeg_calls = []
+
+    def ffmpeg(**kwargs):
+        ffmpeg_calls.append(kwargs)
+        if "ss" not in kwargs:
+            with open(kwargs["o"], "w") as f:
+                f.write("thumbnail")
+
+    monkeypatch.setattr(media_manager, "ffmpeg", ffmpeg)
+    thumbnail_path = media_manager.generate_video_thumbnail(video_path)
+
+    assert len(ffmpeg_calls) == 5
+    assert ffmpeg_calls[-1]["o"] == thumbnail_path
+    assert ffmpeg_calls[2]["vf"] == "select='eq(n,125)'"
+    os.remove(thumbnail_path)
+
+
+@pytest.fixture(scope="function")
+def media_job_manager(create_test_db, create_project, tmpdir, monkeypatch):
+    """returns a MediaManager which runs the media jobs on a thread pool and
+    fakes the media generation, and sets the repository path to a temp folder
+    """
+    import io
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from stalker import Repository
+    from stalker.db.session import DBSession
+    from anima.utils import MediaManager
+
+    repo = Repository.query.first()
+    repo.linux_path = str(tmpdir.join("repo"))
+    DBSession.commit()
+
+    release = threading.Event()
+    release.set()
+
+    def generate(suffix):
+        def f(self, file_full_path):
+            release.wait()
+            extension = os.path.splitext(file_full_path)[-1]
+            if extension not in [".png", ".mov"]:
+                raise RuntimeError("not an image nor a video")
+            temp_path = str(
+                tmpdir.join("%s%s" % (os.path.basename(file_full_path), suffix))
+            )
+            with open(temp_path, "w") as f:
+                f.write("media")
+            return temp_path
+
+        return f
+
+    monkeypatch.setattr(MediaManager, "generate_media_for_web", generate(".webm"))
+    monkeypatch.setattr(MediaManager, "generate_thumbnail", generate(".jpg"))
+    monkeypatch.setattr(MediaManager, "media_job_executor_class", ThreadPoolExecutor)
+    monkeypatch.setattr(MediaManager, "_media_job_executor", None)
+    monkeypatch.setattr(MediaManager, "_media_jobs", {})
+
+    mm = MediaManager()
+    mm.release = release
+    mm.file_object = io.BytesIO(b"reference data")
+    yield mm
+    release.set()
+    MediaManager.shutdown_media_jobs()
+
+
+def test_upload_reference_async_attaches_the_links_when_finished(
+    media_job_manager,
+):
+    """testing if upload_reference_async creates the reference Link immediately
+    and attaches the web version and thumbnail Links when the job is finished
+    """
+    from stalker import Task
+    from anima.utils import MediaJob, MediaManager
+
+    mm = media_job_manager
+    task = Task.query.filter(Task.name == "Comp").first()
+    finished_jobs = []
+
+    mm.release.clear()
+    job = mm.upload_reference_async(
+        task, mm.file_object, "reference.mov", callback=finished_jobs.append
+    )
+    assert job.link in task.references
+    assert os.path.exists(job.file_full_path)
+    assert job.link.thumbnail is None
+    assert MediaManager.get_media_job(job.id) is job
+    assert MediaManager.get_media_job_status(job.id) in [
+        MediaJob.PENDING,
+        MediaJob.RUNNING,
+    ]
+    assert MediaManager.wait_media_jobs(timeout=0.1) is False
+
+    mm.release.set()
+    assert job.wait(10) is True
+    assert job.status == MediaJob.DONE
+    assert finished_jobs == [job]
+    # the links are attached in the waiting thread
+    assert job.link.thumbnail is None
+    assert MediaManager.wait_media_jobs(timeout=10) is True
+    assert job.links_attached is True
+
+    web_version_link = job.link.thumbnail
+    assert web_version_link.original_filename == "reference.webm"
+    assert web_version_link.full_path.endswith("ForWeb/reference.webm")
+    assert web_version_link.thumbnail.original_filename == "reference.jpg"
+    assert os.path.exists(job.thumbnail_full_path)
+
+    # the waited jobs are unregistered
+    assert MediaManager.get_media_job(job.id) is None
+    assert MediaManager.get_media_job_status(job.id) is None
+    assert MediaManager.clear_finished_media_jobs() == []
+
+
+def test_upload_reference_async_job_fails_for_unsupported_files(
+    media_job_manager,
+):
+    """testing if the media job fails for the references which are not an image
+    or video file
+    """
+    from stalker import Task
+    from anima.utils import MediaJob
+
+    mm = media_job_manager
+    task = Task.query.filter(Task.name == "Comp").first()
+    job = mm.upload_reference_async(task, mm.file_object, "reference.txt")
+    assert mm.wait_media_jobs([job], timeout=10) is True
+    assert job.status == MediaJob.FAILED
+    assert isinstance(job.error, RuntimeError)
+    assert job.links_attached is False
+    assert job.link.thumbnail is None
+
+
+def test_upload_version_output_async_skips_unsupported_files(media_job_manager):
+    """testing if upload_version_output_async skips the media generation of the
+    outputs which are not an image or video file
+    """
+    from stalker import Repository, Version
+    from anima.utils import MediaJob
+
+    mm = media_job_manager
+    version = Version.query.first()
+    version.update_paths()
+    jobs = [
+        mm.upload_version_output_async(version, mm.file_object, "output.png"),
+        mm.upload_version_output_async(version, mm.file_object, "output.edl"),
+    ]
+    assert mm.wait_media_jobs(jobs, timeout=10) is True
+    assert [job.status for job in jobs] == [MediaJob.DONE, MediaJob.DONE]
+    assert jobs[0].link.thumbnail.original_filename == "output.png"
+    assert jobs[0].link.thumbnail.full_path == Repository.to_os_independent_path(
+        jobs[0].web_version_full_path
+    )
+    assert jobs[0].link.thumbnail.thumbnail.full_path.endswith("Thumbnail/output.jpg")
+    assert jobs[1].link.thumbnail is None
+    assert [job.link for job in jobs] == version.outputs[-2:]
+
+
+def test_media_jobs_run_on_the_process_pool(
+    create_test_db, create_project, tmpdir, monkeypatch
+):
+    """testing if the media jobs run on the real process pool and the finished
+    jobs are unregistered when they are waited
+    """
+    import io
+    from concurrent.futures import ProcessPoolExecutor
+    from stalker import Repository, Task, Version
+    from stalker.db.session import DBSession
+    from anima.utils import MediaJob, MediaManager
+
+    repo = Repository.query.first()
+    repo.linux_path = str(tmpdir.join("repo"))
+    DBSession.commit()
+
+    monkeypatch.setattr(MediaManager, "media_job_max_workers", 1)
+    monkeypatch.setattr(MediaManager, "_media_job_executor", None)
+    monkeypatch.setattr(MediaManager, "_media_jobs", {})
+
+    mm = MediaManager()
+    try:
+        assert MediaManager.media_job_executor_class is ProcessPoolExecutor
+        version = Version.query.first()
+        version.update_paths()
+        task = Task.query.filter(Task.name == "Comp").first()
+        jobs = [
+            mm.upload_version_output_async(
+                version, io.BytesIO(b"edl data"), "output.edl"
+            ),
+            mm.upload_reference_async(task, io.BytesIO(b"text"), "reference.txt"),
+        ]
+        assert isinstance(mm.get_media_job_executor(), ProcessPoolExecutor)
+        assert mm.wait_media_jobs(jobs, timeout=60) is True
+    finally:
+        MediaManager.shutdown_media_jobs()
+
+    # the unsupported output is skipped
+    assert jobs[0].status == MediaJob.DONE
+    assert jobs[0].web_version_full_path is None
+    assert jobs[0].thumbnail_full_path is None
+    assert jobs[0].link.thumbnail is None
+    # the error is carried back from the worker process
+    assert jobs[1].status == MediaJob.FAILED
+    assert isinstance(jobs[1].error, RuntimeError)
+    assert MediaManager.get_media_job(jobs[0].id) is None
+    assert MediaManager.get_media_job(jobs[1].id) is None
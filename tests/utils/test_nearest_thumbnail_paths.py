@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+
+def test_get_nearest_thumbnail_paths_uses_the_nearest_ancestor_thumbnail(
+    create_test_db, create_project, tmp_path
+):
+    """testing if get_nearest_thumbnail_paths returns the thumbnail of the
+    nearest ancestor for the tasks without a thumbnail
+    """
+    from stalker import Link, Shot, Task
+    from stalker.db.session import DBSession
+    from anima.utils import get_nearest_thumbnail_paths
+
+    shots_task_thumbnail_path = str(tmp_path / "shots.jpg")
+    shot_thumbnail_path = str(tmp_path / "shot.jpg")
+    for path in [shots_task_thumbnail_path, shot_thumbnail_path]:
+        with open(path, "wb") as f:
+            f.write(b"")
+
+    project = create_project
+    shots_task = Task.query.filter(Task.project == project).filter(
+        Task.name == "Shots"
+    ).first()
+    shots_task.thumbnail = Link(full_path=shots_task_thumbnail_path)
+    shot1, shot2 = Shot.query.filter(Shot.project == project).order_by(Shot.id)[:2]
+    shot1.thumbnail = Link(full_path=shot_thumbnail_path)
+    missing_thumbnail_task = shot2.children[0]
+    missing_thumbnail_task.thumbnail = Link(
+        full_path=str(tmp_path / "missing.jpg")
+    )
+    DBSession.commit()
+
+    tasks = shot1.children + shot2.children
+    result = get_nearest_thumbnail_paths(tasks + [shots_task.parent], batch_size=2)
+
+    for task in shot1.children:
+        assert result[task.id] == shot_thumbnail_path
+    for task in shot2.children:
+        if task is missing_thumbnail_task:
+            assert result[task.id] is None
+        else:
+            assert result[task.id] == shots_task_thumbnail_path
+    assert result[shots_task.parent.id] is None
+
+
+def test_get_nearest_thumbnail_paths_uses_the_entity_thumbnail(
+    create_test_db, tmp_path
+):
+    """testing if get_nearest_thumbnail_paths returns the thumbnail of
+    the non task entities
+    """
+    from stalker import Link, User
+    from stalker.db.session import DBSession
+    from anima.utils import get_nearest_thumbnail_paths
+
+    thumbnail_path = str(tmp_path / "user.jpg")
+    with open(thumbnail_path, "wb") as f:
+        f.write(b"")
+
+    user1 = User(name="User 1", login="user1", email="u1@u.com", password="pass")
+    user1.thumbnail = Link(full_path=thumbnail_path)
+    user2 = User(name="User 2", login="user2", email="u2@u.com", password="pass")
+    DBSession.add_all([user1, user2])
+    DBSession.commit()
+
+    result = get_nearest_thumbnail_paths([user1, user2])
+    assert result == {user1.id: thumbnail_path, user2.id: None}
+
+
+def test_get_nearest_thumbnail_paths_resolves_the_hierarchy_with_one_query(
+    create_test_db, create_project, tmp_path
+):
+    """testing if get_nearest_thumbnail_paths resolves the whole ancestor chain
+    of all the tasks with one query
+    """
+    from sqlalchemy import event
+    from stalker import Link, Task
+    from stalker.db.session import DBSession
+    from anima.utils import get_nearest_thumbnail_paths
+
+    thumbnail_path = str(tmp_path / "assets.jpg")
+    with open(thumbnail_path, "wb") as f:
+        f.write(b"")
+
+    project = create_project
+    assets_task = Task.query.filter(Task.project == project).filter(
+        Task.name == "Assets"
+    ).first()
+    assets_task.thumbnail = Link(full_path=thumbnail_path)
+    DBSession.commit()
+
+    # the Model tasks are three levels below the Assets task
+    model_tasks = Task.query.filter(Task.project == project).filter(
+        Task.name == "Model"
+    ).all()
+    assert len(model_tasks) > 1
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = DBSession.connection().engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = get_nearest_thumbnail_paths(model_tasks)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert len(statements) == 1
+    assert result == {task.id: thumbnail_path for task in model_tasks}
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+
+def test_get_unique_take_names_of_tasks(create_test_db, create_project):
+    """testing if get_unique_take_names_of_tasks returns the same take names with
+    get_unique_take_names for all the given tasks
+    """
+    from stalker import Task, Version
+    from stalker.db.session import DBSession
+    from anima.utils import get_unique_take_names, get_unique_take_names_of_tasks
+
+    leaf_tasks = [
+        t for t in Task.query.filter(Task.project == create_project).all()
+        if t.is_leaf
+    ]
+    task1, task2 = leaf_tasks[:2]
+    for take_name in ["Main", "Take2", "Take1", "Main", "Main@GPU"]:
+        DBSession.add(Version(task=task1, take_name=take_name))
+        DBSession.commit()
+
+    result = get_unique_take_names_of_tasks([task1.id, task2.id])
+    assert result == {
+        task1.id: get_unique_take_names(task1.id),
+        task2.id: get_unique_take_names(task2.id),
+    }
+    assert result[task1.id] == ["Main", "Take1", "Take2"]
+
+    result = get_unique_take_names_of_tasks([task1.id], include_reprs=True)
+    assert result[task1.id] == ["Main", "Main@GPU", "Take1", "Take2"]
+
+
+def test_get_unique_take_names_of_tasks_with_no_tasks(create_test_db):
+    """testing if get_unique_take_names_of_tasks returns an empty dict for an
+    empty list of task ids
+    """
+    from anima.utils import get_unique_take_names_of_tasks
+
+    assert get_unique_take_names_of_tasks([]) == {}
+
+
+def test_partial_task_query_returns_partial_children(create_test_db, create_project):
+    """testing if partial_task_query returns the partial children of the given
+    task with their resources and has_children info
+    """
+    from stalker import Task, User
+    from stalker.db.session import DBSession
+    from anima import defaults
+    from anima.utils import PartialEntity, partial_task_query
+
+    defaults.user_names_lut.clear()
+    user = User(name="Test User", login="tuser", email="t@u.com", password="pass")
+    DBSession.add(user)
+    shots_task = Task.query.filter(Task.name == "Shots").first()
+    shot = shots_task.children[0]
+    shot.children[0].resources = [user]
+    DBSession.commit()
+
+    result = partial_task_query(shots_task)
+    assert all(isinstance(t, PartialEntity) for t in result)
+    assert [t.id for t in result] == [
+        t.id for t in sorted(shots_task.children, key=lambda x: x.name)
+    ]
+    assert all(t.has_children for t in result)
+    assert all(t.parent_id == shots_task.id for t in result)
+
+    result = partial_task_query(shot)
+    assert [t.name for t in result] == sorted(t.name for t in shot.children)
+    assert not any(t.has_children for t in result)
+    resources = {t.id: t.resources for t in result}
+    assert resources[shot.children[0].id] == ["Test User"]
+    assert resources[shot.children[1].id] == []
+
+
+def test_partial_task_query_returns_project_root_tasks(create_test_db, create_project):
+    """testing if partial_task_query returns the root tasks of a project"""
+    from stalker import Task
+    from anima.utils import convert_to_partial_project, partial_task_query
+
+    project = convert_to_partial_project(create_project)
+    assert project.has_children is True
+
+    result = partial_task_query(project)
+    root_tasks = Task.query.filter(Task.project == create_project).filter(
+        Task.parent == None  # noqa: E711
+    )
+    assert [t.id for t in result] == [
+        t.id for t in sorted(root_tasks, key=lambda x: x.name)
+    ]
+
+
+def test_partial_children_task_query_matches_partial_task_query(
+    create_test_db, create_project
+):
+    """testing if partial_children_task_query returns the same result with
+    partial_task_query for all the given parents
+    """
+    from stalker import Task
+    from anima.utils import partial_children_task_query, partial_task_query
+
+    parents = [
+        t for t in Task.query.filter(Task.project == create_project).all()
+        if t.children
+    ] + [create_project]
+
+    result = partial_children_task_query(parents)
+    for parent in parents:
+        assert result[parent.id] == partial_task_query(parent)
+
+
+def test_convert_to_partial_task(create_test_db, create_project):
+    """testing if convert_to_partial_task converts the given task"""
+    from stalker import Task
+    from anima.utils import convert_to_partial_task
+
+    shots_task = Task.query.filter(Task.name == "Shots").first()
+    result = convert_to_partial_task(shots_task)
+    assert result.id == shots_task.id
+    assert result.name == shots_task.name
+    assert result.entity_type == shots_task.entity_type
+    assert result.status_id == shots_task.status_id
+    assert result.has_children is True
+    assert result.parent_id == shots_task.parent_id
+
+
+def test_partial_project_query(create_test_db, create_project):
+    """testing if partial_project_query returns all the projects ordered by
+    name
+    """
+    from stalker import Project, Task
+    from anima.utils import partial_project_query
+
+    result = partial_project_query()
+    projects = sorted(Project.query.all(), key=lambda x: x.name)
+    assert [p.id for p in result] == [p.id for p in projects]
+    for partial_project, project in zip(result, projects):
+        assert partial_project.entity_type == "Project"
+        assert partial_project.has_children == bool(
+            Task.query.filter(Task.project == project).count()
+        )
+
+
+def test_get_task_ancestor_ids(create_test_db, create_project):
+    """testing if get_task_ancestor_ids returns the project id and the parent
+    ids of the given tasks starting from the outermost parent
+    """
+    from stalker import Task
+    from anima.utils import get_task_ancestor_ids
+
+    tasks = Task.query.all()
+    result = get_task_ancestor_ids([t.id for t in tasks], batch_size=10)
+    assert len(result) == len(tasks)
+    for task in tasks:
+        assert result[task.id] == [task.project.id] + [p.id for p in task.parents]
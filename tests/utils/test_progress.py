@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from anima.utils.progress import ProgressDialogBase, ProgressManager
+
+
+class RecordingProgressDialog(ProgressDialogBase):
+    """A progress dialog that records the current steps it has been set to."""
+
+    def __init__(self):
+        super(RecordingProgressDialog, self).__init__()
+        self.steps = []
+        self.threads = set()
+        self.closed = False
+
+    def set_current_step(self, step):
+        super(RecordingProgressDialog, self).set_current_step(step)
+        self.steps.append(step)
+        self.threads.add(threading.current_thread())
+
+    def set_title(self, title):
+        super(RecordingProgressDialog, self).set_title(title)
+        self.threads.add(threading.current_thread())
+
+    def close(self):
+        super(RecordingProgressDialog, self).close()
+        self.closed = True
+        self.threads.add(threading.current_thread())
+
+
+def test_step_updates_the_dialog_on_every_step_by_default():
+    """testing if the dialog is updated on every step by default"""
+    pm = ProgressManager(dialog_class=RecordingProgressDialog)
+    caller = pm.register(5, "test title")
+    dialog = pm.dialog
+    for i in range(4):
+        caller.step(message="step {}".format(i))
+    assert dialog.steps == [0, 1, 2, 3, 4]
+    assert dialog.title == "test title : step 3"
+
+
+def test_update_percent_throttles_the_dialog_updates():
+    """testing if the dialog is only updated when the progress advances more
+    than the update_percent and the last state is flushed on end_progress
+    """
+    pm = ProgressManager(dialog_class=RecordingProgressDialog, update_percent=10)
+    caller = pm.register(100, "test title")
+    dialog = pm.dialog
+    for i in range(95):
+        caller.step(message="step {}".format(i))
+    assert pm.current_step == 95
+    assert caller.current_step == 95
+    assert dialog.steps == [0, 1, 11, 21, 31, 41, 51, 61, 71, 81, 91]
+
+    pm.end_progress(caller)
+    assert dialog.steps[-1] == 95
+    assert dialog.title == "test title : step 94"
+    assert pm.callers == []
+
+
+def test_update_interval_throttles_the_dialog_updates():
+    """testing if the dialog is only updated when the update_interval has
+    passed since the last update
+    """
+    pm = ProgressManager(dialog_class=RecordingProgressDialog, update_interval=60000)
+    caller = pm.register(10, "test title")
+    dialog = pm.dialog
+    for i in range(9):
+        caller.step()
+    assert dialog.steps == [0, 1]
+    caller.step()
+    # the caller is finished and the last state is flushed
+    assert dialog.steps == [0, 1, 10]
+
+
+def test_step_is_thread_safe():
+    """testing if stepping the same caller from multiple threads keeps the
+    counters exact
+    """
+    pm = ProgressManager(dialog_class=RecordingProgressDialog, update_percent=1)
+    thread_count = 8
+    step_count = 1000
+    caller = pm.register(thread_count * step_count + 1, "test title")
+    dialog = pm.dialog
+
+    def worker():
+        for _ in range(step_count):
+            caller.step()
+
+    threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert caller.current_step == thread_count * step_count
+    assert pm.current_step == thread_count * step_count
+    # the dialog is only updated from the main thread
+    assert dialog.steps == [0]
+    caller.end_progress()
+    assert dialog.steps[-1] == thread_count * step_count
+    assert dialog.threads == {threading.current_thread()}
+
+
+def test_callers_finished_in_worker_threads_are_ended_in_the_dialog_thread():
+    """testing if the callers finished or ended in the worker threads are ended
+    by the next flush from the thread that created the dialog
+    """
+    pm = ProgressManager(dialog_class=RecordingProgressDialog)
+    caller1 = pm.register(10, "caller 1")
+    caller2 = pm.register(5, "caller 2")
+    dialog = pm.dialog
+
+    def worker():
+        for _ in range(10):
+            caller1.step(message="working")
+        caller2.end_progress()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert caller1.current_step == 10
+    assert pm.callers == [caller1, caller2]
+    assert dialog.steps == [0, 0]
+    assert dialog.closed is False
+
+    pm.flush()
+    assert pm.callers == []
+    assert dialog.steps[-1] == 10
+    assert dialog.title == "caller 1 : working"
+    assert dialog.closed is True
+    assert dialog.threads == {threading.current_thread()}
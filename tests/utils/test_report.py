@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+import pytz
+
+
+@pytest.fixture(scope="function")
+def create_episode(create_test_db, create_project):
+    """creates an episode with scenes and shots to report"""
+    from stalker import Project, Shot, Status, Task, TimeLog, Type, User, Version
+    from stalker.db.session import DBSession
+
+    project = Project.query.filter(Project.code == "TP").first()
+    scene_type = Type(name="Scene", code="Scene", target_entity_type="Task")
+    cleanup_type = Type(name="Cleanup", code="Cleanup", target_entity_type="Task")
+    types = dict(
+        (t.name, t)
+        for t in Type.query.filter(Type.target_entity_type == "Task").all()
+    )
+    layout_task = Task.query.filter(Task.name == "Layout").first()
+    cmpl = Status.query.filter(Status.code == "CMPL").first()
+    user = User(name="Test User", login="tuser", email="t@u.com", password="pass")
+
+    ep = Task(name="EP101", project=project)
+    DBSession.add_all([scene_type, cleanup_type, ep, user])
+    shots = []
+    for scene_number in [2, 1]:
+        scene = Task(
+            name="SCN%03i" % scene_number, type=scene_type, parent=ep
+        )
+        shots_task = Task(name="Shots", parent=scene)
+        for shot_number in [30, 10, 20]:
+            code = "SH%03i_%04i" % (scene_number, shot_number)
+            shot = Shot(
+                name=code,
+                code=code,
+                description="Scope of %s" % code,
+                parent=shots_task,
+            )
+            shots.append(shot)
+            plate = Task(name="Plate", type=types["Plate"], parent=shot)
+            lighting = Task(
+                name="Lighting",
+                type=types["Lighting"],
+                parent=shot,
+                schedule_timing=2,
+                schedule_unit="d",
+                bid_timing=2,
+                bid_unit="d",
+            )
+            fx = Task(
+                name="FX",
+                type=types["FX"],
+                parent=shot,
+                schedule_model="duration",
+                bid_timing=1,
+                bid_unit="w",
+            )
+            if shot_number == 20:
+                lighting.depends = [layout_task]
+            if shot_number == 30 and scene_number == 1:
+                # no comp or cleanup
+                continue
+            comp_or_cleanup_name = "Cleanup" if shot_number == 10 else "Comp"
+            comp = Task(
+                name=comp_or_cleanup_name,
+                type=types.get(comp_or_cleanup_name, cleanup_type),
+                parent=shot,
+                bid_timing=5,
+                bid_unit="h",
+            )
+            DBSession.add_all([plate, lighting, fx, comp])
+            DBSession.commit()
+            for take_name in ["Main", "Other"]:
+                for _ in range(shot_number // 10):
+                    v = Version(task=comp, take_name=take_name)
+                    DBSession.add(v)
+                    DBSession.commit()
+            if shot_number != 30:
+                comp.status = cmpl
+            if shot_number != 20:
+                TimeLog(
+                    task=lighting,
+                    resource=user,
+                    start=datetime.datetime(2020, 1, len(shots), 10, tzinfo=pytz.utc),
+                    end=datetime.datetime(2020, 1, len(shots), 13, tzinfo=pytz.utc),
+                )
+    DBSession.commit()
+    yield ep
+
+
+def test_report_generates_the_csv(create_episode, tmpdir):
+    """testing if NetflixReporter.report generates the csv of all the shots in the
+    episode with a fixed number of queries
+    """
+    from sqlalchemy import event
+    from stalker import Shot
+    from stalker.db.session import DBSession
+    from anima.utils.report import NetflixReporter
+
+    ep = create_episode
+    DBSession.expire_all()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    csv_output_path = str(tmpdir.join("report", "EP101.csv"))
+    engine = DBSession.connection().engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        NetflixReporter().report(
+            ep,
+            csv_output_path,
+            vfx_turnover_to_vendor_date=datetime.datetime(2021, 1, 1),
+            vfx_next_studio_review_date=datetime.datetime(2021, 2, 1),
+            vendors=["Vendor1", "Vendor2"],
+            hourly_cost=10,
+            currency="USD",
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    # the number of queries does not depend on the number of shots
+    select_statements = [s for s in statements if s.lstrip().startswith("SELECT")]
+    assert len(select_statements) < 15
+
+    with open(csv_output_path) as f:
+        lines = f.read().split("\n")
+
+    assert lines[0] == NetflixReporter.csv_header
+    report_date = datetime.datetime.now(pytz.utc).strftime("%Y-%m-%d")
+    shot_end = dict(
+        (shot.code, shot.end.strftime("%Y-%m-%d")) for shot in Shot.query.all()
+    )
+    assert [line.split(";")[1] for line in lines[1:]] == [
+        "SH001_0010",
+        "SH001_0020",
+        "SH002_0010",
+        "SH002_0020",
+        "SH002_0030",
+    ]
+    assert lines[2] == (
+        "101;SH001_0020;In Progress;2D Comp, 3D Set Extension, Dynamic Sim;"
+        "Scope of SH001_0020;Vendor1, Vendor2;2021-01-01;2021-02-01;%s;v002;"
+        "240.00;USD;%s;" % (shot_end["SH001_0020"], report_date)
+    )
+    # cleanup task is used when there is no comp task
+    assert lines[3].split(";")[3] == "2D Paint, Dynamic Sim"
+    assert lines[3].split(";")[9] == "v001"
+    # the comp task is not completed
+    assert lines[5].split(";")[7] == ""
+    assert lines[5].split(";")[9] == ""
+
+
+def test_generate_csv_resolves_the_versions_in_bulk(
+    create_test_db, create_project, tmpdir
+):
+    """testing if NetflixReview.generate_csv resolves the versions of all the
+    outputs with a single query per lookup
+    """
+    import os
+    from sqlalchemy import event
+    from stalker import Task, Version
+    from stalker.db.session import DBSession
+    from anima.utils.report import NetflixReview
+
+    comp_tasks = Task.query.filter(Task.name == "Comp").order_by(Task.id).all()
+    versions = []
+    for comp_task in comp_tasks[:2]:
+        version = Version(task=comp_task, take_name="Main")
+        DBSession.add(version)
+        DBSession.commit()
+        version.update_paths()
+        versions.append(version)
+    DBSession.commit()
+
+    review = NetflixReview()
+    review.outputs = [
+        "/renders/%s.0001.exr" % os.path.splitext(versions[1].filename)[0],
+        "/renders/not_a_version.0001.exr",
+        "/renders/%s.mov" % os.path.splitext(versions[0].filename)[0],
+    ]
+    assert review.get_versions_from_outputs(review.outputs) == [
+        versions[1],
+        None,
+        versions[0],
+    ]
+
+    DBSession.expire_all()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    csv_output_path = str(tmpdir.join("review.csv"))
+    engine = DBSession.connection().engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        review.generate_csv(csv_output_path, vendor="Vendor1", submission_note="Note")
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    # one for the default version names and one for "not_a_version"
+    assert len([s for s in statements if "Versions" in s]) == 2
+    assert len(statements) == 2
+    assert len([s for s in statements if "LIKE" in s]) == 1
+
+    with open(csv_output_path) as f:
+        lines = f.read().split("\n")
+    assert lines[1:] == [
+        '%s,%s,"%s",Vendor1,WIP,Note'
+        % (
+            os.path.basename(review.outputs[0]),
+            comp_tasks[1].parent.name,
+            comp_tasks[1].parent.description,
+        ),
+        '%s,%s,"%s",Vendor1,WIP,Note'
+        % (
+            os.path.basename(review.outputs[2]),
+            comp_tasks[0].parent.name,
+            comp_tasks[0].parent.description,
+        ),
+    ]
+
+
+def test_get_versions_from_outputs_matches_the_version_file_names(
+    create_test_db, create_project
+):
+    """testing if NetflixReview.get_versions_from_outputs matches the version
+    file names exactly by querying the take names and version numbers
+    """
+    import os
+    from sqlalchemy import event
+    from stalker import Task, Version
+    from stalker.db.session import DBSession
+    from anima.utils.report import NetflixReview
+
+    comp_task = Task.query.filter(Task.name == "Comp").order_by(Task.id).first()
+    versions = []
+    for take_name in ["Main", "Main_Retime", "Main"]:
+        version = Version(task=comp_task, take_name=take_name)
+        DBSession.add(version)
+        DBSession.commit()
+        version.update_paths()
+        versions.append(version)
+    DBSession.commit()
+
+    outputs = [
+        "/renders/%s.mov" % os.path.splitext(version.filename)[0]
+        for version in versions
+    ] + [
+        # only contains a version name
+        "/renders/%s_v001.mov" % os.path.splitext(versions[0].filename)[0],
+    ]
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = DBSession.connection().engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = NetflixReview.get_versions_from_outputs(outputs)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert result == versions + [None]
+    assert len(statements) == 1
+    assert "LIKE" not in statements[0]
+
+
+def test_get_versions_from_outputs_with_non_default_file_names(
+    create_test_db, create_project
+):
+    """testing if NetflixReview.get_versions_from_outputs finds the Versions of
+    the outputs whose names are not in the default file name format by their
+    full_path
+    """
+    from stalker import Task, Version
+    from stalker.db.session import DBSession
+    from anima.utils.report import NetflixReview
+
+    comp_tasks = Task.query.filter(Task.name == "Comp").order_by(Task.id).all()
+    versions = []
+    for comp_task in comp_tasks[:2]:
+        version = Version(task=comp_task, take_name="Main")
+        DBSession.add(version)
+        DBSession.commit()
+        version.update_paths()
+        versions.append(version)
+    # a custom filename template
+    versions[1].full_path = "%s/Comp/%s_comp_rev1.nk" % (
+        comp_tasks[1].project.code,
+        comp_tasks[1].parent.name,
+    )
+    DBSession.commit()
+
+    outputs = [
+        "/renders/%s_comp_rev1.0001.exr" % comp_tasks[1].parent.name,
+        "/renders/%s.mov" % versions[0].filename.split(".")[0],
+        "/renders/unknown_comp_rev1.mov",
+    ]
+    assert NetflixReview.get_versions_from_outputs(outputs) == [
+        versions[1],
+        versions[0],
+        None,
+    ]
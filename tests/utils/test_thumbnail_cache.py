@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+import pytest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class StalkerServerStandIn(BaseHTTPRequestHandler):
+    """Serves the thumbnails to logged in users like the Stalker Server."""
+
+    logins = []
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.logins.append(self.path)
+        self.send_response(200)
+        self.send_header("Set-Cookie", "auth_tkt=logged_in; Path=/")
+        self.end_headers()
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if "auth_tkt=logged_in" not in (self.headers.get("Cookie") or ""):
+            self.send_response(403)
+            self.end_headers()
+            return
+        data = ("data of %s" % self.path).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture(scope="function")
+def thumbnail_cache(tmpdir, monkeypatch):
+    """returns the StalkerThumbnailCache using a temp cache folder and a local
+    stand-in of the Stalker Server
+    """
+    from anima import defaults
+    from anima.utils import StalkerThumbnailCache
+
+    StalkerServerStandIn.logins = []
+    StalkerServerStandIn.requests = []
+    server = HTTPServer(("127.0.0.1", 0), StalkerServerStandIn)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    monkeypatch.setitem(
+        defaults.config_values, "local_cache_folder", str(tmpdir.join("cache"))
+    )
+    monkeypatch.setitem(
+        defaults.config_values,
+        "stalker_server_internal_address",
+        "http://127.0.0.1:%s" % server.server_address[1],
+    )
+    StalkerThumbnailCache.reset()
+    yield StalkerThumbnailCache
+    StalkerThumbnailCache.reset()
+    StalkerThumbnailCache.max_size = None
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_downloads_and_caches_the_thumbnails(thumbnail_cache):
+    """testing if the thumbnails are downloaded once with one login and the
+    thumbnails with the same file names don't collide
+    """
+    path1 = "SPL/a/thumbnail.jpg"
+    path2 = "SPL/b/thumbnail.jpg"
+    cached_path1 = thumbnail_cache.get(path1, "user", "pass")
+    cached_path2 = thumbnail_cache.get(path2, "user", "pass")
+    assert cached_path1 != cached_path2
+    assert cached_path1.endswith(".jpg")
+    with open(cached_path1) as f:
+        assert f.read() == "data of /SPL/a/thumbnail.jpg"
+    with open(cached_path2) as f:
+        assert f.read() == "data of /SPL/b/thumbnail.jpg"
+
+    assert thumbnail_cache.get(path1, "user", "pass") == cached_path1
+    assert StalkerServerStandIn.logins == ["/login"]
+    assert len(StalkerServerStandIn.requests) == 2
+    assert thumbnail_cache.get_stats() == {
+        "hits": 1,
+        "misses": 2,
+        "count": 2,
+        "size": 56,
+    }
+
+
+def test_get_without_login_does_not_download(thumbnail_cache):
+    """testing if the cached file path is returned without downloading it if
+    there is no login
+    """
+    cached_path = thumbnail_cache.get("SPL/a/thumbnail.jpg")
+    assert not os.path.exists(cached_path)
+    assert StalkerServerStandIn.requests == []
+
+
+def test_get_evicts_the_least_recently_used_thumbnails(thumbnail_cache):
+    """testing if the least recently used thumbnails are removed when the cache
+    size exceeds the max_size
+    """
+    thumbnail_cache.max_size = 60
+    # each one is 28 bytes
+    cached_path1 = thumbnail_cache.get("SPL/a/thumbnail.jpg", "user", "pass")
+    cached_path2 = thumbnail_cache.get("SPL/b/thumbnail.jpg", "user", "pass")
+    # use the first one
+    thumbnail_cache.get("SPL/a/thumbnail.jpg", "user", "pass")
+    cached_path3 = thumbnail_cache.get("SPL/c/thumbnail.jpg", "user", "pass")
+
+    assert os.path.exists(cached_path1)
+    assert not os.path.exists(cached_path2)
+    assert os.path.exists(cached_path3)
+    assert thumbnail_cache.get_stats()["size"] == 56
+
+    # the entries are loaded from disk in the same order
+    thumbnail_cache.reset()
+    thumbnail_cache.max_size = 30
+    thumbnail_cache.get("SPL/d/thumbnail.jpg", "user", "pass")
+    assert not os.path.exists(cached_path1)
+    assert not os.path.exists(cached_path3)
+
+
+def test_get_many_downloads_the_missing_thumbnails(thumbnail_cache):
+    """testing if get_many downloads each missing thumbnail once with a single
+    login
+    """
+    paths = ["SPL/%s/thumbnail.jpg" % i for i in range(20)]
+    cached_paths = thumbnail_cache.get_many(paths + paths[:5], "user", "pass")
+    assert len(cached_paths) == 25
+    assert cached_paths[20:] == cached_paths[:5]
+    assert all(os.path.exists(path) for path in cached_paths)
+    assert StalkerServerStandIn.logins == ["/login"]
+    assert sorted(StalkerServerStandIn.requests) == sorted("/" + p for p in paths)
+
+
+def test_get_logs_in_again_when_the_session_expires(thumbnail_cache):
+    """testing if the cache logs in again if the session is expired"""
+    thumbnail_cache.get("SPL/a/thumbnail.jpg", "user", "pass")
+    for handler in thumbnail_cache._opener.handlers:
+        if hasattr(handler, "cookiejar"):
+            handler.cookiejar.clear()
+    thumbnail_cache.get("SPL/b/thumbnail.jpg", "user", "pass")
+    assert StalkerServerStandIn.logins == ["/login", "/login"]
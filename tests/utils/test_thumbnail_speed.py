@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks the single pass video thumbnail generation against selecting the
+frames one by one.
+
+Needs ``ffmpeg`` and ``ffprobe``. Run it directly, optionally with the clip
+durations in seconds to test::
+
+    python tests/utils/test_thumbnail_speed.py 10 60 300
+
+The test clips are generated as 1920x1080 ProRes files in a temp folder and are
+deleted at the end.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from anima.utils import MediaManager
+
+
+def generate_test_clip(path, duration):
+    """Generate a ProRes test clip.
+
+    Args:
+        path (str): The output path of the clip.
+        duration (int): The duration of the clip in seconds.
+    """
+    mm = MediaManager()
+    subprocess.check_call(
+        [
+            mm.ffmpeg_command_path,
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc2=duration=%s:size=1920x1080:rate=25" % duration,
+            "-c:v",
+            "prores_ks",
+            "-y",
+            path,
+        ]
+    )
+
+
+def benchmark(label, f, path):
+    """Run the given function with the path and print the duration.
+
+    Args:
+        label (str): The label of the benchmark.
+        f: The function to be benchmarked.
+        path (str): The path to pass to the function.
+
+    Returns:
+        str: The result of the function.
+    """
+    start = time.time()
+    result = f(path)
+    print("%-24s: %8.3f seconds" % (label, time.time() - start))
+    return result
+
+
+if __name__ == "__main__":
+    durations = [int(duration) for duration in sys.argv[1:]] or [10, 60, 300]
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        mm = MediaManager()
+        mm.media_info_cache_path = os.path.join(tempdir, "media_info")
+        for duration in durations:
+            print("******** %s seconds ********" % duration)
+            clip_path = os.path.join(tempdir, "clip_%s.mov" % duration)
+            generate_test_clip(clip_path, duration)
+            # probe it up front, so both methods use the cached media info
+            mm.probe(clip_path)
+
+            for label, f in [
+                ("Frame select", mm.generate_video_thumbnail_with_frame_select),
+                ("Single pass", mm.generate_video_thumbnail),
+            ]:
+                thumbnail_path = benchmark(label, f, clip_path)
+                assert os.path.exists(thumbnail_path)
+                os.remove(thumbnail_path)
+    finally:
+        shutil.rmtree(tempdir)